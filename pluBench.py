@@ -0,0 +1,397 @@
+"""
+Produce Code Finder - Benchmarks
+-----------------------
+Description:
+    Measures how the lookup tool scales on synthetic catalogs shaped like the
+    default database ("category - variety" names, 3-5 digit codes and 9xxxx
+    organic codes), from 1k to 1M items.
+
+    For each size it times loading, every search tier (exact code, exact name,
+    partial, fuzzy), Show All, saving and persisting a single edit, and records
+    peak memory. Results are written as JSON so runs of different versions can
+    be compared.
+
+    With --writers it instead runs that many processes changing one shared
+    database folder at once, checks that no change was lost, and measures
+    changes per second under contention.
+
+    With --catalog-memory it compares the memory the code -> name and name -> code
+    dictionaries hold against a CompactCatalog of the same items, and how fast
+    each answers exact lookups.
+
+        python pluBench.py --sizes 1000 10000 100000 1000000 --output bench.json
+        python pluBench.py --backend snapshot --sizes 100000
+        python pluBench.py --writers 8 --writes 500 --sizes 10000
+        python pluBench.py --catalog-memory --sizes 100000 1000000
+"""
+
+# IMPORT STATEMENTS
+import json, os, sys, gc, time, random, argparse, tempfile, shutil, platform, tracemalloc, io, contextlib, concurrent.futures
+from datetime import datetime
+
+import pluSearch
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+SYLLABLES = ["ba", "ra", "lo", "mi", "ke", "su", "to", "na", "de", "vi", "an", "or", "el", "un", "pa",
+             "sha", "gro", "ber", "lin", "cot", "mar", "zel", "fen", "dra", "qui", "ston", "wick", "hol"]
+
+
+# ===================== SYNTHETIC CATALOGS =====================
+
+def defaultCategories() -> list:
+    """Category names of the default database, e.g. 'apples' from 'apples - fuji'."""
+    return sorted({name.split(" - ")[0] for name in pluSearch.defaultCodeToName.values() if " - " in name})
+
+def codePool(rng: random.Random):
+    """
+    Yields unused conventional codes: 4-digit 3000-4999 first, then 3-digit, then 5-digit
+    outside the 9xxxx organic range. Real PLU numbers run out near 100k items, so larger
+    catalogs continue with 6 and 7 digit codes.
+    """
+    for low, high in ((3000, 5000), (100, 1000), (10000, 90000), (100000, 10000000)):
+        block = list(range(low, high))
+        rng.shuffle(block)
+        for code in block:
+            yield str(code)
+
+def syntheticCatalog(size: int, seed: int=1) -> dict:
+    """Returns a code -> name catalog of exactly size items. The same size and seed give the same catalog."""
+    rng = random.Random(seed)
+    categories = defaultCategories()
+    codes = codePool(rng)
+    catalog = {}
+    names = set()
+    while len(catalog) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(rng.randint(1, 2))]
+        name = f"{rng.choice(categories)} - {' '.join(words)}"
+        if name in names:
+            continue
+        code = next(codes)
+        catalog[code] = name
+        names.add(name)
+        # About a third of 4-digit items also come as organic, like 4011 / 94011
+        if len(code) == 4 and len(catalog) < size and rng.random() < 0.35:
+            organic = name + " (organic)"
+            catalog["9" + code] = organic
+            names.add(organic)
+    return catalog
+
+def sampleQueries(catalog: dict, count: int, seed: int=2) -> dict:
+    """Queries aimed at each search tier, drawn from the catalog."""
+    rng = random.Random(seed)
+    codes = rng.sample(list(catalog), min(count, len(catalog)))
+    names = [catalog[code] for code in codes]
+    partial, fuzzy = [], []
+    for name in names:
+        variety = name.split(" - ", 1)[-1]
+        start = rng.randrange(max(1, len(variety) - 4))
+        partial.append(variety[start:start + 5])
+        position = rng.randrange(len(name))
+        fuzzy.append(name[:position] + name[position + 1:])    # one dropped letter
+    return {"exactCode": codes, "exactName": names, "partial": partial, "fuzzy": fuzzy}
+
+
+# ===================== MEASUREMENTS =====================
+
+def timings(seconds: list) -> dict:
+    """Summary of a list of durations, in milliseconds."""
+    seconds = sorted(seconds)
+    count = len(seconds)
+    return {
+        "count": count,
+        "meanMs": round(sum(seconds) / count * 1000, 4),
+        "p50Ms": round(seconds[count // 2] * 1000, 4),
+        "p99Ms": round(seconds[min(count - 1, int(count * 0.99))] * 1000, 4),
+        "maxMs": round(seconds[-1] * 1000, 4),
+    }
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def peakMemory(function) -> int:
+    """Peak bytes allocated by Python while function runs."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def maxResidentMB():
+    """Peak resident size of this process so far, or None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def openDatabase(backend: str, directory: str):
+    """A fresh, unloaded catalog over the files in directory."""
+    if backend == "sqlite":
+        return pluSearch.SqlitePluDatabase(os.path.join(directory, pluSearch.SQLITE_FILE))
+    if backend == "snapshot":
+        return pluSearch.SnapshotPluDatabase(os.path.join(directory, pluSearch.SNAPSHOT_FILE))
+    return pluSearch.PluDatabase(directory, enableCustomData=True)
+
+def buildFiles(backend: str, directory: str, catalog: dict) -> float:
+    """Writes the catalog in the backend's format. Returns the seconds taken."""
+    if backend == "sqlite":
+        return timed(pluSearch.SqlitePluDatabase(os.path.join(directory, pluSearch.SQLITE_FILE), seed=catalog.items()).load)[0]
+    if backend == "snapshot":
+        return timed(pluSearch.writeSnapshot, catalog.items(), os.path.join(directory, pluSearch.SNAPSHOT_FILE))[0]
+    return timed(pluSearch.PluDatabase(directory, enableCustomData=True).writeDatabase, catalog)[0]
+
+
+def benchSize(size: int, backend: str, queryCount: int, edits: int, memory: bool) -> dict:
+    result = {"size": size, "backend": backend}
+    catalog = syntheticCatalog(size)
+    queries = sampleQueries(catalog, queryCount)
+    directory = tempfile.mkdtemp(prefix="pluBench-")
+    db = None
+    try:
+        result["buildSeconds"] = round(buildFiles(backend, directory, catalog), 4)
+        result["fileBytes"] = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        del catalog
+
+        # Load
+        db = openDatabase(backend, directory)
+        result["loadSeconds"] = round(timed(db.load)[0], 4)
+        if memory:
+            result["loadPeakMB"] = round(peakMemory(openDatabase(backend, directory).load) / (1024 * 1024), 1)
+
+        # Search tiers, uncached
+        tiers = {}
+        for tier, tierQueries in queries.items():
+            if tier == "fuzzy":
+                tierQueries = tierQueries[:max(20, queryCount // 5)]
+            durations, answeredBy = [], {}
+            for query in tierQueries:
+                seconds, (answered, _) = timed(db.lookupTier, query.strip().lower())
+                durations.append(seconds)
+                answeredBy[answered] = answeredBy.get(answered, 0) + 1
+            tiers[tier] = timings(durations)
+            tiers[tier]["answeredBy"] = answeredBy     # e.g. how many misspellings still needed the fuzzy scan
+        result["search"] = tiers
+
+        # Show All
+        pluSearch.db = db
+        with contextlib.redirect_stdout(io.StringIO()):
+            result["showAllSeconds"] = round(timed(pluSearch.display_all_items)[0], 4)
+
+        # Single-edit persistence and save
+        if backend == "snapshot":
+            result["editPersist"] = None
+            result["saveSeconds"] = round(buildFiles(backend, directory, dict(db.items())), 4)
+        else:
+            if backend == "json":
+                db.compactAfter = edits + 1      # keep background compaction out of the timings
+            durations = []
+            for code in queries["exactCode"][:edits]:
+                durations.append(timed(db.edit, code, None, "0" + code)[0])    # generated codes never start with 0
+            result["editPersist"] = timings(durations)
+            result["saveSeconds"] = round(timed(db.save)[0], 4)
+        result["maxResidentMB"] = maxResidentMB()
+    finally:
+        if backend == "sqlite" and db is not None and db.connection is not None:
+            db.connection.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    return result
+
+
+# ===================== CATALOG MEMORY =====================
+def retainedMemory(build) -> tuple:
+    """Runs build() and returns (its result, bytes it still holds, peak bytes while it ran)."""
+    tracemalloc.start()
+    try:
+        result = build()
+        current, peak = tracemalloc.get_traced_memory()
+        return result, current, peak
+    finally:
+        tracemalloc.stop()
+
+def benchCatalogMemory(size: int, queryCount: int) -> dict:
+    """
+    Decodes the same JSON database into the dictionary pair PluDatabase keeps and into a
+    CompactCatalog, and compares what each holds once built and how long exact lookups take.
+    """
+    catalog = syntheticCatalog(size)
+    text = json.dumps(catalog, separators=(',', ':'))
+    codes = random.Random(3).sample(list(catalog), min(queryCount, size))
+    names = [catalog[code] for code in codes]
+    del catalog
+
+    def dictionaries():
+        codeToName = json.loads(text)
+        return codeToName, {name: code for code, name in codeToName.items()}
+
+    def compact():
+        return pluSearch.CompactCatalog(json.loads(text).items())
+
+    result = {"size": size}
+    for kind, build in (("dict", dictionaries), ("compact", compact)):
+        built, held, peak = retainedMemory(build)
+        codeToName, nameToCode = built if kind == "dict" else (built, built.byName)
+        gc.collect()        # so a collection of the new objects does not land in the timings
+        codeSeconds = timed(lambda: [codeToName[code] for code in codes])[0]
+        nameSeconds = timed(lambda: [nameToCode[name] for name in names])[0]
+        result[kind] = {
+            "heldMB": round(held / (1024 * 1024), 1),
+            "bytesPerItem": round(held / size, 1),
+            "peakMB": round(peak / (1024 * 1024), 1),
+            "codeLookupUs": round(codeSeconds / len(codes) * 1e6, 3),
+            "nameLookupUs": round(nameSeconds / len(names) * 1e6, 3),
+        }
+        del built, codeToName, nameToCode
+    saved = result["dict"]["bytesPerItem"] - result["compact"]["bytesPerItem"]
+    result["savedMBPerMillion"] = round(saved * 1000000 / (1024 * 1024), 1)
+    return result
+
+
+# ===================== CONCURRENT WRITERS =====================
+
+def writerProcess(directory: str, worker: int, writes: int, sharedCodes: int, compactAfter: int) -> dict:
+    """
+    One register making writes changes: adding, renaming and removing its own items, and
+    racing the other writers to add the same shared codes. Returns the items it expects to
+    survive, the shared codes it won, and how long each change took.
+    """
+    db = pluSearch.PluDatabase(directory, enableCustomData=True)
+    db.compactAfter = compactAfter
+    rng = random.Random(worker)
+    own, won = {}, {}
+    durations = []
+    conflicts = 0
+    for i in range(writes):
+        roll = rng.random()
+        try:
+            if roll < 0.5 or not own:
+                code, name = f"8{worker:03d}{i:06d}", f"register {worker} item {i}"
+                durations.append(timed(db.add, name, code)[0])
+                own[code] = name
+            elif roll < 0.7:
+                code = rng.choice(list(own))
+                name = f"register {worker} item {i} renamed"
+                durations.append(timed(db.edit, code, name)[0])
+                own[code] = name
+            elif roll < 0.8:
+                code = rng.choice(list(own))
+                durations.append(timed(db.remove, code)[0])
+                del own[code]
+            else:
+                code, name = f"7{rng.randrange(sharedCodes):05d}", f"shared item by register {worker} #{i}"
+                start = time.perf_counter()
+                try:
+                    db.add(name, code)
+                    won[code] = name
+                except ValueError:      # another register added this code first
+                    conflicts += 1
+                durations.append(time.perf_counter() - start)
+        except (KeyError, ValueError) as e:
+            return {"worker": worker, "error": str(e)}
+    db.save()
+    return {"worker": worker, "own": own, "won": won, "durations": durations, "conflicts": conflicts}
+
+def benchWriters(size: int, writers: int, writes: int, compactAfter: int=200) -> dict:
+    """
+    Runs writers processes against one database folder at once, then reloads it and checks
+    every change that was reported as saved is there and nothing else is.
+    """
+    catalog = syntheticCatalog(size)
+    directory = tempfile.mkdtemp(prefix="pluBench-")
+    try:
+        buildFiles("json", directory, catalog)
+        sharedCodes = max(1, writers * writes // 20)
+        context = pluSearch.poolContext()
+        start = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(writers, mp_context=context) as pool:
+            futures = [pool.submit(writerProcess, directory, worker, writes, sharedCodes, compactAfter) for worker in range(writers)]
+            reports = [future.result() for future in futures]
+        seconds = time.perf_counter() - start
+
+        errors = [report["error"] for report in reports if "error" in report]
+        expected = dict(catalog)
+        wonTwice = 0
+        for report in reports:
+            if "error" in report:
+                continue
+            expected.update(report["own"])
+            for code, name in report["won"].items():
+                wonTwice += code in expected
+                expected[code] = name
+        found = dict(openDatabase("json", directory).items())
+        lost = sum(1 for code, name in expected.items() if found.get(code) != name)
+        unexpected = sum(1 for code in found if code not in expected)
+        durations = [d for report in reports for d in report.get("durations", [])]
+        return {
+            "size": size, "writers": writers, "writesPerWriter": writes,
+            "seconds": round(seconds, 3),
+            "changesPerSecond": round(len(durations) / seconds, 1),
+            "change": timings(durations) if durations else None,
+            "sharedConflicts": sum(report.get("conflicts", 0) for report in reports),
+            "lostUpdates": lost, "unexpectedItems": unexpected, "sharedWonTwice": wonTwice,
+            "errors": errors,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# ===================== MAIN =====================
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the PLU lookup tool on synthetic catalogs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Catalog sizes to run")
+    parser.add_argument("--backend", choices=["json", "sqlite", "snapshot"], default="json")
+    parser.add_argument("--queries", type=int, default=500, help="Queries per search tier")
+    parser.add_argument("--edits", type=int, default=50, help="Single edits to time")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass (it makes large sizes slow)")
+    parser.add_argument("--writers", type=int, help="Run the concurrent writers test with this many processes instead")
+    parser.add_argument("--writes", type=int, default=500, help="Changes per writer process")
+    parser.add_argument("--catalog-memory", action="store_true",
+                        help="Compare the memory of the catalog dictionaries and a CompactCatalog instead")
+    parser.add_argument("--output", default="pluBench.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [],
+    }
+    for size in args.sizes:
+        if args.writers:
+            print(f"{args.writers} writers x {args.writes} changes on {size:,} items...")
+            result = benchWriters(size, args.writers, args.writes)
+            report["results"].append(result)
+            print(f"  {result['changesPerSecond']} changes/s, p50 {result['change']['p50Ms']}ms, p99 {result['change']['p99Ms']}ms, "
+                  f"lost {result['lostUpdates']}, unexpected {result['unexpectedItems']}, shared conflicts {result['sharedConflicts']}")
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            continue
+        if args.catalog_memory:
+            print(f"Catalog memory for {size:,} items...")
+            result = benchCatalogMemory(size, args.queries)
+            report["results"].append(result)
+            for kind in ("dict", "compact"):
+                stats = result[kind]
+                print(f"  {kind}: {stats['heldMB']}MB held ({stats['bytesPerItem']} bytes/item), peak {stats['peakMB']}MB, "
+                      f"lookup by code {stats['codeLookupUs']}us, by name {stats['nameLookupUs']}us")
+            print(f"  saved {result['savedMBPerMillion']}MB per million items")
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            continue
+        print(f"Benchmarking {size:,} items ({args.backend})...")
+        result = benchSize(size, args.backend, args.queries, args.edits, not args.no_memory)
+        report["results"].append(result)
+        tiers = ", ".join(f"{tier} {stats['p50Ms']}ms" for tier, stats in result["search"].items())
+        print(f"  load {result['loadSeconds']}s, save {result['saveSeconds']}s, p50: {tiers}")
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,239 +20,37 @@ Version: 1.1
 """
 
 # IMPORT STATEMENTS
-import json, platform, difflib, os
+import json
+import csv
+import platform
+import difflib
+import os
+import re
+import heapq
+import sys
+import argparse
+import threading
+import sqlite3
+import mmap
+import bisect
+import zlib
+import itertools
+import time
+import contextlib
+import multiprocessing
+import concurrent.futures
+import math
+import unicodedata
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping, ItemsView, ValuesView
+numpy = None            # optional, vectorizes NgramVectorMatcher; loadNumpy() imports it on first use (False: not installed)
+try:
+    import fcntl        # advisory file locks between processes; missing on Windows
+except ImportError:
+    fcntl = None
 
 # DEFAULT DATABASES
-defaultNameToCode = {
-  "apples - ambrosia": "3438",
-  "apples - braeburn": "4103",
-  "apples - cameo": "3066",
-  "apples - cortland": "4106",
-  "apples - empire": "4124",
-  "apples - envy": "3616",
-  "apples - fuji": "4131",
-  "apples - gala": "4135",
-  "apples - golden delicious": "4020",
-  "apples - granny smith": "4017",
-  "apples - honey crisp": "3283",
-  "apples - jazz": "4200",
-  "apples - jonagold": "4147",
-  "apples - koru": "3620",
-  "apples - macoun": "3073",
-  "apples - mcintosh": "4152",
-  "apples - pinata": "4215",
-  "apples - pink lady": "4130",
-  "apples - rave": "3487",
-  "apples - red delicious": "3284",
-  "apples - rome": "4172",
-  "apples - sweet tango": "3603",
-  "apples - winesap": "4183",
-  "apricots": "4218",
-  "apricots - velvet": "3044",
-  "artichokes": "4520",
-  "asparagus": "4080",
-  "asparagus - white": "4522",
-  "aspiration": "3277",
-  "avocados - green skin": "4771",
-  "avocados - hass": "4046",
-  "bananas": "4011",
-  "beans": "4535",
-  "bok choy": "4545",
-  "broccoli": "4060",
-  "broccoli crowns": "3082",
-  "broc-o-flower": "4567",
-  "brussel sprout": "4550",
-  "bunch beets": "94539",
-  "cabbage - green": "4069",
-  "cabbage - napa": "4552",
-  "cabbage - red": "4554",
-  "cabbage - savoy": "4555",
-  "cactus pears (tunas)": "4255",
-  "candy": "4883",
-  "canela (cinnamon sticks)": "4821",
-  "cantaloupe - eastern": "4319",
-  "cantaloupe - western": "4050",
-  "carrots - bulk": "4564",
-  "cauliflower": "4079",
-  "celery - stalk": "4070",
-  "celery hearts": "4575",
-  "celery root": "4585",
-  "cherries": "4045",
-  "cherries - rainier": "4258",
-  "chest nuts": "4927",
-  "cilantro": "4889",
-  "coconut": "4261",
-  "coconut - young white": "4260",
-  "corn - bi-color": "4590",
-  "corn - white": "4077",
-  "corn - yellow": "4078",
-  "cranberries - bulk": "4242",
-  "cucumbers": "4597",
-  "cucumbers - pickling": "4596",
-  "cucumbers - hot house cukes": "4593",
-  "dates - medjool": "3047",
-  "dragon fruit": "3040",
-  "eggplant": "4081",
-  "garlic": "4608",
-  "ginger root (organic)": "94612",
-  "grape tomatoes (bulk)": "3147",
-  "grapefruit - red": "4282",
-  "grapefruit - white": "4293",
-  "grapes - black seedless": "4056",
-  "grapes - red seedless": "4023",
-  "grapes - white seedless": "4022",
-  "collard greens": "4614",
-  "creasy greens": "4620",
-  "kale": "4627",
-  "mustard greens": "4616",
-  "turnip greens": "4619",
-  "herbs - fresh arugula": "4884",
-  "herbs - fresh basil": "4885",
-  "herbs - fresh chives": "4888",
-  "herbs - fresh dill": "4891",
-  "herbs - fresh mint": "4896",
-  "herbs - fresh oregano": "4897",
-  "herbs - fresh rosemary": "4903",
-  "herbs - fresh sage": "4904",
-  "herbs - fresh thyme": "4907",
-  "honeydew": "4034",
-  "horseradish root (organic)": "94625",
-  "jamaica": "4505",
-  "jicama": "4626",
-  "kiwi fruit": "4030",
-  "kohlrabi": "4628",
-  "kumquats": "4303",
-  "leeks": "4629",
-  "lemons - meyer": "4304",
-  "lemons": "4053",
-  "lettuce - boston": "4632",
-  "lettuce - cello head": "4061",
-  "lettuce - endive": "4604",
-  "lettuce - belgium endive": "4543",
-  "lettuce - escarole": "4605",
-  "lime": "4048",
-  "mandarinquat": "4471",
-  "mangoes": "4051",
-  "mangoes - ataulfo": "4312",
-  "melons - pepino": "4333",
-  "mushrooms (bulk)": "4653",
-  "name": "3276",
-  "nectarines": "4036",
-  "nectarines - white": "3035",
-  "nuts - loose bulk": "4929",
-  "okra": "4655",
-  "onions - green": "4068",
-  "onions - sweet": "4166",
-  "onions - red": "4082",
-  "onions - white": "4663",
-  "onions - yellow": "4093",
-  "oranges - cara cara": "3110",
-  "oranges - mandarins": "4455",
-  "oranges - navel": "3107",
-  "oranges - satsuma": "3029",
-  "papayas": "3111",
-  "papayas - maradol": "3112",
-  "parsley - curly": "4900",
-  "parsley - italian": "4901",
-  "parsnips": "4672",
-  "peaches": "4038",
-  "peaches - donut white": "3113",
-  "peaches - southern": "4403",
-  "peaches - white": "4401",
-  "peanuts - raw or green": "4931",
-  "pears - anjou": "4416",
-  "pears - asian": "4408",
-  "pears - bartlett": "4409",
-  "pears - bosc": "4413",
-  "pears - comice": "4414",
-  "pears - red": "4415",
-  "pepitas": "4501",
-  "green bell peppers": "4065",
-  "orange peppers": "3121",
-  "red peppers": "4688",
-  "yellow peppers": "4689",
-  "habanero peppers": "3125",
-  "all chile peppers": "4691",
-  "persimmons": "4427",
-  "piloncillo (brown sugar cane)": "4820",
-  "pineapple": "4433",
-  "plantain bananas": "4235",
-  "plums - black": "4040",
-  "plums - lemons": "4442",
-  "plums - red": "4042",
-  "pluots": "3278",
-  "pomegranates": "3127",
-  "potato - baking": "4072",
-  "potato - red": "4073",
-  "potato - sweet": "4091",
-  "potato - white": "4083",
-  "pummelos": "3129",
-  "pumpkins": "4736",
-  "pie pumpkins": "3134",
-  "radicchio": "4738",
-  "radish bunch": "4089",
-  "rapini": "4547",
-  "rhubarb": "4745",
-  "rutabagas": "4747",
-  "flowering kale": "3095",
-  "shallots": "4662",
-  "snow peas": "4092",
-  "squash - banana": "4757",
-  "squash - acorn gold": "4751",
-  "squash - acorn green": "4750",
-  "squash - butternut": "4759",
-  "squash - chayote": "4761",
-  "squash - delicotta": "4763",
-  "squash - golden nugget": "4767",
-  "squash - hubbard": "4768",
-  "squash - kabocha": "4769",
-  "squash - spaghetti": "4776",
-  "squash - sweet dumpling": "4764",
-  "squash - turban": "4780",
-  "squash - yellow": "4784",
-  "squash - zucchini": "4067",
-  "squash - buttercup": "4758",
-  "star fruit": "4256",
-  "tamarindo": "4448",
-  "tangelos (monneola)": "4383",
-  "tangerines - pixie": "4457",
-  "tangerines - sunburst": "4449",
-  "tomatillos": "4801",
-  "tomato - cluster": "4664",
-  "tomato - green": "4064",
-  "tomato - greenhouse": "4799",
-  "tomato - heirloom": "4807",
-  "tomato - locally grown": "4800",
-  "tomato - roma": "4087",
-  "tomato - vintage vineripe": "3423",
-  "tomato - yellow": "4778",
-  "turnip roots": "4813",
-  "ugli fruit": "4459",
-  "personal watermelon": "3421",
-  "slice of watermelon": "4376",
-  "watermelon (seeded)": "4031",
-  "watermelon (seedless)": "4032",
-  "yuca root": "4819",
-  "bagels": "320",
-  "christmas trees": "1225",
-  "cookies by bag": "301",
-  "cookies by box": "305",
-  "self serve donuts": "300",
-  "dry ice": "900",
-  "muffins": "315",
-  "olive bar": "351",
-  "rolls": "309",
-  "salad bar": "350",
-  "whole bean coffee": "328",
-  "almond butter": "4950",
-  "organic peanut butter": "4951",
-  "honey peanut butter": "4948",
-  "dry roast butter": "4947",
-  "croissants": "726",
-  "wing bar": "7202",
-  "peanut": "9901"
-}
-
 defaultCodeToName = {
   "3438": "apples - ambrosia",
   "4103": "apples - braeburn",
@@ -483,6 +281,18 @@ defaultCodeToName = {
   "9901": "peanut"
 }
 
+defaultNameToCode = {name: code for code, name in defaultCodeToName.items()}
+
+# DATABASE FILES
+DATABASE_FILE = 'pluDatabase.json'                      # code -> name snapshot
+JOURNAL_FILE = 'pluDatabase.journal'                    # changes since the snapshot, one JSON op per line
+LOCK_FILE = 'pluDatabase.lock'                          # held by whichever process is writing
+SQLITE_FILE = 'pluDatabase.sqlite'                      # optional SQLite backend
+SNAPSHOT_FILE = 'pluDatabase.snap'                      # optional compiled read-only snapshot
+OVERLAY_FILE = 'pluOverlay.json'                        # a store's changes on top of the shared base
+LEGACY_FILES = ('codeToName.json', 'nameToCode.json')   # read once to migrate
+SQL_NUMERIC_CODE = "code NOT GLOB '*[^0-9]*'"           # codes that are all digits, in the SQLite backend
+
 # Handlers and Utilities
 def problem_child(action_function):     #Used in database modification cmds
     """
@@ -490,7 +300,7 @@ def problem_child(action_function):     #Used in database modification cmds
     """
     try:
         action_function()
-    except (KeyError, ValueError) as e:
+    except (KeyError, ValueError, OSError) as e:
         print(f"Error: {e}")
         return
 
@@ -525,343 +335,4731 @@ def whisper(prompt: str, canCancel: bool=True, numeric: bool=False):
                 continue
             return userInput
 
-def eagle(query):
+
+class NgramIndex:
     """
-    Lookup helper that searches dictionaries with exact, partial, or fuzzy matching.
-    Returns a list of (code, name) tuples matching the query.
+    Inverted index of character n-grams over produce names. Used by the partial match tier of eagle().
+    Names keep their insertion order so matches come back in the same order as a scan of nameToCode.
     """
-    global dbCodeToName, dbNameToCode
+    def __init__(self, n: int=3):
+        self.n = n
+        self.postings = {}  # gram -> set of names
+        self.order = {}     # name -> insertion number
+        self.counter = 0
 
-    results = []
+    def grams(self, text: str) -> set:
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
 
-    # Normalize query
-    query = str(query).strip().lower()
+    def add(self, name: str) -> None:
+        if name in self.order:
+            return
+        self.order[name] = self.counter
+        self.counter += 1
+        for gram in self.grams(name):
+            self.postings.setdefault(gram, set()).add(name)
 
-    # 1. Exact match by code
-    if query in dbCodeToName:
-        results.append((query, dbCodeToName[query]))
-        return results
+    def remove(self, name: str) -> None:
+        if self.order.pop(name, None) is None:
+            return
+        for gram in self.grams(name):
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            posting.discard(name)
+            if not posting:
+                del self.postings[gram]
 
-    # 2. Exact match by name
-    if query in dbNameToCode:
-        code = dbNameToCode[query]
-        results.append((code, query))
-        return results
+    def rebuild(self, names) -> None:
+        self.postings = {}
+        self.order = {}
+        self.counter = 0
+        for name in names:
+            self.add(name)
 
-    # 3. Partial match in names
-    for name, code in dbNameToCode.items():
-        if query in name:
-            results.append((code, name))
+    def search(self, query: str):
+        """
+        Returns names containing query in insertion order, or None if the query is
+        shorter than n and the caller has to scan instead.
+        """
+        if len(query) < self.n:
+            return None
+        posting_lists = []
+        for gram in self.grams(query):
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            posting_lists.append(posting)
+        posting_lists.sort(key=len)
+        candidates = set(posting_lists[0])
+        for posting in posting_lists[1:]:
+            candidates &= posting
+            if not candidates:
+                return []
+        matches = [name for name in candidates if query in name]
+        matches.sort(key=self.order.__getitem__)
+        return matches
 
-    if results:
-        return results
 
-    # 4. Fuzzy match using difflib
-    name_matches = difflib.get_close_matches(query, dbNameToCode.keys(), n=5, cutoff=0.6)
-    for name in name_matches:
-        code = dbNameToCode[name]
-        results.append((code, name))
+class QueryCache:
+    """
+    Bounded LRU cache of search results keyed on the normalized query. Each entry remembers the
+    catalog generation it was computed for, so any change to the catalog makes older entries misses.
+    """
+    def __init__(self, maxsize: int=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()    # query -> (generation, results)
+        self.hits = 0
+        self.misses = 0
 
-    return results
-    
+    def get(self, query: str, generation: int):
+        entry = self.entries.get(query)
+        if entry is None or entry[0] != generation:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(query)
+        self.hits += 1
+        return entry[1]
 
-# Dev Tools
-def dbprint(message: str) -> str: 
-    print("===[DEVELOPER]===: " + message + "\n")
+    def put(self, query: str, generation: int, results: list) -> None:
+        if self.maxsize <= 0:
+            return
+        self.entries[query] = (generation, results)
+        self.entries.move_to_end(query)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
 
-# Flags & Variables
-enableCustomData = False
-dbCodeToName = {}
-dbNameToCode = {}
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
 
-#1 - Initialize Database
-def initData():
-    """    
-    Sets up database in RAM. THIS MUST RUN FIRST, OTHERWISE DATABASE WILL BE EMPTY.
-    If user is on mobile, custom databases are disabled.
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitRate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.entries), "maxsize": self.maxsize}
+
+
+class Metrics:
     """
-    global enableCustomData, dbCodeToName, dbNameToCode
-
-    # Disable custom data on mobile platforms
-    if platform.system() == "Windows" or platform.system() == "Darwin":
-        # dbprint("running on " + platform.system())
-        enableCustomData = True
-
-    # Handling custom datasets
-    if enableCustomData:        
-        code_file_exists = os.path.exists('codeToName.json')
-        name_file_exists = os.path.exists('nameToCode.json')
-        if code_file_exists and name_file_exists:
-            with open('codeToName.json', 'r') as f:
-                dbCodeToName = json.load(f)
-            with open('nameToCode.json', 'r') as s:
-                dbNameToCode = json.load(s)
-        elif not code_file_exists and not name_file_exists:
-            print("\nWelcome to Produce Lookup Tool!\n")
-            print("Custom databases allow you to add, remove, and modify item codes and names to \nyour specifications. These files are stored in the same folder as this program.\n")
-            userResponse = input("Create a new database with default values? (y/n): ").strip().lower()
-            if userResponse == "y":
-                with open('codeToName.json', 'w') as f:
-                    json.dump(defaultCodeToName, f, indent=2)
-                with open('nameToCode.json', 'w') as s:
-                    json.dump(defaultNameToCode, s, indent=2)
-                dbCodeToName = defaultCodeToName
-                dbNameToCode = defaultNameToCode
-                print("Files created successfully.")
-            else:
-                print("\nProceeding with default values.")
-                enableCustomData = False
-                dbCodeToName = defaultCodeToName
-                dbNameToCode = defaultNameToCode
+    Counters and latency histograms for searches (labelled by the tier that answered), changes
+    and load/save. Off by default; while off, the only cost is checking the enabled flag.
+    Read it back with summary() or export it in Prometheus text format with prometheus().
+    """
+    BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+               0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)     # seconds
+    FAMILIES = {
+        "search": ("tier", "Searches by the tier that answered them, or cache for repeated queries"),
+        "action": ("action", "Add, remove, edit and bulk import calls, including writing the journal"),
+        "storage": ("operation", "Database loads, saves and reloads of changes made by other processes"),
+    }
+
+    def __init__(self, enabled: bool=False):
+        self.enabled = enabled
+        self.buckets = {}       # (family, label) -> observations per bucket, last one is +Inf
+        self.sums = {}          # (family, label) -> total seconds
+        self.maxima = {}        # (family, label) -> slowest observation
+        self.errors = {}        # (family, label) -> calls that raised
+        self.lock = threading.Lock()    # background compaction records from its own thread
+
+    def observe(self, family: str, label: str, seconds: float) -> None:
+        key = (family, label)
+        i = bisect.bisect_left(self.BUCKETS, seconds)
+        with self.lock:
+            counts = self.buckets.get(key)
+            if counts is None:
+                counts = self.buckets[key] = [0] * (len(self.BUCKETS) + 1)
+                self.sums[key] = 0.0
+                self.maxima[key] = 0.0
+            counts[i] += 1
+            self.sums[key] += seconds
+            if seconds > self.maxima[key]:
+                self.maxima[key] = seconds
+
+    def fail(self, family: str, label: str) -> None:
+        with self.lock:
+            self.errors[(family, label)] = self.errors.get((family, label), 0) + 1
+
+    @contextlib.contextmanager
+    def timing(self, family: str, label: str):
+        """Times the block into family/label. Exceptions are counted as errors and not timed."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.fail(family, label)
+            raise
+        self.observe(family, label, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.buckets.clear()
+            self.sums.clear()
+            self.maxima.clear()
+            self.errors.clear()
+
+    def quantile(self, counts: list, fraction: float) -> float:
+        """Upper bound of the bucket holding the given quantile."""
+        target = fraction * sum(counts)
+        seen = 0
+        for bound, count in zip(self.BUCKETS, counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def summary(self) -> list:
+        """One dict per family/label: count, errors, mean, approximate p50/p99 and max, in milliseconds."""
+        rows = []
+        with self.lock:
+            for key in sorted(set(self.buckets) | set(self.errors), key=lambda key: (list(self.FAMILIES).index(key[0]), key[1])):
+                counts = self.buckets.get(key, [0] * (len(self.BUCKETS) + 1))
+                count = sum(counts)
+                rows.append({
+                    "family": key[0], "label": key[1], "count": count, "errors": self.errors.get(key, 0),
+                    "meanMs": self.sums[key] / count * 1000 if count else 0.0,
+                    "p50Ms": min(self.quantile(counts, 0.5), self.maxima[key]) * 1000 if count else 0.0,
+                    "p99Ms": min(self.quantile(counts, 0.99), self.maxima[key]) * 1000 if count else 0.0,
+                    "maxMs": self.maxima.get(key, 0.0) * 1000,
+                })
+        return rows
+
+    def prometheus(self) -> str:
+        """The metrics in Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for family, (label_name, help_text) in self.FAMILIES.items():
+                metric = f"plu_{family}_seconds"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key in sorted(key for key in self.buckets if key[0] == family):
+                    label = f'{label_name}="{key[1]}"'
+                    total = 0
+                    for bound, count in zip(self.BUCKETS, self.buckets[key]):
+                        total += count
+                        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {total}')
+                    total += self.buckets[key][-1]
+                    lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {total}')
+                    lines.append(f"{metric}_sum{{{label}}} {self.sums[key]}")
+                    lines.append(f"{metric}_count{{{label}}} {total}")
+            lines.append("# HELP plu_errors_total Calls that raised an error")
+            lines.append("# TYPE plu_errors_total counter")
+            for (family, label), count in sorted(self.errors.items()):
+                lines.append(f'plu_errors_total{{family="{family}",{self.FAMILIES[family][0]}="{label}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, filename: str) -> None:
+        """Writes prometheus() through a temporary file, so a collector never reads half a file."""
+        with open(filename + ".tmp", 'w') as f:
+            f.write(self.prometheus())
+        os.replace(filename + ".tmp", filename)
+
+
+def normalizeKey(text: str) -> str:
+    """
+    The search key of a name or query: accents stripped (NFKD), casefolded, and every run of
+    punctuation or spaces turned into one space. "Broc-O-Flower" and "broc o flower" share a key,
+    as do "jalapeño" and "jalapeno". Names are still stored and shown as entered.
+    """
+    if not text.isascii():
+        text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[^\W_]+", text.casefold()))
+
+
+def tokenize(text: str) -> list:
+    """Splits a name or query into words, dropping the ' - ' and parenthesis separators and any accents."""
+    if not text.isascii():
+        text = normalizeKey(text)
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def editDistance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent swaps).
+    Returns max_distance + 1 as soon as the distance is known to be larger.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+SOUNDEX_CODES = {letter: digit for letters, digit in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"),
+                                                     ("l", "4"), ("mn", "5"), ("r", "6"))
+                 for letter in letters}
+
+
+def phoneticKey(word: str) -> str:
+    """
+    Soundex code of a word, without the usual cut to four characters: the first letter, then one
+    digit per run of like-sounding consonants, so "brocoli" and "broccoli" both give b624.
+    Vowels separate runs and h/w do not, and a final s is dropped so plurals share a key.
+    Words under 3 letters or with digits are their own key.
+    """
+    if len(word) < 3 or not word.isalpha():
+        return word
+    if word.endswith("s"):
+        word = word[:-1]
+    key = [word[0]]
+    last = SOUNDEX_CODES.get(word[0], "")
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit is None:
+            if letter not in "hw":
+                last = ""
+            continue
+        if digit != last:
+            key.append(digit)
+        last = digit
+    return "".join(key)
+
+
+def completionRank(name: str, prefix: str):
+    """0 if name starts with prefix, n if its n-th word (counting from 0) does, None if neither."""
+    if name.startswith(prefix):
+        return 0
+    for position, word in enumerate(re.finditer(r"[a-z0-9]+", name)):
+        if position and name.startswith(prefix, word.start()):
+            return position
+    return None
+
+
+def completionTail(name: str, prefix: str):
+    """
+    The text of name from its first later word starting with prefix, the key PrefixIndex files
+    the name under in its tails (the lowest, if several words match), or None if no later word does.
+    """
+    tails = [name[word.start():] for position, word in enumerate(re.finditer(r"[a-z0-9]+", name))
+             if position and name.startswith(prefix, word.start())]
+    return min(tails, default=None)
+
+
+def countUse(usage: dict, query: str, results: list) -> None:
+    """Counts a lookup that named one item exactly, by code or by name, for autocomplete ranking."""
+    if len(results) == 1 and query in results[0]:
+        name = results[0][1]
+        usage[name] = usage.get(name, 0) + 1
+
+
+def addProblem(database, name: str, code: str):
+    """Why add() would refuse an already cleaned name and code, or None. Used by addMany() for each row."""
+    if not name or not code:
+        return "Name and code cannot be empty"
+    existing = database.nameFor(code)
+    if existing is not None:
+        return f"PLU code '{code}' already exists for '{existing}'"
+    existing = database.codeFor(name)
+    if existing is not None:
+        return f"Produce name '{name}' already exists with PLU code '{existing}'"
+    return None
+
+
+def rankCompletions(names, prefix: str, k: int, usage: dict) -> list:
+    """Top k names by word position of the prefix match, then by how often each name was looked up."""
+    ranked = []
+    for name in set(names):
+        rank = completionRank(name, prefix)
+        if rank is not None:
+            ranked.append((rank, -usage.get(name, 0), name))
+    return [name for _, _, name in heapq.nsmallest(k, ranked)]
+
+
+class PrefixIndex:
+    """
+    Sorted arrays for type-ahead. Every name is filed under itself in heads, and under each later
+    word in tails ("apples - fuji" under "fuji"), so a prefix is one bisect plus a walk over its matches.
+    """
+    def __init__(self):
+        self.heads = []     # sorted (name, name)
+        self.tails = []     # sorted (text from a later word start, name)
+
+    def keys(self, name: str):
+        yield self.heads, (name, name)
+        for position, word in enumerate(re.finditer(r"[a-z0-9]+", name)):
+            if position:
+                yield self.tails, (name[word.start():], name)
+
+    def add(self, name: str) -> None:
+        for entries, entry in self.keys(name):
+            bisect.insort(entries, entry)
+
+    def remove(self, name: str) -> None:
+        for entries, entry in self.keys(name):
+            i = bisect.bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    def rebuild(self, names) -> None:
+        self.heads = []
+        self.tails = []
+        for name in names:
+            for entries, entry in self.keys(name):
+                entries.append(entry)
+        self.heads.sort()
+        self.tails.sort()
+
+    def entryMatches(self, entries, prefix: str):
+        """Yields the (key, name) entries whose key starts with prefix, in order."""
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix):
+            yield entries[i]
+            i += 1
+
+    def matches(self, entries, prefix: str):
+        for _, name in self.entryMatches(entries, prefix):
+            yield name
+
+    def complete(self, prefix: str, k: int=10, usage=None) -> list:
+        """
+        Up to k names with a word starting with prefix. Names that start with it come first,
+        in alphabetical order. With usage counts, every match is ranked by rankCompletions().
+        """
+        if usage is not None:
+            return rankCompletions(itertools.chain(self.matches(self.heads, prefix), self.matches(self.tails, prefix)), prefix, k, usage)
+        found = []
+        for name in itertools.chain(self.matches(self.heads, prefix), self.matches(self.tails, prefix)):
+            if len(found) == k:
+                break
+            if name not in found:
+                found.append(name)
+        return found
+
+
+class SortedView:
+    """
+    Names in sorted order for Show All, kept up to date with bisect as items change, and counts of
+    code and name lengths, so neither a page of the catalog nor its column widths needs a full pass.
+    """
+    def __init__(self):
+        self.names = []         # sorted names
+        self.codeLengths = {}   # length -> codes that long
+        self.nameLengths = {}   # length -> names that long
+
+    def count(self, lengths: dict, length: int, step: int) -> None:
+        total = lengths.get(length, 0) + step
+        if total:
+            lengths[length] = total
         else:
-            print("Inconsistent database state: Only one of codeToName.json or nameToCode.json exists.")
-            print("Please delete the existing file(s) so both can be created together with defaults.\n")
-            print("Proceeding with default values.")
-            enableCustomData = False
-            dbCodeToName = defaultCodeToName
-            dbNameToCode = defaultNameToCode
-    else:
-        dbCodeToName = defaultCodeToName
-        dbNameToCode = defaultNameToCode
+            lengths.pop(length, None)
 
-def saveDatabases():
-    """Writes the current database dictionaries to JSON files, if custom data is enabled."""
-    global enableCustomData, dbCodeToName, dbNameToCode
+    def add(self, name: str, code: str) -> None:
+        bisect.insort(self.names, name)
+        self.count(self.nameLengths, len(name), 1)
+        self.count(self.codeLengths, len(code), 1)
 
-    if not enableCustomData:
-        return  # Do nothing
-    
-    try:
-        with open('codeToName.json', 'w') as f:
-            json.dump(dbCodeToName, f, indent=2)
-        with open('nameToCode.json', 'w') as s:
-            json.dump(dbNameToCode, s, indent=2)
-        print("Saving JSON files...")
-    except Exception as e:
-        print(f"Error saving database: {e}")
+    def remove(self, name: str, code: str) -> None:
+        i = bisect.bisect_left(self.names, name)
+        if i < len(self.names) and self.names[i] == name:
+            del self.names[i]
+            self.count(self.nameLengths, len(name), -1)
+            self.count(self.codeLengths, len(code), -1)
 
+    def recode(self, old_code: str, new_code: str) -> None:
+        self.count(self.codeLengths, len(old_code), -1)
+        self.count(self.codeLengths, len(new_code), 1)
 
-# ===================== USER ACTION FUNCTIONS =====================
+    def rebuild(self, nameToCode: dict) -> None:
+        self.names = sorted(nameToCode)
+        self.codeLengths, self.nameLengths = {}, {}
+        for name, code in nameToCode.items():
+            self.count(self.nameLengths, len(name), 1)
+            self.count(self.codeLengths, len(code), 1)
 
-#1 - Search
-def searchItem():
-    query = whisper("Enter produce name or PLU code to search (or 'cancel'): ", True, False)
-    results = eagle(query)
+    def widths(self) -> tuple:
+        """(longest code, longest name)"""
+        return max(self.codeLengths, default=0), max(self.nameLengths, default=0)
 
-    if not results:
-        print("No matches found.")
-        return
-    
-    print("\n=== Search Results ===")
-    for code, name in results:
-        print(f"{code} - {name}")
-    print()
+    def page(self, offset: int=0, limit=None):
+        """Yields the names from position offset on, at most limit of them."""
+        end = len(self.names) if limit is None else min(len(self.names), offset + limit)
+        for i in range(max(0, offset), end):
+            yield self.names[i]
 
-#2 - Add Item
-def databaseAdd():
-    global dbCodeToName, dbNameToCode
-    query_name = whisper("ADD: Enter new item name (or 'cancel'): ", True, False)
-    query_code = whisper("Enter new item code (or 'cancel'): ", True, True)
 
-    # query_code from int -> string
-    query_code = str(query_code).strip()
+class KeyIndex:
+    """
+    Names by normalizeKey(), for the exact-name tier. Only names whose key differs from the name
+    are kept; a key that is itself a name is found in the catalog's own dictionary.
+    """
+    def __init__(self):
+        self.names = {}     # key -> names with that key
 
-    # Prevent duplicates
-    if query_code in dbCodeToName:
-        print(f"\nPLU code '{query_code}' already exists for '{dbCodeToName[query_code]}'.")
-        return
-    if query_name in dbNameToCode:
-        print(f"Produce name '{query_name}' already exists with PLU code '{dbNameToCode[query_name]}'.")
-        return
+    def add(self, name: str) -> None:
+        key = normalizeKey(name)
+        if key != name:
+            self.names.setdefault(key, []).append(name)
 
-    if query_name and query_code:
-        dbCodeToName[query_code] = query_name
-        dbNameToCode[query_name] = query_code
-        print(f"=== Added item: {query_code} - {query_name} ===")
-        if enableCustomData:
-            saveDatabases()
-        print(f"JSON files updated successfully!")
-    else:
-        print("Add operation cancelled.")
+    def remove(self, name: str) -> None:
+        key = normalizeKey(name)
+        names = self.names.get(key)
+        if names and name in names:
+            names.remove(name)
+            if not names:
+                del self.names[key]
 
+    def rebuild(self, names) -> None:
+        self.names = {}
+        for name in names:
+            self.add(name)
 
-#3 - Remove item
-def databaseRemove():
-    global dbCodeToName, dbNameToCode
-    user_input = whisper("REMOVE: Enter item code or exact name to remove (or 'cancel'): ", True, False)
-    # Try as code
-    if user_input in dbCodeToName:
-        name = dbCodeToName[user_input]
-        confirm = input(f"Are you sure you want to remove '{user_input} - {name}'? (y/n): ").strip().lower()
-        if confirm != 'y':
-            print("Delete cancelled.")
+    def match(self, key: str) -> list:
+        return self.names.get(key, [])
+
+
+class CodeIndex:
+    """
+    Numeric codes in order, as a sorted array of their values with the code strings alongside, so
+    a range ("3000-3999") or a prefix ("4xxx", "94*") is two bisects plus a walk over its matches.
+    Codes that are not all digits are left out; they can still be found exactly.
+    """
+    def __init__(self):
+        self.numbers = array('q')   # sorted int(code)
+        self.codes = []             # the code strings, in the same order
+        self.lengths = {}           # length -> codes that long
+
+    @staticmethod
+    def numeric(code: str) -> bool:
+        return code.isascii() and code.isdigit()
+
+    def add(self, code: str) -> None:
+        if not self.numeric(code):
             return
-        del dbCodeToName[user_input]
-        if name in dbNameToCode:
-            del dbNameToCode[name]
-        print(f"Removed item: {user_input} - {name}")
-        if enableCustomData:
-            saveDatabases()
-        print(f"JSON files updated successfully!")
-        return
-    # Try as name
-    if user_input in dbNameToCode:
-        code = dbNameToCode[user_input]
-        confirm = input(f"Are you sure you want to remove '{code} - {user_input}'? (y/n): ").strip().lower()
-        if confirm != 'y':
-            print("Delete cancelled.")
+        i = bisect.bisect_right(self.numbers, int(code))
+        self.numbers.insert(i, int(code))
+        self.codes.insert(i, code)
+        self.lengths[len(code)] = self.lengths.get(len(code), 0) + 1
+
+    def remove(self, code: str) -> None:
+        if not self.numeric(code):
             return
-        del dbNameToCode[user_input]
-        if code in dbCodeToName:
-            del dbCodeToName[code]
-        print(f"Removed item: {code} - {user_input}")
-        if enableCustomData:
-            saveDatabases()
-        print(f"JSON files updated successfully!")
-        return
-    print("Item not found.")
+        i = bisect.bisect_left(self.numbers, int(code))
+        while i < len(self.numbers) and self.numbers[i] == int(code):
+            if self.codes[i] == code:   # "0401" and "401" share a number
+                del self.numbers[i]
+                del self.codes[i]
+                self.lengths[len(code)] -= 1
+                if not self.lengths[len(code)]:
+                    del self.lengths[len(code)]
+                return
+            i += 1
 
+    def rebuild(self, codes) -> None:
+        pairs = sorted((int(code), code) for code in codes if self.numeric(code))
+        self.numbers = array('q', (number for number, _ in pairs))
+        self.codes = [code for _, code in pairs]
+        self.lengths = {}
+        for code in self.codes:
+            self.lengths[len(code)] = self.lengths.get(len(code), 0) + 1
 
-#4 - Edit item
-def databaseEditEntry():
-    global dbCodeToName, dbNameToCode
-    user_input = whisper("EDIT: Enter item code or exact name to edit (or 'cancel'): ", True, False)
+    def range(self, low: int, high: int):
+        """Yields the codes whose value is between low and high inclusive, in numeric order."""
+        i = bisect.bisect_left(self.numbers, low)
+        stop = bisect.bisect_right(self.numbers, high)
+        for j in range(i, stop):
+            yield self.codes[j]
 
-    # Set target item
-    if user_input in dbCodeToName:
-        code = user_input
-        name = dbCodeToName[code]
-    elif user_input in dbNameToCode:
-        name = user_input
-        code = dbNameToCode[name]
-    else:
-        print("Item not found.")
-        return
+    def prefix(self, digits: str, length=None):
+        """
+        Yields the codes starting with digits, only those length digits long if given. Shorter codes
+        come first, then numeric order. Each length is one numeric range: "94" at length 5 is 94000-94999.
+        """
+        for size in sorted(self.lengths):
+            if size < len(digits) or (length is not None and size != length):
+                continue
+            scale = 10 ** (size - len(digits))
+            start = int(digits or 0)
+            for code in self.range(start * scale, (start + 1) * scale - 1):
+                if len(code) == size and code.startswith(digits):
+                    yield code
 
-    # Request new data
-    print(f"Editing item: {code} - {name}")
-    new_name = whisper(f"Enter new name (Old name: '{name}'): ", True, False)
-    new_code = whisper(f"Enter new code (Old code: '{code}'): ", True, True)
 
-    # Validate and update name
-    if new_name and new_name != name:
-        if new_name in dbNameToCode:
-            print("That name already exists.")
+def categoryNames(names: list, category: str):
+    """
+    Yields the names in the sorted list that are category itself or "category - <variety>",
+    in order, with two bisects.
+    """
+    i = bisect.bisect_left(names, category)
+    if i < len(names) and names[i] == category:
+        yield category
+    prefix = category + " - "
+    i = bisect.bisect_left(names, prefix, i)
+    while i < len(names) and names[i].startswith(prefix):
+        yield names[i]
+        i += 1
+
+def parseCodePattern(pattern: str):
+    """
+    Reads a code query: "3000-3999" is a range, "4xxx" a prefix with a fixed length (x for each
+    digit), and "94*" a prefix of any length. Returns ("range", low, high), ("prefix", digits, length)
+    or None if pattern is none of these.
+    """
+    pattern = str(pattern).strip().lower().replace(" ", "")
+    found = re.fullmatch(r"([0-9]+)-([0-9]+)", pattern)
+    if found:
+        low, high = int(found.group(1)), int(found.group(2))
+        return "range", min(low, high), max(low, high)
+    found = re.fullmatch(r"([0-9]*)(x+|\*)", pattern)
+    if found:
+        digits, wildcard = found.groups()
+        return "prefix", digits, None if wildcard == "*" else len(digits) + len(wildcard)
+    return None
+
+
+class TokenIndex:
+    """
+    Ranked word search. Postings map each word to the names containing it, and names are scored
+    with BM25, so names sharing the query's rarer words come first whatever the word order
+    ("fuji apple" finds "apples - fuji"). A query word also matches the longer words it starts
+    ("appl" -> "apples"), weighted by len(query word) / len(word), so unfinished words still rank.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = {}      # word -> {name: times the word appears in it}
+        self.lengths = {}       # name -> words in it
+        self.words = []         # sorted vocabulary, for prefix expansion
+        self.limits = {}        # word -> (most times in one name, fewest words of a name with it), bounds its score
+        self.totalLength = 0
+
+    def add(self, name: str) -> None:
+        words = tokenize(name)
+        if not words or name in self.lengths:
             return
-        del dbNameToCode[name]
-        dbNameToCode[new_name] = code
-        dbCodeToName[code] = new_name
-        name = new_name
-
-    # Validate and update code
-    if new_code and str(new_code) != code:
-        new_code_str = str(new_code)
-        if new_code_str in dbCodeToName:
-            print("That code already exists.")
+        self.lengths[name] = len(words)
+        self.totalLength += len(words)
+        for word in words:
+            names = self.postings.get(word)
+            if names is None:
+                names = self.postings[word] = {}
+                bisect.insort(self.words, word)
+            names[name] = names.get(name, 0) + 1
+        for word in set(words):
+            count, length = self.limits.get(word, (0, len(words)))
+            self.limits[word] = (max(count, words.count(word)), min(length, len(words)))
+
+    def remove(self, name: str) -> None:
+        length = self.lengths.pop(name, None)
+        if length is None:
             return
-        del dbCodeToName[code]
-        dbCodeToName[new_code_str] = name
-        dbNameToCode[name] = new_code_str
-        code = new_code_str
+        self.totalLength -= length
+        for word in set(tokenize(name)):
+            names = self.postings[word]
+            del names[name]
+            if not names:
+                del self.postings[word]
+                del self.limits[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+            # limits are left as they are: still bounds, if looser ones
 
-    print(f"Updated item: {code} - {name}")
-    if enableCustomData:
-        saveDatabases()
-        print(f"JSON files updated successfully!")
+    def rebuild(self, names) -> None:
+        self.postings, self.lengths, self.totalLength = {}, {}, 0
+        for name in names:
+            words = tokenize(name)
+            if not words:
+                continue
+            self.lengths[name] = len(words)
+            self.totalLength += len(words)
+            for word in words:
+                postings = self.postings.setdefault(word, {})
+                postings[name] = postings.get(name, 0) + 1
+        self.words = sorted(self.postings)
+        self.limits = {word: (max(names.values()), min(self.lengths[name] for name in names))
+                       for word, names in self.postings.items()}
 
+    def expand(self, token: str):
+        """Yields the indexed words starting with token."""
+        i = bisect.bisect_left(self.words, token)
+        while i < len(self.words) and self.words[i].startswith(token):
+            yield self.words[i]
+            i += 1
 
+    # ---------- Statistics ----------
+    # search() reads the index only through these, so LayeredTokenIndex and SnapshotTokenIndex
+    # can answer from other storage
+    def documentCount(self) -> int:
+        return len(self.lengths)
 
-#5 - Show all
-def display_all_items():
-    global dbCodeToName
-    print()
-    print("=== Current PLU Database ===")
-    print()
-    if not dbCodeToName or len(dbCodeToName) == 0:
-        print("Database is empty.")
-        return
-    # Find max length for code for formatting
-    code_width = max([len(str(code)) for code in dbCodeToName.keys()] + [4])
-    name_width = max([len(str(name)) for name in dbCodeToName.values()] + [12])
-    # Header
-    print(f"{'PLU':<{code_width}}  {'Produce Name':<{name_width}}")
-    print("-" * (code_width + 2 + name_width))
-    # Sort by produce name alphabetically
-    for code, name in sorted(dbCodeToName.items(), key=lambda item: item[1].lower()):
-        print(f"{code:<{code_width}}  {name:<{name_width}}")
-    print()
-    print()
+    def averageLength(self) -> float:
+        return self.totalLength / len(self.lengths)
 
-#6 - Reset to Default
-def resetToDefaults():
-    """Resets both codeToName.json and nameToCode.json to default values."""
-    global dbCodeToName, dbNameToCode
-    confirm = input("Are you sure you want to reset both databases to default values? (y/n): ").strip().lower()
-    if confirm != 'y':
-        print("Reset cancelled.")
-        return
-    dbCodeToName = defaultCodeToName.copy()
-    dbNameToCode = defaultNameToCode.copy()
-    if enableCustomData:
-        saveDatabases()
-    print("Databases reset to default values.")
+    def documentsWith(self, word: str) -> int:
+        return len(self.postings[word])
 
+    def bound(self, word: str) -> tuple:
+        """(most times word is in one name, fewest words of a name with it)"""
+        return self.limits[word]
 
+    def matches(self, word: str):
+        """Yields (name, times word is in it, words in the name) for every name with word."""
+        lengths = self.lengths
+        for name, count in self.postings[word].items():
+            yield name, count, lengths[name]
 
+    def idf(self, word: str) -> float:
+        documents = self.documentsWith(word)
+        return math.log(1 + (self.documentCount() - documents + 0.5) / (documents + 0.5))
 
+    def termScore(self, idf: float, count: int, length: int, average: float) -> float:
+        return idf * count * (self.k1 + 1) / (count + self.k1 * (1 - self.b + self.b * length / average))
 
+    def score(self, name: str, tokens: list, average: float) -> float:
+        """Exact score of one name: for each query word, its best-scoring match among the name's words."""
+        words = tokenize(name)
+        total = 0.0
+        for token in tokens:
+            total += max((len(token) / len(word) * self.termScore(self.idf(word), words.count(word), len(words), average)
+                          for word in set(words) if word.startswith(token)), default=0.0)
+        return total
 
+    def settled(self, totals: dict, best: dict, left: list, leaders: set, kth: float) -> bool:
+        """True if no name outside leaders can reach kth, given the best score still possible per query word."""
+        for name, total in totals.items():
+            if name in leaders:
+                continue
+            gain = 0.0
+            for t, bound in enumerate(left):
+                if bound > best.get((name, t), 0.0):
+                    gain += bound - best.get((name, t), 0.0)
+            if total + gain > kth or (gain and total + gain == kth):    # a tie still to come could win on the tie-break
+                return False
+        return True
 
-# Main Menu Loop
+    def search(self, query: str, k: int=10, visible=None) -> list:
+        """
+        Up to k (name, score) pairs, best first. Matched words are taken in order of the most
+        they could score (MaxScore). A name keeps its best match per query word, so once no name
+        outside the k best, and no name not seen yet, could overtake the k-th with the words left,
+        the rest are skipped and only the top k are scored exactly. visible(name) -> False leaves a name out.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.documentCount() or k <= 0:
+            return []
+        average = self.averageLength()
 
+        # (upper bound of the word's contribution, query word, word, weight, idf), most valuable first
+        terms = []
+        for t, token in enumerate(tokens):
+            for word in self.expand(token):
+                weight, idf = len(token) / len(word), self.idf(word)
+                terms.append((weight * self.termScore(idf, *self.bound(word), average), t, word, weight, idf))
+        terms.sort(reverse=True)
+        left = [0.0] * len(tokens)          # largest bound still to come for each query word
+        after = []                          # for each term, the next bound of the same query word
+        for bound, t, *_ in reversed(terms):
+            after.append(left[t])
+            left[t] = bound
+        after.reverse()
 
-def mainMenu() -> None:
+        totals = {}         # name -> score so far
+        best = {}           # (name, query word) -> best contribution so far
+        check = 1
+        for done, (bound, t, word, weight, idf) in enumerate(terms, 1):
+            for name, count, length in self.matches(word):
+                if visible is not None and not visible(name):
+                    continue
+                gain = weight * self.termScore(idf, count, length, average) - best.get((name, t), 0.0)
+                if gain > 0:
+                    best[name, t] = best.get((name, t), 0.0) + gain
+                    totals[name] = totals.get(name, 0.0) + gain
+            left[t] = after[done - 1]
+            if done == check and len(totals) >= k:
+                check *= 2      # checking costs a pass over the candidates, so do it less and less often
+                leaders = heapq.nsmallest(k, totals, key=lambda name: (-totals[name], len(name), name))
+                kth = totals[leaders[-1]]
+                if sum(left) < kth and self.settled(totals, best, left, set(leaders), kth):
+                    break
+
+        top = heapq.nsmallest(k, totals, key=lambda name: (-totals[name], len(name), name))
+        ranked = [(name, self.score(name, tokens, average)) for name in top]
+        ranked.sort(key=lambda item: (-item[1], len(item[0]), item[0]))
+        return ranked
+
+
+class DifflibMatcher:
     """
-    Displays menu items based on enableCustomData flag and handles user navigation.
-    If sub-functions raise errors, they are caught and the user is returned to this menu.
+    Reference fuzzy engine. Scores every name with difflib, exactly like the original fuzzy tier.
     """
-    global enableCustomData
-    isRunning = True
+    def __init__(self):
+        self.names = {}
 
-    # Define menu options
-    menu_options = {
-        1: ("Search", searchItem),
-        2: ("Add item", databaseAdd),
-        3: ("Remove item", databaseRemove),
-        4: ("Edit item", databaseEditEntry),
-        5: ("Show All", display_all_items),
-        6: ("Reset to Defaults", resetToDefaults),
-        7: ("Quit", lambda: print("Goodbye!"))
-    }
+    def add(self, name: str) -> None:
+        pass    # self.names is the live nameToCode dictionary
 
-    # Filter options for Limited Mode
-    if not enableCustomData:
-        menu_options = {key: value for key, value in menu_options.items() if key in [1, 5, 7]}
+    def remove(self, name: str) -> None:
+        pass
 
-    def display_menu():
+    def rebuild(self, names) -> None:
+        self.names = names
+
+    def match(self, query: str, n: int=5, cutoff: float=0.6) -> list:
+        return difflib.get_close_matches(query, self.names.keys(), n=n, cutoff=cutoff)
+
+
+class SymSpellMatcher:
+    """
+    Fuzzy engine backed by a SymSpell-style deletion index over the words of each name.
+    A mistyped word is looked up through its deletions instead of being compared against every name,
+    and only the few candidate names found that way are ranked. Typos no word lines up with, such as
+    a merged or split word, fall back to scoring whole names with difflib.
+    """
+    def __init__(self, max_distance: int=2):
+        self.max_distance = max_distance
+        self.deletes = {}       # deletion string -> set of words
+        self.word_names = {}    # word -> set of names containing it
+        self.names = ()         # every name, for the difflib fallback (the live nameToCode dictionary)
+
+    def variants(self, word: str, distance: int) -> set:
+        found = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+            found |= frontier
+        return found
+
+    def add(self, name: str) -> None:
+        for word in set(tokenize(name)):
+            names = self.word_names.get(word)
+            if names is None:
+                names = self.word_names[word] = set()
+                for variant in self.variants(word, self.max_distance):
+                    self.deletes.setdefault(variant, set()).add(word)
+            names.add(name)
+
+    def remove(self, name: str) -> None:
+        for word in set(tokenize(name)):
+            names = self.word_names.get(word)
+            if names is None:
+                continue
+            names.discard(name)
+            if names:
+                continue
+            del self.word_names[word]
+            for variant in self.variants(word, self.max_distance):
+                words = self.deletes.get(variant)
+                if words is None:
+                    continue
+                words.discard(word)
+                if not words:
+                    del self.deletes[variant]
+
+    def rebuild(self, names) -> None:
+        self.deletes = {}
+        self.word_names = {}
+        self.names = names
+        for name in names:
+            self.add(name)
+
+    def allNames(self):
+        return self.names
+
+    def wordsForVariants(self, variants) -> set:
+        """Returns the indexed words that have any of variants as a deletion."""
+        found = set()
+        for variant in variants:
+            found.update(self.deletes.get(variant, ()))
+        return found
+
+    def namesWith(self, word: str):
+        return self.word_names.get(word, ())
+
+    def similar_words(self, word: str) -> dict:
+        """Returns {indexed word: similarity} for words within the allowed edit distance of word."""
+        distance = min(self.max_distance, len(word) // 3)
+        found = {}
+        for candidate in self.wordsForVariants(self.variants(word, distance)):
+            d = editDistance(word, candidate, distance)
+            if d <= distance:
+                found[candidate] = 1 - d / max(len(word), len(candidate))
+        return found
+
+    def match(self, query: str, n: int=5, cutoff: float=0.6) -> list:
+        query_words = tokenize(query) or [query]
+        scores = {}
+        for word in query_words:
+            best = {}
+            for candidate, similarity in self.similar_words(word).items():
+                for name in self.namesWith(candidate):
+                    if similarity > best.get(name, 0):
+                        best[name] = similarity
+            for name, similarity in best.items():
+                scores[name] = scores.get(name, 0) + similarity
+        if not scores:
+            return difflib.get_close_matches(query, self.allNames(), n=n, cutoff=cutoff)
+
+        # Rank on word similarity, break ties with the difflib ratio of the whole name
+        word_count = len(query_words)
+        shortlist = heapq.nlargest(n * 4, scores, key=lambda name: (scores[name], -len(name)))
+        ranked = []
+        for name in shortlist:
+            score = scores[name] / word_count
+            if score < cutoff:
+                continue
+            ratio = difflib.SequenceMatcher(None, query, name).ratio()
+            ranked.append((score, ratio, name))
+        if not ranked:
+            # No name matched word for word (a merged or split word, a short one): score whole names
+            return difflib.get_close_matches(query, self.allNames(), n=n, cutoff=cutoff)
+        ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [name for _, _, name in ranked[:n]]
+
+
+class PhoneticIndex:
+    """
+    Buckets the words of each name by phoneticKey(), so a misspelled query word finds the words
+    that sound like it with one dictionary lookup instead of a fuzzy scan of the catalog.
+    """
+    def __init__(self):
+        self.keys = {}          # phonetic key -> set of words
+        self.word_names = {}    # word -> set of names containing it
+
+    def add(self, name: str) -> None:
+        for word in set(tokenize(name)):
+            names = self.word_names.get(word)
+            if names is None:
+                names = self.word_names[word] = set()
+                self.keys.setdefault(phoneticKey(word), set()).add(word)
+            names.add(name)
+
+    def remove(self, name: str) -> None:
+        for word in set(tokenize(name)):
+            names = self.word_names.get(word)
+            if names is None:
+                continue
+            names.discard(name)
+            if names:
+                continue
+            del self.word_names[word]
+            key = phoneticKey(word)
+            words = self.keys[key]
+            words.discard(word)
+            if not words:
+                del self.keys[key]
+
+    def rebuild(self, names) -> None:
+        self.keys = {}
+        self.word_names = {}
+        for name in names:
+            self.add(name)
+
+    def wordsWithKey(self, key: str):
+        return self.keys.get(key, ())
+
+    def namesWith(self, word: str):
+        return self.word_names.get(word, ())
+
+    def match(self, query: str, n: int=5, cutoff: float=0.6) -> list:
         """
-        Displays the menu options based on the available options.
+        Up to n names with a word sounding like each word of query, best first. A bucket word
+        counts if its edit-distance similarity to the query word is at least cutoff. Names are
+        ranked on those similarities, then by the difflib ratio of the whole name, as in
+        SymSpellMatcher.
         """
-        print("\n\t === PLU2 Lookup === \t\n")
-        for key, (description, _) in menu_options.items():
-            print(f"[{key}] {description}")
-        print("\n")
+        query_words = tokenize(query)
+        if not query_words:
+            return []
+        groups = []
+        for word in query_words:
+            similar = {}
+            for candidate in self.wordsWithKey(phoneticKey(word)):
+                longest = max(len(word), len(candidate))
+                similarity = 1 - editDistance(word, candidate, longest) / longest
+                if similarity >= cutoff:
+                    similar[candidate] = similarity
+            if not similar:
+                return []
+            groups.append(similar)
+        scores = self.scoreNames(groups)
+        if not scores:
+            return []
+        shortlist = heapq.nlargest(n * 4, scores, key=lambda name: (scores[name], -len(name)))
+        ranked = [(scores[name], difflib.SequenceMatcher(None, query, name).ratio(), name) for name in shortlist]
+        ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [name for _, _, name in ranked[:n]]
 
-    # Main loop
-    while isRunning:
-        display_menu()
-        userInput = whisper("Enter an option: ", False, True)
-        if userInput in menu_options:
-            action = menu_options[userInput][1]
-            if userInput == 7:  # Quit option
-                isRunning = False
-                if enableCustomData:
-                    saveDatabases()
-            problem_child(action)
-        else:
-            print("Invalid option. Please try again.")
+    def scoreNames(self, groups: list) -> dict:
+        """
+        groups holds one {bucket word: similarity} per query word. Returns {name: score} for the
+        names with a word from every group, scoring each group by its best word in the name.
+        """
+        scores = None
+        for similar in groups:
+            best = {}
+            for candidate, similarity in similar.items():
+                for name in self.namesWith(candidate):
+                    if similarity > best.get(name, 0):
+                        best[name] = similarity
+            if scores is not None:
+                best = {name: scores[name] + similarity for name, similarity in best.items() if name in scores}
+            if not best:
+                return {}
+            scores = best
+        return scores
+
+
+class SqliteWordIndex(SymSpellMatcher):
+    """
+    The SymSpell deletion index kept in SQLite tables next to the catalog, so the fuzzy tier
+    of SqlitePluDatabase never loads every word. Names containing a word come from the
+    FTS5 word table. Changes join the caller's transaction. The word_keys table buckets the
+    same words by phoneticKey() for SqlitePhoneticIndex, and word_totals counts the names with
+    words and their words in all, for SqliteTokenIndex.
+    """
+    def __init__(self, connection, fts: bool=True, max_distance: int=2):
+        super().__init__(max_distance)
+        self.connection = connection
+        self.fts = fts
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS words (word TEXT PRIMARY KEY, refs INTEGER NOT NULL) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS word_variants (variant TEXT, word TEXT, PRIMARY KEY (variant, word)) WITHOUT ROWID")
+            keys_existed = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'word_keys'").fetchone()
+            connection.execute("CREATE TABLE IF NOT EXISTS word_keys (key TEXT, word TEXT, PRIMARY KEY (key, word)) WITHOUT ROWID")
+            if not keys_existed:        # a file from before the phonetic tier
+                connection.executemany("INSERT INTO word_keys (key, word) VALUES (?, ?)",
+                                       ((phoneticKey(word), word) for (word,) in connection.execute("SELECT word FROM words").fetchall()))
+            connection.execute("CREATE TABLE IF NOT EXISTS word_totals (names INTEGER NOT NULL, words INTEGER NOT NULL)")
+            if connection.execute("SELECT 1 FROM word_totals").fetchone() is None:     # new, or a file from before it
+                connection.execute("INSERT INTO word_totals (names, words) VALUES (0, 0)")
+                connection.execute("UPDATE word_totals SET names = ?, words = ?",
+                                   self.totals(name for (name,) in connection.execute("SELECT name FROM items")))
+
+    @staticmethod
+    def totals(names) -> tuple:
+        """(names with at least one word, words in all of them)"""
+        lengths = [len(tokenize(name)) for name in names]
+        return sum(1 for length in lengths if length), sum(lengths)
+
+    def add(self, name: str) -> None:
+        self.connection.execute("UPDATE word_totals SET names = names + ?, words = words + ?", self.totals([name]))
+        for word in set(tokenize(name)):
+            if self.connection.execute("UPDATE words SET refs = refs + 1 WHERE word = ?", (word,)).rowcount:
+                continue
+            self.connection.execute("INSERT INTO words (word, refs) VALUES (?, 1)", (word,))
+            self.connection.executemany("INSERT OR IGNORE INTO word_variants (variant, word) VALUES (?, ?)",
+                                        ((variant, word) for variant in self.variants(word, self.max_distance)))
+            self.connection.execute("INSERT INTO word_keys (key, word) VALUES (?, ?)", (phoneticKey(word), word))
+
+    def addMany(self, names) -> None:
+        """add() for a batch of names, counting their words first so each table gets one statement."""
+        names = list(names)
+        self.connection.execute("UPDATE word_totals SET names = names + ?, words = words + ?", self.totals(names))
+        refs = {}
+        for name in names:
+            for word in set(tokenize(name)):
+                refs[word] = refs.get(word, 0) + 1
+        words = list(refs)
+        known = set()
+        for start in range(0, len(words), 500):
+            chunk = words[start:start + 500]
+            known.update(word for (word,) in self.connection.execute(
+                f"SELECT word FROM words WHERE word IN ({','.join('?' * len(chunk))})", chunk))
+        new = [word for word in words if word not in known]
+        self.connection.executemany("UPDATE words SET refs = refs + ? WHERE word = ?", ((refs[word], word) for word in known))
+        self.connection.executemany("INSERT INTO words (word, refs) VALUES (?, ?)", ((word, refs[word]) for word in new))
+        self.connection.executemany("INSERT OR IGNORE INTO word_variants (variant, word) VALUES (?, ?)",
+                                    ((variant, word) for word in new for variant in self.variants(word, self.max_distance)))
+        self.connection.executemany("INSERT INTO word_keys (key, word) VALUES (?, ?)", ((phoneticKey(word), word) for word in new))
+
+    def remove(self, name: str) -> None:
+        self.connection.execute("UPDATE word_totals SET names = names - ?, words = words - ?", self.totals([name]))
+        for word in set(tokenize(name)):
+            row = self.connection.execute("SELECT refs FROM words WHERE word = ?", (word,)).fetchone()
+            if row is None:
+                continue
+            if row[0] > 1:
+                self.connection.execute("UPDATE words SET refs = refs - 1 WHERE word = ?", (word,))
+                continue
+            self.connection.execute("DELETE FROM words WHERE word = ?", (word,))
+            self.connection.executemany("DELETE FROM word_variants WHERE variant = ? AND word = ?",
+                                        ((variant, word) for variant in self.variants(word, self.max_distance)))
+            self.connection.execute("DELETE FROM word_keys WHERE key = ? AND word = ?", (phoneticKey(word), word))
+
+    def rebuild(self, names) -> None:
+        self.connection.execute("DELETE FROM words")
+        self.connection.execute("DELETE FROM word_variants")
+        self.connection.execute("DELETE FROM word_keys")
+        names = list(names)
+        self.connection.execute("UPDATE word_totals SET names = ?, words = ?", self.totals(names))
+        refs = {}
+        for name in names:
+            for word in set(tokenize(name)):
+                refs[word] = refs.get(word, 0) + 1
+        self.connection.executemany("INSERT INTO words (word, refs) VALUES (?, ?)", refs.items())
+        self.connection.executemany("INSERT OR IGNORE INTO word_variants (variant, word) VALUES (?, ?)",
+                                    ((variant, word) for word in refs for variant in self.variants(word, self.max_distance)))
+        self.connection.executemany("INSERT INTO word_keys (key, word) VALUES (?, ?)", ((phoneticKey(word), word) for word in refs))
+
+    def wordsForVariants(self, variants) -> set:
+        variants = list(variants)
+        found = set()
+        for start in range(0, len(variants), 500):
+            chunk = variants[start:start + 500]
+            found.update(word for (word,) in self.connection.execute(
+                f"SELECT DISTINCT word FROM word_variants WHERE variant IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def namesWith(self, word: str):
+        if self.fts:
+            # items_words drops accents the way tokenize() does, so "jalapeno" finds "jalapeño"
+            rows = self.connection.execute("SELECT name FROM items_words WHERE items_words MATCH ?", ('"' + word + '"',))
+        else:
+            rows = self.connection.execute("SELECT name FROM items WHERE instr(name, ?) > 0", (word,))
+        return [name for (name,) in rows if word in tokenize(name)]
+
+    def allNames(self):
+        return (name for (name,) in self.connection.execute("SELECT name FROM items"))
+
+
+class SqlitePhoneticIndex(PhoneticIndex):
+    """
+    The phonetic tier of SqlitePluDatabase. Buckets are the word_keys table and names come from
+    the word index, which keeps both up to date as items change.
+    """
+    def __init__(self, words: SqliteWordIndex):
+        super().__init__()
+        self.words = words
+
+    def add(self, name: str) -> None:
+        pass    # word_keys is kept by SqliteWordIndex
+
+    def remove(self, name: str) -> None:
+        pass
+
+    def rebuild(self, names) -> None:
+        pass
+
+    def wordsWithKey(self, key: str):
+        return [word for (word,) in self.words.connection.execute("SELECT word FROM word_keys WHERE key = ?", (key,))]
+
+    def namesWith(self, word: str):
+        return self.words.namesWith(word)
+
+    def scoreNames(self, groups: list) -> dict:
+        """One FTS5 query finds the names with a word from every group, however common the words are."""
+        if not self.words.fts:
+            return super().scoreNames(groups)
+        match = " AND ".join("(" + " OR ".join(f'"{word}"' for word in similar) + ")" for similar in groups)
+        scores = {}
+        for (name,) in self.words.connection.execute("SELECT name FROM items_words WHERE items_words MATCH ?", (match,)):
+            words = set(tokenize(name))
+            best = [max((similarity for word, similarity in similar.items() if word in words), default=None) for similar in groups]
+            if None not in best:
+                scores[name] = sum(best)
+        return scores
+
+
+class SqliteTokenIndex(TokenIndex):
+    """
+    The ranked word index of SqlitePluDatabase. Word counts and totals come from the word index's
+    tables and each word's names from its namesWith(), so names score exactly as in PluDatabase
+    without loading the catalog. A word's names are fetched once per search.
+    """
+    def __init__(self, words: SqliteWordIndex):
+        super().__init__()
+        self.words = words
+        self.found = {}         # word -> [(name, times the word is in it, words in the name)] for the current search
+
+    def add(self, name: str) -> None:
+        pass    # the word tables are kept by SqliteWordIndex
+
+    def remove(self, name: str) -> None:
+        pass
+
+    def rebuild(self, names) -> None:
+        pass
+
+    def search(self, query: str, k: int=10, visible=None) -> list:
+        try:
+            return super().search(query, k, visible)
+        finally:
+            self.found = {}
+
+    def documentCount(self) -> int:
+        return self.words.connection.execute("SELECT names FROM word_totals").fetchone()[0]
+
+    def averageLength(self) -> float:
+        names, words = self.words.connection.execute("SELECT names, words FROM word_totals").fetchone()
+        return words / names
+
+    def documentsWith(self, word: str) -> int:
+        return self.words.connection.execute("SELECT refs FROM words WHERE word = ?", (word,)).fetchone()[0]
+
+    def bound(self, word: str) -> tuple:
+        found = self.wordMatches(word)
+        return max(count for _, count, _ in found), min(length for _, _, length in found)
+
+    def matches(self, word: str):
+        yield from self.wordMatches(word)
+
+    def wordMatches(self, word: str) -> list:
+        found = self.found.get(word)
+        if found is None:
+            found = self.found[word] = []
+            for name in self.words.namesWith(word):
+                words = tokenize(name)
+                found.append((name, words.count(word), len(words)))
+        return found
+
+    def expand(self, token: str):
+        yield from (word for (word,) in self.words.connection.execute(
+            "SELECT word FROM words WHERE word >= ? AND word < ? ORDER BY word", (token, token + "\U0010ffff")))
+
+
+def loadNumpy():
+    """Imports NumPy on first use, so importing pluSearch stays quick. Returns None if it is not installed."""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            module = False
+        numpy = module
+    return numpy or None
+
+
+class NgramVectorMatcher:
+    """
+    Fuzzy engine for bulk matching. Names and queries are compared as sets of character trigrams and
+    scored with the Dice coefficient (2 x shared trigrams / trigrams in both), 0 to 1 like difflib.
+    matchMany() scores a whole batch at once: with NumPy each block of queries is a single bincount
+    over the concatenated trigram postings, without it the same scores are summed in Python.
+    The arrays are rebuilt on the next match after the names change, so it suits read-mostly catalogs.
+    """
+    block_cells = 1 << 22       # queries x names scored per NumPy block
+
+    def __init__(self):
+        self.source = {}        # live names, like DifflibMatcher
+        self.names = []         # name id -> name
+        self.grams = {}         # trigram -> id
+        self.postings = []      # trigram id -> name ids (pure Python scoring)
+        self.sizes = []         # name id -> distinct trigrams
+        self.starts = None      # NumPy: postings of trigram i are members[starts[i]:starts[i + 1]]
+        self.members = None
+        self.sizeArray = None
+        self.stale = True
+
+    def gramsOf(self, text: str) -> set:
+        padded = f" {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, name: str) -> None:
+        self.stale = True
+
+    def remove(self, name: str) -> None:
+        self.stale = True
+
+    def rebuild(self, names) -> None:
+        self.source = names
+        self.stale = True
+
+    def build(self) -> None:
+        self.names = list(self.source)
+        grams, postings, sizes = {}, [], []
+        for name_id, name in enumerate(self.names):
+            name_grams = self.gramsOf(name)
+            sizes.append(len(name_grams))
+            for gram in name_grams:
+                gram_id = grams.get(gram)
+                if gram_id is None:
+                    gram_id = grams[gram] = len(postings)
+                    postings.append([])
+                postings[gram_id].append(name_id)
+        self.grams, self.sizes = grams, sizes
+        numpy = loadNumpy()
+        if numpy is None:
+            self.postings = postings
+        else:
+            self.postings = []
+            self.sizeArray = numpy.array(sizes, dtype=numpy.float64)
+            self.starts = numpy.zeros(len(postings) + 1, dtype=numpy.int64)
+            numpy.cumsum([len(posting) for posting in postings], out=self.starts[1:])
+            self.members = numpy.fromiter(itertools.chain.from_iterable(postings), dtype=numpy.int64, count=int(self.starts[-1]))
+        self.stale = False
+
+    def match(self, query: str, n: int=5, cutoff: float=0.6) -> list:
+        return [name for name, _ in self.matchMany([query], n, cutoff)[0]]
+
+    def matchMany(self, queries, k: int=5, cutoff: float=0.6) -> list:
+        """For each query, up to k (name, score) pairs scoring at least cutoff, best first (ties by catalog order)."""
+        if self.stale:
+            self.build()
+        queries = list(queries)
+        if not self.names or k <= 0:
+            return [[] for _ in queries]
+        if loadNumpy() is None:
+            return [self.scoreOne(query, k, cutoff) for query in queries]
+        results = []
+        per_block = max(1, self.block_cells // len(self.names))
+        for start in range(0, len(queries), per_block):
+            results.extend(self.scoreBlock(queries[start:start + per_block], k, cutoff))
+        return results
+
+    def scoreOne(self, query: str, k: int, cutoff: float) -> list:
+        query_grams = self.gramsOf(query)
+        shared = {}
+        for gram in query_grams:
+            gram_id = self.grams.get(gram)
+            if gram_id is None:
+                continue
+            for name_id in self.postings[gram_id]:
+                shared[name_id] = shared.get(name_id, 0) + 1
+        size = len(query_grams)
+        scored = []
+        for name_id, count in shared.items():
+            score = 2 * count / (size + self.sizes[name_id])
+            if score >= cutoff:
+                scored.append((-score, name_id))
+        return [(self.names[name_id], -score) for score, name_id in heapq.nsmallest(k, scored)]
+
+    def scoreBlock(self, queries: list, k: int, cutoff: float) -> list:
+        numpy = loadNumpy()
+        name_count = len(self.names)
+        pieces, query_sizes = [], []
+        for row, query in enumerate(queries):
+            query_grams = self.gramsOf(query)
+            query_sizes.append(len(query_grams))
+            for gram in query_grams:
+                gram_id = self.grams.get(gram)
+                if gram_id is not None:
+                    pieces.append(self.members[self.starts[gram_id]:self.starts[gram_id + 1]] + row * name_count)
+        flat = numpy.concatenate(pieces) if pieces else numpy.zeros(0, dtype=numpy.int64)
+        shared = numpy.bincount(flat, minlength=len(queries) * name_count).reshape(len(queries), name_count)
+        scores = 2 * shared / (numpy.array(query_sizes, dtype=numpy.float64)[:, None] + self.sizeArray[None, :])
+
+        # Keep scores at or above both the cutoff and each row's k-th best, then order the few left
+        valid = (shared > 0) & (scores >= cutoff)
+        if name_count > k:
+            kth = -numpy.partition(-numpy.where(valid, scores, -1.0), k - 1, axis=1)[:, k - 1]
+            valid &= scores >= kth[:, None]
+        rows, columns = numpy.nonzero(valid)
+        values = scores[rows, columns]
+        results = [[] for _ in queries]
+        for i in numpy.lexsort((columns, -values, rows)):
+            found = results[rows[i]]
+            if len(found) < k:
+                found.append((self.names[columns[i]], float(values[i])))
+        return results
+
+
+# ===================== PROCESS POOLS =====================
+
+workerStates = {}       # pool key -> what that pool's workers search; forked workers inherit it
+poolKeys = itertools.count(1)
+
+def poolContext():
+    """fork where the platform has it, so workers inherit the catalog instead of receiving a copy."""
+    return multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+
+def setWorkerState(key: int, state) -> None:
+    """Pool initializer for platforms without fork: each worker receives the state once."""
+    workerStates[key] = state
+
+def startPool(state, workers=None) -> tuple:
+    """Starts a process pool whose workers can read state. Returns (pool, key for workerStates)."""
+    key = next(poolKeys)
+    context = poolContext()
+    if context.get_start_method() == "fork":
+        workerStates[key] = state
+        pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=context)
+        pool.submit(int).result()       # fork every worker now, while state is current
+        del workerStates[key]           # the workers have their copy
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=setWorkerState,
+                                                      initargs=(key, state))
+    return pool, key
+
+def closeMatchesShard(key: int, start: int, stop: int, query: str, n: int, cutoff: float) -> list:
+    """Top n (ratio, name) pairs of one slice of the names, scored exactly like difflib.get_close_matches()."""
+    names = workerStates[key]
+    matcher = difflib.SequenceMatcher()
+    matcher.set_seq2(query)
+    found = []
+    for name in itertools.islice(names, start, stop):
+        matcher.set_seq1(name)
+        if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff and matcher.ratio() >= cutoff:
+            found.append((matcher.ratio(), name))
+    return heapq.nlargest(n, found)
+
+
+class ParallelDifflibMatcher(DifflibMatcher):
+    """
+    The difflib engine split across worker processes. Each worker scores a slice of the names and
+    returns its top n, and merging the slices gives exactly what difflib.get_close_matches() returns.
+    Catalogs under parallel_minimum names are matched in this process, where starting tasks would
+    cost more than it saves. The pool is restarted after the names change.
+    """
+    parallel_minimum = 20000
+
+    def __init__(self, workers=None):
+        super().__init__()
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.key = None
+        self.count = 0
+        self.stale = True
+
+    def add(self, name: str) -> None:
+        self.stale = True
+
+    def remove(self, name: str) -> None:
+        self.stale = True
+
+    def rebuild(self, names) -> None:
+        super().rebuild(names)
+        self.stale = True
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def match(self, query: str, n: int=5, cutoff: float=0.6) -> list:
+        if len(self.names) < self.parallel_minimum or self.workers < 2:
+            return super().match(query, n, cutoff)
+        if self.stale or self.pool is None:
+            self.close()
+            names = tuple(self.names)
+            self.pool, self.key = startPool(names, self.workers)
+            self.count = len(names)
+            self.stale = False
+        step = -(-self.count // self.workers)
+        shards = self.pool.map(closeMatchesShard, itertools.repeat(self.key), range(0, self.count, step),
+                               range(step, self.count + step, step), itertools.repeat(query),
+                               itertools.repeat(n), itertools.repeat(cutoff))
+        return [name for _, name in heapq.nlargest(n, itertools.chain.from_iterable(shards))]
+
+
+fuzzyEngines = {
+    "difflib": DifflibMatcher,
+    "symspell": SymSpellMatcher,
+    "parallel": ParallelDifflibMatcher,
+    "ngram": NgramVectorMatcher,
+}
+
+
+def fileStamp(filename: str):
+    """(inode, size, mtime) of a file, or None if it does not exist. Rewriting or appending changes it."""
+    try:
+        info = os.stat(filename)
+    except OSError:
+        return None
+    return info.st_ino, info.st_size, info.st_mtime_ns
+
+
+class CompactCatalog(MutableMapping):
+    """
+    A code -> name dictionary for very large catalogs that keeps no Python object per item: codes
+    in an array('I'), names in one UTF-8 blob with offset and length arrays, and open-addressing
+    hash tables of record ids over both. Codes that are not plain numbers (leading zeros, letters,
+    over 4294967294) go in a small side dictionary. byName is the name -> code view of the same
+    records. Codes and names stay one-to-one: giving a code a name that another code has takes it
+    from that code, as PluDatabase always does next anyway.
+    """
+    TEXT = 0xFFFFFFFF       # numbers entry of a code kept in textCodes
+    DEAD = 0xFFFFFFFF       # lengths entry of a removed record
+    EMPTY, DELETED = -1, -2 # hash table slots
+
+    def __init__(self, pairs=()):
+        self.numbers = array('I')       # code per record
+        self.starts = array('Q')        # name offset in blob per record
+        self.lengths = array('I')       # name length in bytes per record
+        self.blob = bytearray()
+        self.textCodes = {}             # record -> code, for codes that are not plain numbers
+        self.textRecords = {}           # code -> record, the same codes
+        self.codeSlots = array('i', [self.EMPTY] * 8)
+        self.nameSlots = array('i', [self.EMPTY] * 8)
+        self.count = 0
+        self.deleted = 0                # DELETED slots left in the tables
+        self.dead = 0                   # removed records still in the arrays
+        self.byName = CompactNames(self)
+        for code, name in pairs:
+            self[code] = name
+
+    # ---------- Records ----------
+    def number(self, code):
+        """The array value for a code, or None if it has to be kept as text."""
+        if isinstance(code, str) and code.isascii() and code.isdigit() and len(code) <= 10 and (code == "0" or code[0] != "0"):
+            value = int(code)
+            if value < self.TEXT:
+                return value
+        return None
+
+    def codeOf(self, record: int) -> str:
+        value = self.numbers[record]
+        return self.textCodes[record] if value == self.TEXT else str(value)
+
+    def nameBytes(self, record: int) -> bytes:
+        start = self.starts[record]
+        return bytes(self.blob[start:start + self.lengths[record]])
+
+    def nameOf(self, record: int) -> str:
+        return self.nameBytes(record).decode('utf-8')
+
+    def records(self):
+        """Ids of the live records, in the order they were added."""
+        lengths, dead = self.lengths, self.DEAD
+        return (record for record in range(len(lengths)) if lengths[record] != dead)
+
+    # ---------- Hash tables ----------
+    def codeSlot(self, value: int) -> int:
+        return (value * 2654435761) & (len(self.codeSlots) - 1)
+
+    def nameSlot(self, name_b: bytes) -> int:
+        return hash(name_b) & (len(self.nameSlots) - 1)
+
+    def codeRecord(self, code) -> int:
+        value = self.number(code)
+        if value is None:
+            return self.textRecords.get(code, -1) if isinstance(code, str) else -1
+        slots, numbers = self.codeSlots, self.numbers
+        mask = len(slots) - 1
+        i = self.codeSlot(value)
+        while True:
+            record = slots[i]
+            if record == self.EMPTY:
+                return -1
+            if record >= 0 and numbers[record] == value:
+                return record
+            i = (i + 1) & mask
+
+    def nameRecord(self, name) -> int:
+        if not isinstance(name, str):
+            return -1
+        name_b = name.encode('utf-8')
+        slots, starts, lengths, blob = self.nameSlots, self.starts, self.lengths, self.blob
+        mask = len(slots) - 1
+        i = self.nameSlot(name_b)
+        while True:
+            record = slots[i]
+            if record == self.EMPTY:
+                return -1
+            if record >= 0 and lengths[record] == len(name_b) and blob[starts[record]:starts[record] + len(name_b)] == name_b:
+                return record
+            i = (i + 1) & mask
+
+    def place(self, slots, i: int, record: int) -> None:
+        """Puts record in the first free slot from i on."""
+        mask = len(slots) - 1
+        while slots[i] >= 0:
+            i = (i + 1) & mask
+        if slots[i] == self.DELETED:
+            self.deleted -= 1
+        slots[i] = record
+
+    def unplace(self, slots, i: int, record: int) -> None:
+        mask = len(slots) - 1
+        while slots[i] != record:
+            i = (i + 1) & mask
+        slots[i] = self.DELETED
+        self.deleted += 1
+
+    def rehash(self) -> None:
+        """Rebuilds both tables at 2 to 4 slots per item, dropping DELETED slots."""
+        size = 1 << max(3, (2 * self.count).bit_length())
+        self.codeSlots = array('i', [self.EMPTY]) * size
+        self.nameSlots = array('i', [self.EMPTY]) * size
+        self.deleted = 0
+        for record in self.records():
+            value = self.numbers[record]
+            if value != self.TEXT:
+                self.place(self.codeSlots, self.codeSlot(value), record)
+            self.place(self.nameSlots, self.nameSlot(self.nameBytes(record)), record)
+
+    def pack(self) -> None:
+        """Drops removed records and their name bytes."""
+        live = list(self.records())
+        blob = bytearray()
+        starts, lengths, numbers = array('Q'), array('I'), array('I')
+        text_codes = {}
+        for record in live:
+            if self.numbers[record] == self.TEXT:
+                text_codes[len(numbers)] = self.textCodes[record]
+            starts.append(len(blob))
+            lengths.append(self.lengths[record])
+            numbers.append(self.numbers[record])
+            blob += self.nameBytes(record)
+        self.blob, self.starts, self.lengths, self.numbers = blob, starts, lengths, numbers
+        self.textCodes = text_codes
+        self.textRecords = {code: record for record, code in text_codes.items()}
+        self.dead = 0
+        self.rehash()
+
+    # ---------- Changes ----------
+    def append(self, code: str, name: str) -> None:
+        if (self.count + self.deleted + 1) * 3 > len(self.nameSlots) * 2:
+            self.rehash()
+        record = len(self.numbers)
+        name_b = name.encode('utf-8')
+        value = self.number(code)
+        if value is None:
+            self.textCodes[record] = code
+            self.textRecords[code] = record
+            self.numbers.append(self.TEXT)
+        else:
+            self.numbers.append(value)
+            self.place(self.codeSlots, self.codeSlot(value), record)
+        self.starts.append(len(self.blob))
+        self.lengths.append(len(name_b))
+        self.blob += name_b
+        self.place(self.nameSlots, self.nameSlot(name_b), record)
+        self.count += 1
+
+    def delete(self, record: int) -> None:
+        value = self.numbers[record]
+        if value == self.TEXT:
+            del self.textRecords[self.textCodes.pop(record)]
+        else:
+            self.unplace(self.codeSlots, self.codeSlot(value), record)
+        self.unplace(self.nameSlots, self.nameSlot(self.nameBytes(record)), record)
+        self.lengths[record] = self.DEAD
+        self.count -= 1
+        self.dead += 1
+
+    def tidy(self) -> None:
+        """Packs once removed records outnumber live ones. Record ids change, so only call it between changes."""
+        if self.dead > max(1024, self.count):
+            self.pack()
+
+    def set(self, code, name) -> None:
+        """Pairs code with name, dropping whatever either was paired with before."""
+        if not isinstance(code, str) or not isinstance(name, str):
+            raise TypeError("CompactCatalog codes and names must be strings")
+        by_code, by_name = self.codeRecord(code), self.nameRecord(name)
+        if by_code >= 0 and by_code == by_name:
+            return
+        if by_code >= 0:
+            self.delete(by_code)
+        if by_name >= 0:
+            self.delete(by_name)
+        self.append(code, name)
+        self.tidy()
+
+    # ---------- Mapping ----------
+    def __getitem__(self, code) -> str:
+        record = self.codeRecord(code)
+        if record < 0:
+            raise KeyError(code)
+        return self.nameOf(record)
+
+    def __setitem__(self, code, name) -> None:
+        self.set(code, name)
+
+    def __delitem__(self, code) -> None:
+        record = self.codeRecord(code)
+        if record < 0:
+            raise KeyError(code)
+        self.delete(record)
+        self.tidy()
+
+    def __contains__(self, code) -> bool:
+        return self.codeRecord(code) >= 0
+
+    def __iter__(self):
+        return (self.codeOf(record) for record in self.records())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self):
+        return CompactItems(self)
+
+    def values(self):
+        return CompactValues(self)
+
+
+class CompactNames(MutableMapping):
+    """The name -> code view of a CompactCatalog. Changes go to the same records."""
+    def __init__(self, catalog: CompactCatalog):
+        self.catalog = catalog
+
+    def __getitem__(self, name) -> str:
+        record = self.catalog.nameRecord(name)
+        if record < 0:
+            raise KeyError(name)
+        return self.catalog.codeOf(record)
+
+    def __setitem__(self, name, code) -> None:
+        self.catalog.set(code, name)
+
+    def __delitem__(self, name) -> None:
+        record = self.catalog.nameRecord(name)
+        if record < 0:
+            raise KeyError(name)
+        self.catalog.delete(record)
+        self.catalog.tidy()
+
+    def __contains__(self, name) -> bool:
+        return self.catalog.nameRecord(name) >= 0
+
+    def __iter__(self):
+        catalog = self.catalog
+        return (catalog.nameOf(record) for record in catalog.records())
+
+    def __len__(self) -> int:
+        return self.catalog.count
+
+    def items(self):
+        return CompactItems(self.catalog, swap=True)
+
+    def values(self):
+        return CompactValues(self.catalog, swap=True)
+
+
+class CompactItems(ItemsView):
+    """items() of a CompactCatalog or its byName view, read straight from the records."""
+    def __init__(self, catalog: CompactCatalog, swap: bool=False):
+        super().__init__(catalog.byName if swap else catalog)
+        self.catalog = catalog
+        self.swap = swap
+
+    def __iter__(self):
+        catalog = self.catalog
+        for record in catalog.records():
+            code, name = catalog.codeOf(record), catalog.nameOf(record)
+            yield (name, code) if self.swap else (code, name)
+
+
+class CompactValues(ValuesView):
+    """values() of a CompactCatalog (names) or its byName view (codes)."""
+    def __init__(self, catalog: CompactCatalog, swap: bool=False):
+        super().__init__(catalog.byName if swap else catalog)
+        self.catalog = catalog
+        self.swap = swap
+
+    def __iter__(self):
+        catalog = self.catalog
+        read = catalog.codeOf if self.swap else catalog.nameOf
+        return (read(record) for record in catalog.records())
+
+
+class LazyIndex:
+    """
+    Stands in for one of PluDatabase's indexes until a lookup first needs it, so loading a catalog
+    builds nothing and an exact code or name lookup never pays for the others. Changes made before
+    then are skipped, since the build reads the catalog as it is by that time. Reading any other
+    attribute builds the index from source() and forwards to it.
+    """
+    def __init__(self, index, source):
+        self.index = index
+        self.source = source    # source() -> what index.rebuild() takes
+        self.built = False
+
+    def add(self, *args) -> None:
+        if self.built:
+            self.index.add(*args)
+
+    def remove(self, *args) -> None:
+        if self.built:
+            self.index.remove(*args)
+
+    def recode(self, *args) -> None:
+        if self.built:
+            self.index.recode(*args)
+
+    def rebuild(self) -> None:
+        """Drops the index; it is built again on next use."""
+        self.built = False
+
+    def get(self):
+        if not self.built:
+            self.index.rebuild(self.source())
+            self.built = True
+        return self.index
+
+    def __getattr__(self, name):
+        if name in ("index", "source", "built") or name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class PluDatabase:
+    """
+    A PLU catalog: the code -> name and name -> code dictionaries, their search indexes,
+    and the load, save, search, add, remove and edit operations.
+    Nothing is read until the first lookup or change, so creating one is free.
+    """
+    def __init__(self, directory: str=".", enableCustomData=None, fuzzyEngine: str="symspell", cacheSize: int=1024, compactCatalog: bool=False):
+        self.directory = directory
+        self.enableCustomData = enableCustomData    # None = decide by platform when loading
+        self.compactCatalog = compactCatalog        # keep the dictionaries in a CompactCatalog
+        self.codeToName = {}
+        self.nameToCode = {}
+        self.loaded = False
+        # Each index is built on the first lookup that needs it (see LazyIndex)
+        self.nameIndex = LazyIndex(NgramIndex(), lambda: self.nameToCode)
+        self.prefixIndex = LazyIndex(PrefixIndex(), lambda: self.nameToCode)
+        self.sortedView = LazyIndex(SortedView(), lambda: self.nameToCode)     # names in order and column widths for Show All
+        self.codeIndex = LazyIndex(CodeIndex(), lambda: self.codeToName)       # numeric codes in order, for range and prefix queries
+        self.tokenIndex = None          # TokenIndex for rankedSearch(), built on first use
+        self.phoneticIndex = LazyIndex(PhoneticIndex(), lambda: self.nameToCode)   # words by sound, tried before the fuzzy engine
+        self.keyIndex = LazyIndex(KeyIndex(), lambda: self.nameToCode)         # names by normalizeKey(), for accents, case and punctuation
+        self.usage = {}                 # name -> exact lookups, for autocomplete ranking
+        self.fuzzyEngine = fuzzyEngine
+        self.fuzzyMatcher = LazyIndex(fuzzyEngines[fuzzyEngine](), lambda: self.nameToCode)
+        self.cache = QueryCache(cacheSize)
+        self.metrics = Metrics()        # enable with metrics.enabled = True
+        self.generation = 0             # bumped on every change, invalidates cached results
+        self.journal = None             # open append handle for JOURNAL_FILE
+        self.journalLength = 0          # operations in the journal since the last snapshot
+        self.compactAfter = 1000        # journal length that starts a background compaction
+        self.compacting = False
+        self.lock = threading.Lock()            # guards the journal handle
+        self.compactLock = threading.Lock()     # one compaction at a time
+        self.reloadInterval = 2.0       # seconds between checks for changes by other processes, None = never
+        self.lastCheck = 0.0
+        self.databaseStamp = None       # fileStamp of DATABASE_FILE when it was last read
+        self.journalInode = None        # the journal file read so far, and how far
+        self.journalOffset = 0
+
+    # ---------- Files ----------
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def customDataAllowed(self) -> bool:
+        """Custom databases are only used on desktop platforms unless set explicitly."""
+        if self.enableCustomData is None:
+            return platform.system() == "Windows" or platform.system() == "Darwin"
+        return self.enableCustomData
+
+    def fileState(self) -> str:
+        """
+        Returns 'single' when pluDatabase.json exists, 'legacy' when only the old
+        codeToName.json/nameToCode.json pair (or one half of it) exists, or 'none'.
+        """
+        if os.path.exists(self.path(DATABASE_FILE)):
+            return "single"
+        if any(os.path.exists(self.path(filename)) for filename in LEGACY_FILES):
+            return "legacy"
+        return "none"
+
+    def migrate(self) -> None:
+        """
+        Converts the old pair of JSON databases into pluDatabase.json. Entries that only
+        appear in nameToCode.json are kept. The old files are renamed to *.bak.
+        """
+        codeToName = {}
+        code_file, name_file = (self.path(filename) for filename in LEGACY_FILES)
+        if os.path.exists(code_file):
+            with open(code_file, 'r') as f:
+                codeToName = json.load(f)
+        if os.path.exists(name_file):
+            with open(name_file, 'r') as s:
+                names = set(codeToName.values())
+                for name, code in json.load(s).items():
+                    if code not in codeToName and name not in names:
+                        codeToName[code] = name
+        self.writeDatabase(codeToName)
+        for filename in (code_file, name_file):
+            if os.path.exists(filename):
+                os.replace(filename, filename + ".bak")
+
+    def setCatalog(self, codeToName: dict) -> None:
+        """Takes codeToName as the catalog and derives nameToCode, packing both into a CompactCatalog if asked to."""
+        if self.compactCatalog:
+            self.codeToName = CompactCatalog(codeToName.items())
+            self.nameToCode = self.codeToName.byName
+        else:
+            self.codeToName = codeToName
+            self.nameToCode = {name: code for code, name in codeToName.items()}
+
+    def readDatabase(self) -> dict:
+        with open(self.path(DATABASE_FILE), 'r') as f:
+            return json.load(f)
+
+    def writeDatabase(self, codeToName: dict) -> None:
+        """Writes a snapshot through a temporary file so a crash never leaves it truncated."""
+        filename = self.path(DATABASE_FILE)
+        with open(filename + ".tmp", 'w') as f:
+            json.dump(codeToName, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(filename + ".tmp", filename)
+
+    # ---------- Journal ----------
+    @contextlib.contextmanager
+    def fileLock(self):
+        """
+        Holds the advisory lock on pluDatabase.lock, so only one process or thread at a time
+        writes the journal or compacts. A new handle each time, as flock() locks are per handle.
+        Without fcntl (Windows) only threads of this process are kept apart, by compactLock.
+        """
+        if fcntl is None or not self.enableCustomData:
+            yield
+            return
+        with open(self.path(LOCK_FILE), 'a') as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            yield       # closing the handle releases the lock
+
+    @contextlib.contextmanager
+    def writing(self):
+        """
+        Holds the lock around checking and journaling one change. Changes other processes made
+        since our last look are merged in first, so the checks see the latest catalog: changes
+        to different items both survive and a conflicting one raises as any duplicate would.
+        """
+        self.ensureLoaded()
+        with self.fileLock():
+            if self.enableCustomData:
+                self.mergeChanges()
+            yield
+
+    def applyOperation(self, op: dict, codeToName=None) -> None:
+        """
+        Replays one journal operation on codeToName, or on the given dictionary. Operations only
+        set or delete codes, so replaying ones already in the snapshot gives the same result.
+        """
+        if codeToName is None:
+            codeToName = self.codeToName
+        if op["op"] == "add":
+            codeToName[op["code"]] = op["name"]
+        elif op["op"] == "remove":
+            codeToName.pop(op["code"], None)
+        elif op["op"] == "edit":
+            if op["newCode"] != op["code"]:
+                codeToName.pop(op["code"], None)
+            codeToName[op["newCode"]] = op["name"]
+
+    def readJournal(self, filename: str, offset: int=0) -> tuple:
+        """
+        Reads the complete operations after offset in a journal file without changing the file.
+        Returns (operations, offset after the last one). A line still being written is left for later.
+        """
+        ops = []
+        try:
+            f = open(filename, 'rb')
+        except FileNotFoundError:
+            return ops, 0
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+        return ops, offset
+
+    def replayJournal(self, filename: str) -> int:
+        """
+        Applies every complete operation in a journal file. A torn last write from a crash
+        is cut off so later appends start on a clean line. Returns how many were applied.
+        """
+        if not os.path.exists(filename):
+            return 0
+        count = 0
+        good_size = 0
+        with open(filename, 'rb+') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    op = json.loads(line)
+                except ValueError:
+                    f.truncate(good_size)
+                    break
+                self.applyOperation(op)
+                good_size += len(line)
+                count += 1
+        return count
+
+    def record(self, *ops, background: bool=True) -> None:
+        """
+        Appends changes to the journal and fsyncs once, so a single edit writes a few bytes
+        whatever the catalog size. Starts a background compaction once the journal is long,
+        unless background is False.
+        """
+        if not self.enableCustomData or not ops:
+            return
+        line = "".join(json.dumps(op, separators=(',', ':')) + "\n" for op in ops)
+        with self.lock:
+            current = fileStamp(self.path(JOURNAL_FILE))
+            if self.journal is not None and (current is None or current[0] != os.fstat(self.journal.fileno()).st_ino):
+                self.journal.close()        # another process compacted and moved our journal aside
+                self.journal = None
+            if self.journal is None:
+                self.journal = open(self.path(JOURNAL_FILE), 'a', encoding='utf-8')
+            info = os.fstat(self.journal.fileno())
+            # Skip our own line in refresh() unless other processes wrote lines we have not read
+            caughtUp = info.st_size == self.journalOffset and self.journalInode in (None, info.st_ino)
+            self.journal.write(line)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            if caughtUp:
+                self.journalInode = info.st_ino
+                self.journalOffset = info.st_size + len(line.encode('utf-8'))
+            self.journalLength += len(ops)
+            start = background and self.journalLength >= self.compactAfter and not self.compacting
+            if start:
+                self.compacting = True
+        if start:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self, codeToName=None) -> None:
+        """
+        Writes a fresh snapshot and drops the journal it covers. The journal is moved
+        aside first, so changes made meanwhile go to a new journal and a crash part way
+        through loses nothing. Safe to run in a background thread.
+        The snapshot is built from the files, pluDatabase.json plus the journal, so changes
+        made by other processes are kept. reset() passes codeToName to replace them instead.
+        If this catalog had read everything the snapshot is built from, the new file's stamp is
+        recorded, so refresh() does not mistake our own rewrite for someone else's.
+        """
+        with self.metrics.timing("storage", "save"):
+            with self.compactLock, self.fileLock():
+                journal_file = self.path(JOURNAL_FILE)
+                old_journal_file = journal_file + ".old"
+                with self.lock:
+                    self.compacting = True
+                    snapshot = None if codeToName is None else dict(codeToName)
+                    journal = fileStamp(journal_file)
+                    caughtUp = snapshot is not None or (
+                        fileStamp(self.path(DATABASE_FILE)) == self.databaseStamp and not os.path.exists(old_journal_file)
+                        and (journal[:2] if journal else (None, 0)) == (self.journalInode, self.journalOffset))
+                    if self.journal is not None:
+                        self.journal.close()
+                        self.journal = None
+                    if os.path.exists(journal_file):
+                        if os.path.exists(old_journal_file):    # left by an interrupted compaction
+                            with open(journal_file, 'r', encoding='utf-8') as f, open(old_journal_file, 'a', encoding='utf-8') as old:
+                                old.write(f.read())
+                            os.remove(journal_file)
+                        else:
+                            os.replace(journal_file, old_journal_file)
+                    self.journalLength = 0
+                    self.journalInode, self.journalOffset = None, 0
+                try:
+                    if snapshot is None:
+                        snapshot = self.readDatabase() if os.path.exists(self.path(DATABASE_FILE)) else {}
+                        for op in self.readJournal(old_journal_file)[0]:
+                            self.applyOperation(op, snapshot)
+                    self.writeDatabase(snapshot)
+                    if os.path.exists(old_journal_file):
+                        os.remove(old_journal_file)
+                    with self.lock:
+                        if caughtUp:
+                            self.databaseStamp = fileStamp(self.path(DATABASE_FILE))
+                finally:
+                    self.compacting = False
+
+    def load(self) -> None:
+        """
+        Reads the custom database, migrating the old pair of files first if needed, or uses
+        the defaults when custom data is disabled or there is no database. Custom data is
+        switched off in that case. nameToCode is always derived from codeToName.
+        """
+        with self.metrics.timing("storage", "load"):
+            self.enableCustomData = self.customDataAllowed()
+            state = self.fileState() if self.enableCustomData else "none"
+            if state == "legacy":
+                with self.fileLock():
+                    self.migrate()
+                state = "single"
+            if state == "single":
+                # Locked, so no half-written line from another process is taken for a torn one
+                with self.fileLock():
+                    journal_file = self.path(JOURNAL_FILE)
+                    self.databaseStamp = fileStamp(self.path(DATABASE_FILE))
+                    journal = fileStamp(journal_file)
+                    self.journalInode, self.journalOffset = journal[:2] if journal else (None, 0)
+                    self.codeToName = self.readDatabase()
+                    self.journalLength = self.replayJournal(journal_file + ".old") + self.replayJournal(journal_file)
+                self.setCatalog(self.codeToName)
+            else:
+                self.enableCustomData = False
+                self.setCatalog(defaultCodeToName.copy())
+            self.loaded = True
+            self.lastCheck = time.monotonic()
+            self.rebuildIndexes()
+
+    def ensureLoaded(self) -> None:
+        """Loads on first use, then checks for changes by other processes every reloadInterval seconds."""
+        if not self.loaded:
+            self.load()
+        elif self.reloadInterval is not None and time.monotonic() - self.lastCheck >= self.reloadInterval:
+            self.refresh()
+
+    def refresh(self) -> int:
+        """
+        Applies changes other processes made to pluDatabase.json or the journal since this
+        catalog read them, patching the dictionaries and indexes for just the items that
+        differ. New journal lines are read from where the last read stopped, so the usual
+        case costs as much as the change; a rewritten pluDatabase.json or a new journal is
+        compared in full. Returns how many items changed.
+        """
+        self.lastCheck = time.monotonic()
+        if not self.loaded or not self.enableCustomData:
+            return 0
+        if not self.compactLock.acquire(blocking=False):
+            return 0        # our own compaction is rewriting the files; check next time
+        try:
+            return self.mergeChanges()
+        finally:
+            self.compactLock.release()
+
+    def mergeChanges(self) -> int:
+        """The work of refresh(). The file stamps act as a version: if they match, nothing changed."""
+        with self.metrics.timing("storage", "reload"), self.lock:
+            journal_file = self.path(JOURNAL_FILE)
+            database = fileStamp(self.path(DATABASE_FILE))
+            journal = fileStamp(journal_file)
+            inode, size = journal[:2] if journal else (None, 0)
+            if database is None:
+                return 0    # nothing to read; the next save writes it again
+
+            sameJournal = inode == self.journalInode or self.journalInode is None    # None: there was none yet
+            if database == self.databaseStamp and sameJournal and size >= self.journalOffset:
+                # Only new journal lines: replay them on the items they touch
+                if size == self.journalOffset:
+                    return 0
+                ops, self.journalOffset = self.readJournal(journal_file, self.journalOffset)
+                self.journalInode = inode
+                touched = {code for op in ops for code in (op["code"], op.get("newCode", op["code"]))}
+                current = {code: self.codeToName[code] for code in touched if code in self.codeToName}
+                for op in ops:
+                    self.applyOperation(op, current)
+            else:
+                # Rewritten by someone else's compaction: compare everything
+                current = self.readDatabase()
+                for op in self.readJournal(journal_file + ".old")[0]:
+                    self.applyOperation(op, current)
+                ops, end = self.readJournal(journal_file)
+                for op in ops:
+                    self.applyOperation(op, current)
+                self.databaseStamp = database
+                self.journalInode, self.journalOffset = inode, end
+                touched = self.codeToName.keys() | current.keys()
+
+            updates = {code: current.get(code) for code in touched if current.get(code) != self.codeToName.get(code)}
+            return self.patchItems(updates)
+
+    def patchItems(self, updates: dict) -> int:
+        """
+        Sets each code in updates to its new name, or removes it when the name is None,
+        keeping both dictionaries, the search indexes and the sorted view in step.
+        """
+        if not updates:
+            return 0
+        self.generation += 1
+        for code in updates:
+            name = self.codeToName.pop(code, None)
+            if name is not None:
+                if self.nameToCode.get(name, code) == code:     # a CompactCatalog drops the name with the code
+                    self.nameToCode.pop(name, None)
+                    self.usage.pop(name, None)
+                self.unindexName(name, code)
+        for code, name in updates.items():
+            if name is None:
+                continue
+            other = self.nameToCode.get(name)
+            if other is not None:      # the name moved to this code from one not in updates
+                self.codeToName.pop(other, None)
+                self.unindexName(name, other)
+            self.codeToName[code] = name
+            self.nameToCode[name] = code
+            self.indexName(name, code)
+        return len(updates)
+
+    def createFromDefaults(self) -> None:
+        """Starts a custom database from the default values and writes it."""
+        self.enableCustomData = True
+        self.setCatalog(defaultCodeToName.copy())
+        self.loaded = True
+        self.rebuildIndexes()
+        self.compact(self.codeToName)
+
+    def save(self) -> None:
+        """
+        Writes the full snapshot to pluDatabase.json and clears the journal, if custom data
+        is enabled. Single changes are journaled as they happen; this runs on quit and reset.
+        """
+        if not self.enableCustomData:
+            return
+        self.compact()
+
+    # ---------- Indexes ----------
+    def indexName(self, name: str, code: str) -> None:
+        """Adds an item to the search indexes, the sorted view and the code index."""
+        self.nameIndex.add(name)
+        self.prefixIndex.add(name)
+        self.sortedView.add(name, code)
+        self.codeIndex.add(code)
+        self.keyIndex.add(name)
+        self.phoneticIndex.add(name)
+        self.fuzzyMatcher.add(name)
+        if self.tokenIndex is not None:
+            self.tokenIndex.add(name)
+
+    def unindexName(self, name: str, code: str) -> None:
+        """Removes an item from the search indexes, the sorted view and the code index."""
+        self.nameIndex.remove(name)
+        self.prefixIndex.remove(name)
+        self.sortedView.remove(name, code)
+        self.codeIndex.remove(code)
+        self.keyIndex.remove(name)
+        self.phoneticIndex.remove(name)
+        self.fuzzyMatcher.remove(name)
+        if self.tokenIndex is not None:
+            self.tokenIndex.remove(name)
+
+    def rebuildIndexes(self) -> None:
+        """Drops every search index, the sorted view and the code index, to be built again from the catalog on next use."""
+        self.generation += 1
+        self.tokenIndex = None
+        self.nameIndex.rebuild()
+        self.prefixIndex.rebuild()
+        self.sortedView.rebuild()
+        self.codeIndex.rebuild()
+        self.keyIndex.rebuild()
+        self.phoneticIndex.rebuild()
+        self.fuzzyMatcher.rebuild()
+
+    def buildIndexes(self) -> None:
+        """Builds every index the search tiers use now rather than on first use, e.g. before serving or forking workers."""
+        self.ensureLoaded()
+        for index in (self.nameIndex, self.prefixIndex, self.sortedView, self.codeIndex, self.keyIndex, self.phoneticIndex, self.fuzzyMatcher):
+            index.get()
+
+    def setFuzzyEngine(self, engine: str) -> None:
+        """Switches the fuzzy tier of search() to another engine from fuzzyEngines."""
+        if engine not in fuzzyEngines:
+            raise ValueError(f"Unknown fuzzy engine '{engine}'. Choose from: {', '.join(fuzzyEngines)}")
+        self.fuzzyEngine = engine
+        self.fuzzyMatcher = LazyIndex(fuzzyEngines[engine](), lambda: self.nameToCode)
+        self.generation += 1
+
+    # ---------- Lookups ----------
+    def search(self, query) -> list:
+        """
+        Searches with exact, partial, phonetic or fuzzy matching.
+        Returns a list of (code, name) tuples matching the query. Repeated queries come from the cache.
+        """
+        return self.searchTier(query)[1]
+
+    def searchTier(self, query) -> tuple:
+        """
+        search() that also says how the results were found: (tier, results), where tier is the
+        lookupTier() step that answered, also when the results come from the cache.
+        """
+        self.ensureLoaded()
+
+        # Normalize query
+        query = str(query).strip().lower()
+
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        cached = self.cache.get(query, self.generation)
+        if cached is None:
+            cached = self.lookupTier(query)
+            self.cache.put(query, self.generation, cached)
+            tier = cached[0]
+        else:
+            tier = "cache"
+        if timed:
+            self.metrics.observe("search", tier, time.perf_counter() - start)
+        found_by, results = cached
+        countUse(self.usage, query, results)
+        return found_by, list(results)
+
+    def cacheStats(self) -> dict:
+        """Hit/miss counts and size of the search result cache."""
+        return self.cache.stats()
+
+    def autocomplete(self, prefix, k: int=10, byFrequency: bool=False) -> list:
+        """
+        Type-ahead suggestions: up to k (code, name) pairs with a word starting with prefix.
+        Names starting with it rank first; byFrequency then favours the most looked-up items.
+        """
+        self.ensureLoaded()
+        prefix = str(prefix).strip().lower()
+        if not prefix:
+            return []
+        names = self.prefixIndex.complete(prefix, k, self.usage if byFrequency else None)
+        return [(self.nameToCode[name], name) for name in names]
+
+    def rankedSearch(self, query, k: int=10) -> list:
+        """
+        Up to k (code, name) pairs ranked by the words they share with query (BM25), best first.
+        Word order does not matter and words may be unfinished. The word index is built on first use.
+        """
+        self.ensureLoaded()
+        with self.metrics.timing("search", "ranked"):
+            return [(self.nameToCode[name], name) for name, _ in self.rankingIndex().search(str(query).strip().lower(), k)]
+
+    def rankingIndex(self) -> TokenIndex:
+        """The TokenIndex behind rankedSearch(), built on first use. Store overlays consult their base's."""
+        self.ensureLoaded()
+        if self.tokenIndex is None:
+            self.tokenIndex = TokenIndex()
+            self.tokenIndex.rebuild(self.nameToCode)
+        return self.tokenIndex
+
+    def lookup(self, query: str) -> list:
+        """The uncached search. query must already be normalized."""
+        return self.lookupTier(query)[1]
+
+    def lookupTier(self, query: str) -> tuple:
+        """
+        The uncached search, returning (tier, results) where tier names the step that
+        answered: 'code', 'name', 'partial', 'phonetic', 'fuzzy', or 'none' when nothing matched.
+        """
+        results = []
+
+        # 1. Exact match by code
+        if query in self.codeToName:
+            results.append((query, self.codeToName[query]))
+            return "code", results
+
+        # 2. Exact match by name, then by normalized name (accents, case and punctuation ignored)
+        if query in self.nameToCode:
+            code = self.nameToCode[query]
+            results.append((code, query))
+            return "name", results
+        key = normalizeKey(query)
+        name_matches = ([key] if key in self.nameToCode else []) + self.keyIndex.match(key)
+        if name_matches:
+            return "name", [(self.nameToCode[name], name) for name in name_matches]
+
+        # 3. Partial match in names (trigram index, scan for very short queries)
+        name_matches = self.nameIndex.search(query)
+        if name_matches is None:
+            name_matches = [name for name in self.nameToCode if query in name]
+        for name in name_matches:
+            results.append((self.nameToCode[name], name))
+
+        if results:
+            return "partial", results
+
+        # 4. Phonetic match: every query word sounds like a word of the name
+        name_matches = self.phoneticIndex.match(query, n=5, cutoff=0.6)
+        if name_matches:
+            return "phonetic", [(self.nameToCode[name], name) for name in name_matches]
+
+        # 5. Fuzzy match using the selected engine (see fuzzyEngines)
+        name_matches = self.fuzzyMatcher.match(query, n=5, cutoff=0.6)
+        for name in name_matches:
+            code = self.nameToCode[name]
+            results.append((code, name))
+
+        return ("fuzzy" if results else "none"), results
+
+    def find(self, key):
+        """Returns (code, name) for an exact code or name, or None if there is no such item."""
+        self.ensureLoaded()
+        key = str(key).strip().lower()
+        if key in self.codeToName:
+            return key, self.codeToName[key]
+        if key in self.nameToCode:
+            return self.nameToCode[key], key
+        return None
+
+    def nameFor(self, code):
+        """Returns the name for an exact code, or None."""
+        self.ensureLoaded()
+        return self.codeToName.get(str(code))
+
+    def codeFor(self, name):
+        """Returns the code for an exact name, or None."""
+        self.ensureLoaded()
+        return self.nameToCode.get(str(name))
+
+    def items(self) -> list:
+        """Returns every (code, name) pair."""
+        self.ensureLoaded()
+        return list(self.codeToName.items())
+
+    def sortedItems(self, offset: int=0, limit=None):
+        """Yields (code, name) pairs in name order from position offset on, at most limit of them."""
+        self.ensureLoaded()
+        for name in self.sortedView.page(offset, limit):
+            yield self.nameToCode[name], name
+
+    def columnWidths(self) -> tuple:
+        """(longest code, longest name), for Show All."""
+        self.ensureLoaded()
+        return self.sortedView.widths()
+
+    def codeRange(self, low, high) -> list:
+        """Every (code, name) whose numeric code is between low and high inclusive, in code order."""
+        self.ensureLoaded()
+        return [(code, self.codeToName[code]) for code in self.codeIndex.range(int(low), int(high))]
+
+    def codePrefix(self, digits, length=None) -> list:
+        """
+        Every (code, name) whose code starts with digits, only codes length digits long if given:
+        codePrefix("9", 5) is all 9xxxx organic codes. Shorter codes first, then in code order.
+        """
+        self.ensureLoaded()
+        return [(code, self.codeToName[code]) for code in self.codeIndex.prefix(str(digits).strip(), length)]
+
+    def category(self, category) -> list:
+        """Every (code, name) named category or "category - <variety>", in name order."""
+        self.ensureLoaded()
+        category = str(category).strip().lower()
+        return [(self.nameToCode[name], name) for name in categoryNames(self.sortedView.names, category)]
+
+    # ---------- Changes ----------
+    def add(self, name: str, code) -> None:
+        """Adds a new item. Raises ValueError if the name or code is already used."""
+        with self.metrics.timing("action", "add"), self.writing():
+            self.ensureLoaded()
+            name = str(name).strip().lower()
+            code = str(code).strip()
+            if not name or not code:
+                raise ValueError("Name and code cannot be empty")
+            if code in self.codeToName:
+                raise ValueError(f"PLU code '{code}' already exists for '{self.codeToName[code]}'")
+            if name in self.nameToCode:
+                raise ValueError(f"Produce name '{name}' already exists with PLU code '{self.nameToCode[name]}'")
+            self.codeToName[code] = name
+            self.nameToCode[name] = code
+            self.generation += 1
+            self.indexName(name, code)
+            self.record({"op": "add", "code": code, "name": name})
+
+    def addMany(self, pairs) -> tuple:
+        """
+        Adds (code, name) pairs with the same checks as add(), streaming through pairs once and
+        journaling every accepted item in one write. Pairs that fail a check, including a repeat
+        of an earlier pair, are skipped. Returns (items added, conflicts), each conflict being
+        (row, code, name, reason) with rows counted from 1. A large import is left in the
+        journal for save() to fold into pluDatabase.json. If reading pairs fails, nothing is added.
+        """
+        conflicts = []
+        added = []
+        with self.metrics.timing("action", "import"), self.writing():
+            try:
+                for row, (code, name) in enumerate(pairs, 1):
+                    name = str(name).strip().lower()
+                    code = str(code).strip()
+                    problem = addProblem(self, name, code)
+                    if problem is not None:
+                        conflicts.append((row, code, name, problem))
+                        continue
+                    self.codeToName[code] = name
+                    self.nameToCode[name] = code
+                    added.append(code)
+            except BaseException:
+                for code in added:      # reading failed part way: keep the catalog as it was
+                    self.nameToCode.pop(self.codeToName.pop(code), None)
+                raise
+            if added:
+                if len(added) > len(self.codeToName) // 4:
+                    self.rebuildIndexes()       # cheaper than indexing a big batch item by item
+                else:
+                    self.generation += 1
+                    for code in added:
+                        self.indexName(self.codeToName[code], code)
+                self.record(*({"op": "add", "code": code, "name": self.codeToName[code]} for code in added), background=False)
+        return len(added), conflicts
+
+    def remove(self, key) -> tuple:
+        """Removes the item with an exact code or name. Returns its (code, name)."""
+        with self.metrics.timing("action", "remove"), self.writing():
+            found = self.find(key)
+            if found is None:
+                raise KeyError(f"Item '{key}' not found")
+            code, name = found
+            self.codeToName.pop(code, None)
+            self.nameToCode.pop(name, None)
+            self.usage.pop(name, None)
+            self.generation += 1
+            self.unindexName(name, code)
+            self.record({"op": "remove", "code": code})
+            return code, name
+
+    def edit(self, key, new_name=None, new_code=None) -> tuple:
+        """
+        Renames and/or recodes the item with an exact code or name. Both changes are
+        checked before either is applied. Returns the updated (code, name).
+        """
+        with self.metrics.timing("action", "edit"), self.writing():
+            found = self.find(key)
+            if found is None:
+                raise KeyError(f"Item '{key}' not found")
+            code, name = found
+            old_code = code
+            new_name = str(new_name).strip().lower() if new_name else name
+            new_code = str(new_code).strip() if new_code else code
+            if new_name != name and new_name in self.nameToCode:
+                raise ValueError("That name already exists.")
+            if new_code != code and new_code in self.codeToName:
+                raise ValueError("That code already exists.")
+
+            self.generation += 1
+            if new_name != name:
+                del self.nameToCode[name]
+                self.nameToCode[new_name] = code
+                self.codeToName[code] = new_name
+                self.unindexName(name, code)
+                self.indexName(new_name, code)
+                if name in self.usage:
+                    self.usage[new_name] = self.usage.pop(name)
+                name = new_name
+            if new_code != code:
+                del self.codeToName[code]
+                self.codeToName[new_code] = name
+                self.nameToCode[name] = new_code
+                self.sortedView.recode(code, new_code)
+                self.codeIndex.remove(code)
+                self.codeIndex.add(new_code)
+                code = new_code
+            self.record({"op": "edit", "code": old_code, "newCode": code, "name": name})
+            return code, name
+
+    def reset(self) -> None:
+        """Restores the default values, and writes them if custom data is enabled."""
+        self.ensureLoaded()
+        self.setCatalog(defaultCodeToName.copy())
+        self.rebuildIndexes()
+        if self.enableCustomData:
+            self.compact(self.codeToName)
+
+
+class LayeredWordIndex(SymSpellMatcher):
+    """
+    Fuzzy word index of a store overlay. Holds only the overlay's own names and consults the
+    shared base index through the lookup hooks, skipping base names the overlay hides.
+    """
+    def __init__(self, base: SymSpellMatcher, visible):
+        super().__init__(base.max_distance)
+        self.base = base
+        self.visible = visible      # visible(name) -> False for base names removed or replaced in the overlay
+
+    def wordsForVariants(self, variants) -> set:
+        return super().wordsForVariants(variants) | self.base.wordsForVariants(variants)
+
+    def namesWith(self, word: str):
+        return [name for name in self.base.namesWith(word) if self.visible(name)] + list(super().namesWith(word))
+
+    def allNames(self):
+        return itertools.chain((name for name in self.base.allNames() if self.visible(name)), self.names)
+
+
+class LayeredPhoneticIndex(PhoneticIndex):
+    """Phonetic index of a store overlay, consulting the base index like LayeredWordIndex."""
+    def __init__(self, base: PhoneticIndex, visible):
+        super().__init__()
+        self.base = base
+        self.visible = visible
+
+    def wordsWithKey(self, key: str):
+        return set(super().wordsWithKey(key)) | set(self.base.wordsWithKey(key))
+
+    def namesWith(self, word: str):
+        return [name for name in self.base.namesWith(word) if self.visible(name)] + list(super().namesWith(word))
+
+
+class LayeredTokenIndex(TokenIndex):
+    """
+    Ranked word index of a store overlay. Holds only the overlay's own names and adds their
+    statistics to the shared base index, less the base names the overlay hides, so scores are
+    those of an index over every visible name without copying the base.
+    """
+    def __init__(self, base: TokenIndex, hidden):
+        super().__init__()
+        self.base = base
+        self.hidden = hidden        # hidden() -> base names removed or replaced in the overlay
+
+    def hiddenLengths(self) -> dict:
+        lengths = self.base.lengths
+        return {name: lengths[name] for name in self.hidden() if name in lengths}
+
+    def documentCount(self) -> int:
+        return len(self.base.lengths) - len(self.hiddenLengths()) + len(self.lengths)
+
+    def averageLength(self) -> float:
+        hidden = self.hiddenLengths()
+        documents = len(self.base.lengths) - len(hidden) + len(self.lengths)
+        return (self.base.totalLength - sum(hidden.values()) + self.totalLength) / documents
+
+    def documentsWith(self, word: str) -> int:
+        names = self.base.postings.get(word, {})
+        return len(names) - sum(1 for name in self.hidden() if name in names) + len(self.postings.get(word, ()))
+
+    def bound(self, word: str) -> tuple:
+        limits = [limit for limit in (self.base.limits.get(word), self.limits.get(word)) if limit is not None]
+        return max(count for count, _ in limits), min(length for _, length in limits)
+
+    def matches(self, word: str):
+        if word in self.base.postings:
+            hidden = set(self.hidden())
+            yield from (match for match in self.base.matches(word) if match[0] not in hidden)
+        if word in self.postings:
+            yield from super().matches(word)
+
+    def expand(self, token: str):
+        yield from sorted(set(self.base.expand(token)) | set(super().expand(token)))
+
+
+class LayeredPluDatabase:
+    """
+    A store's view of a shared read-only base catalog: the base plus a small overlay of added or
+    changed items and tombstones for base items the store removed. Lookups consult the base
+    indexes and the overlay's own indexes and filter out hidden base items, so no merged copy is
+    built and many stores can share one base in memory. Same API as PluDatabase.
+    The overlay is saved to pluOverlay.json in the store's directory on every change.
+    """
+    def __init__(self, directory: str=".", base=None, cacheSize: int=1024):
+        self.directory = directory
+        self.base = base            # a PluDatabase using the symspell engine, defaultBase() if None
+        self.enableCustomData = True
+        self.fuzzyEngine = "symspell"
+        self.codes = {}             # overlay code -> name: items added or changed by this store
+        self.names = {}             # overlay name -> code
+        self.tombstones = set()     # base codes this store removed or replaced
+        self.loaded = False
+        self.nameIndex = NgramIndex()
+        self.prefixIndex = PrefixIndex()
+        self.sortedView = SortedView()  # the overlay's names; sortedItems() merges in the base's
+        self.codeIndex = CodeIndex()    # the overlay's codes; code queries merge in the base's
+        self.keyIndex = KeyIndex()      # the overlay's normalized names; the base's is consulted too
+        self.tokenIndex = None          # (base generation, LayeredTokenIndex of the overlay), built on first ranked search
+        self.phoneticIndex = None
+        self.fuzzyMatcher = None
+        self.usage = {}
+        self.cache = QueryCache(cacheSize)
+        self.metrics = Metrics()
+        self.generation = 0         # bumped on overlay changes; the base's generation is checked too
+
+    # ---------- Files ----------
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def load(self) -> None:
+        """Loads the base if needed and reads the store's overlay, if it has one."""
+        with self.metrics.timing("storage", "load"):
+            if self.base is None:
+                self.base = defaultBase()
+            self.base.ensureLoaded()
+            if self.base.fuzzyEngine != "symspell":
+                raise ValueError("Store overlays need a base catalog using the 'symspell' fuzzy engine")
+            self.codes, self.tombstones = {}, set()
+            if os.path.exists(self.path(OVERLAY_FILE)):
+                with open(self.path(OVERLAY_FILE), 'r') as f:
+                    overlay = json.load(f)
+                self.codes = overlay.get("codes", {})
+                self.tombstones = set(overlay.get("tombstones", []))
+            self.names = {name: code for code, name in self.codes.items()}
+            self.loaded = True
+            self.rebuildIndexes()
+
+    def ensureLoaded(self) -> None:
+        if not self.loaded:
+            self.load()
+
+    def writeOverlay(self) -> None:
+        """Writes the overlay through a temporary file. It only holds this store's changes."""
+        os.makedirs(self.directory, exist_ok=True)
+        filename = self.path(OVERLAY_FILE)
+        with open(filename + ".tmp", 'w') as f:
+            json.dump({"codes": self.codes, "tombstones": sorted(self.tombstones)}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(filename + ".tmp", filename)
+
+    def save(self) -> None:
+        if self.loaded:
+            with self.metrics.timing("storage", "save"):
+                self.writeOverlay()
+
+    def setFuzzyEngine(self, engine: str) -> None:
+        if engine != self.fuzzyEngine:
+            raise ValueError(f"Store overlays only support the '{self.fuzzyEngine}' fuzzy engine")
+
+    # ---------- Indexes ----------
+    def visible(self, name: str) -> bool:
+        """True if a base name is still part of this store."""
+        return self.base.nameToCode[name] not in self.tombstones
+
+    def hiddenNames(self) -> list:
+        """The base names this store removed or replaced."""
+        return [self.base.codeToName[code] for code in self.tombstones if code in self.base.codeToName]
+
+    def rebuildIndexes(self) -> None:
+        self.generation += 1
+        self.nameIndex.rebuild(self.names)
+        self.prefixIndex.rebuild(self.names)
+        self.sortedView.rebuild(self.names)
+        self.codeIndex.rebuild(self.codes)
+        self.keyIndex.rebuild(self.names)
+        self.tokenIndex = None
+        self.phoneticIndex = LayeredPhoneticIndex(self.base.phoneticIndex, self.visible)
+        self.phoneticIndex.rebuild(self.names)
+        self.fuzzyMatcher = LayeredWordIndex(self.base.fuzzyMatcher, self.visible)
+        self.fuzzyMatcher.rebuild(self.names)
+
+    # ---------- Lookups ----------
+    def search(self, query) -> list:
+        """
+        Searches with exact, partial, phonetic or fuzzy matching, like PluDatabase.search().
+        Returns a list of (code, name) tuples matching the query.
+        """
+        return self.searchTier(query)[1]
+
+    def searchTier(self, query) -> tuple:
+        """(tier, results) for search(), like PluDatabase.searchTier()."""
+        self.ensureLoaded()
+        query = str(query).strip().lower()
+
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        generation = (self.generation, self.base.generation)
+        cached = self.cache.get(query, generation)
+        if cached is None:
+            cached = self.lookupTier(query)
+            self.cache.put(query, generation, cached)
+            tier = cached[0]
+        else:
+            tier = "cache"
+        if timed:
+            self.metrics.observe("search", tier, time.perf_counter() - start)
+        found_by, results = cached
+        countUse(self.usage, query, results)
+        return found_by, list(results)
+
+    def cacheStats(self) -> dict:
+        return self.cache.stats()
+
+    def autocomplete(self, prefix, k: int=10, byFrequency: bool=False) -> list:
+        """
+        Type-ahead suggestions like PluDatabase.autocomplete(). The base and overlay prefix
+        indexes are merged in order as they are walked.
+        """
+        self.ensureLoaded()
+        prefix = str(prefix).strip().lower()
+        if not prefix:
+            return []
+        base, own = self.base.prefixIndex, self.prefixIndex
+        found = itertools.chain(
+            (name for _, name in heapq.merge(
+                (entry for entry in base.entryMatches(base.heads, prefix) if self.visible(entry[1])),
+                own.entryMatches(own.heads, prefix))),
+            (name for _, name in heapq.merge(
+                (entry for entry in base.entryMatches(base.tails, prefix) if self.visible(entry[1])),
+                own.entryMatches(own.tails, prefix))))
+        if byFrequency:
+            names = rankCompletions(found, prefix, k, self.usage)
+        else:
+            names = []
+            for name in found:
+                if len(names) == k:
+                    break
+                if name not in names:
+                    names.append(name)
+        return [(self.codeFor(name), name) for name in names]
+
+    def rankedSearch(self, query, k: int=10) -> list:
+        """
+        Up to k (code, name) pairs ranked by the words they share with query (BM25), best first.
+        Scores cover the whole store: the overlay's word index is combined with the base's, which
+        every store shares. The overlay's is built on first use and again after the base changes.
+        """
+        self.ensureLoaded()
+        with self.metrics.timing("search", "ranked"):
+            if self.tokenIndex is None or self.tokenIndex[0] != self.base.generation:
+                index = LayeredTokenIndex(self.base.rankingIndex(), self.hiddenNames)
+                index.rebuild(self.names)
+                self.tokenIndex = (self.base.generation, index)
+            return [(self.codeFor(name), name) for name, _ in self.tokenIndex[1].search(str(query).strip().lower(), k)]
+
+    def lookup(self, query: str) -> list:
+        """The uncached search. query must already be normalized."""
+        return self.lookupTier(query)[1]
+
+    def lookupTier(self, query: str) -> tuple:
+        """(tier, results) for the uncached search, like PluDatabase.lookupTier()."""
+        # 1. Exact match by code
+        name = self.nameFor(query)
+        if name is not None:
+            return "code", [(query, name)]
+
+        # 2. Exact match by name, then by normalized name in the base and the overlay
+        code = self.codeFor(query)
+        if code is not None:
+            return "name", [(code, query)]
+        key = normalizeKey(query)
+        name_matches = [key] if self.codeFor(key) is not None else []
+        name_matches += [name for name in self.base.keyIndex.match(key) if self.visible(name)] + self.keyIndex.match(key)
+        if name_matches:
+            return "name", [(self.codeFor(name), name) for name in name_matches]
+
+        # 3. Partial match in names: base matches still in this store, then the overlay's
+        results = []
+        for index, names, visible in ((self.base.nameIndex, self.base.nameToCode, self.visible),
+                                      (self.nameIndex, self.names, None)):
+            name_matches = index.search(query)
+            if name_matches is None:
+                name_matches = [name for name in names if query in name]
+            for name in name_matches:
+                if visible is None or visible(name):
+                    results.append((names[name], name))
+        if results:
+            return "partial", results
+
+        # 4. Phonetic match: every query word sounds like a word of the name
+        results = [(self.codeFor(name), name) for name in self.phoneticIndex.match(query, n=5, cutoff=0.6)]
+        if results:
+            return "phonetic", results
+
+        # 5. Fuzzy match through the base and overlay word indexes
+        results = [(self.codeFor(name), name) for name in self.fuzzyMatcher.match(query, n=5, cutoff=0.6)]
+        return ("fuzzy" if results else "none"), results
+
+    def find(self, key):
+        """Returns (code, name) for an exact code or name, or None if there is no such item."""
+        self.ensureLoaded()
+        key = str(key).strip().lower()
+        name = self.nameFor(key)
+        if name is not None:
+            return key, name
+        code = self.codeFor(key)
+        if code is not None:
+            return code, key
+        return None
+
+    def nameFor(self, code):
+        self.ensureLoaded()
+        code = str(code)
+        if code in self.codes:
+            return self.codes[code]
+        if code in self.tombstones:
+            return None
+        return self.base.codeToName.get(code)
+
+    def codeFor(self, name):
+        self.ensureLoaded()
+        name = str(name)
+        if name in self.names:
+            return self.names[name]
+        code = self.base.nameToCode.get(name)
+        return None if code in self.tombstones else code
+
+    def items(self) -> list:
+        """Returns every (code, name) pair: the base items still in this store, then the overlay's."""
+        self.ensureLoaded()
+        found = [(code, name) for code, name in self.base.codeToName.items() if code not in self.tombstones]
+        found.extend(self.codes.items())
+        return found
+
+    def sortedItems(self, offset: int=0, limit=None):
+        """Yields (code, name) pairs in name order, merging the base's sorted view with the overlay's."""
+        self.ensureLoaded()
+        names = heapq.merge((name for name in self.base.sortedView.names if self.visible(name)), self.sortedView.names)
+        stop = None if limit is None else offset + limit
+        for name in itertools.islice(names, offset, stop):
+            yield self.codeFor(name), name
+
+    def columnWidths(self) -> tuple:
+        """(longest code, longest name). Base items this store hides still count, which can only widen a column."""
+        self.ensureLoaded()
+        base_widths, own_widths = self.base.columnWidths(), self.sortedView.widths()
+        return max(base_widths[0], own_widths[0]), max(base_widths[1], own_widths[1])
+
+    def mergeCodes(self, base_codes, own_codes, key) -> list:
+        """Merges ordered code streams of the base (skipping hidden codes) and the overlay into (code, name) pairs."""
+        visible = (code for code in base_codes if code not in self.tombstones)
+        return [(code, self.nameFor(code)) for code in heapq.merge(visible, own_codes, key=key)]
+
+    def codeRange(self, low, high) -> list:
+        """Every (code, name) whose numeric code is between low and high inclusive, in code order."""
+        self.ensureLoaded()
+        low, high = int(low), int(high)
+        return self.mergeCodes(self.base.codeIndex.range(low, high), self.codeIndex.range(low, high), int)
+
+    def codePrefix(self, digits, length=None) -> list:
+        """Every (code, name) whose code starts with digits, only length digits long if given."""
+        self.ensureLoaded()
+        digits = str(digits).strip()
+        return self.mergeCodes(self.base.codeIndex.prefix(digits, length), self.codeIndex.prefix(digits, length),
+                               lambda code: (len(code), int(code)))
+
+    def category(self, category) -> list:
+        """Every (code, name) named category or "category - <variety>", in name order."""
+        self.ensureLoaded()
+        category = str(category).strip().lower()
+        names = heapq.merge((name for name in categoryNames(self.base.sortedView.names, category) if self.visible(name)),
+                            categoryNames(self.sortedView.names, category))
+        return [(self.codeFor(name), name) for name in names]
+
+    # ---------- Changes ----------
+    def put(self, code: str, name: str) -> None:
+        """Makes code/name part of this store, as an overlay item or by lifting a base item's tombstone."""
+        if self.place(code, name):
+            self.indexOverlayItem(code, name)
+
+    def place(self, code: str, name: str) -> bool:
+        """The dictionary half of put(). Returns True if code/name became an overlay item, which needs indexing."""
+        if code in self.tombstones and self.base.codeToName.get(code) == name:
+            self.tombstones.discard(code)
+            return False
+        self.codes[code] = name
+        self.names[name] = code
+        return True
+
+    def indexOverlayItem(self, code: str, name: str) -> None:
+        if self.tokenIndex is not None:
+            self.tokenIndex[1].add(name)
+        self.nameIndex.add(name)
+        self.prefixIndex.add(name)
+        self.sortedView.add(name, code)
+        self.codeIndex.add(code)
+        self.keyIndex.add(name)
+        self.phoneticIndex.add(name)
+        self.fuzzyMatcher.add(name)
+
+    def drop(self, code: str, name: str) -> None:
+        """Removes code/name from this store: an overlay item is deleted, a base item gets a tombstone."""
+        if self.codes.get(code) == name:
+            del self.codes[code]
+            del self.names[name]
+            if self.tokenIndex is not None:
+                self.tokenIndex[1].remove(name)
+            self.nameIndex.remove(name)
+            self.prefixIndex.remove(name)
+            self.sortedView.remove(name, code)
+            self.codeIndex.remove(code)
+            self.keyIndex.remove(name)
+            self.phoneticIndex.remove(name)
+            self.fuzzyMatcher.remove(name)
+        if code in self.base.codeToName:
+            self.tombstones.add(code)
+
+    def add(self, name: str, code) -> None:
+        """Adds a new item to this store. Raises ValueError if the name or code is already used."""
+        with self.metrics.timing("action", "add"):
+            self.ensureLoaded()
+            name = str(name).strip().lower()
+            code = str(code).strip()
+            if not name or not code:
+                raise ValueError("Name and code cannot be empty")
+            if self.nameFor(code) is not None:
+                raise ValueError(f"PLU code '{code}' already exists for '{self.nameFor(code)}'")
+            if self.codeFor(name) is not None:
+                raise ValueError(f"Produce name '{name}' already exists with PLU code '{self.codeFor(name)}'")
+            self.generation += 1
+            self.put(code, name)
+            self.writeOverlay()
+
+    def addMany(self, pairs) -> tuple:
+        """Adds (code, name) pairs like PluDatabase.addMany(), writing the overlay once at the end."""
+        conflicts = []
+        added = []      # (code, name, whether it is an overlay item)
+        with self.metrics.timing("action", "import"):
+            self.ensureLoaded()
+            try:
+                for row, (code, name) in enumerate(pairs, 1):
+                    name = str(name).strip().lower()
+                    code = str(code).strip()
+                    problem = addProblem(self, name, code)
+                    if problem is not None:
+                        conflicts.append((row, code, name, problem))
+                        continue
+                    added.append((code, name, self.place(code, name)))
+            except BaseException:
+                for code, name, overlay in added:
+                    if overlay:
+                        del self.codes[code], self.names[name]
+                    else:
+                        self.tombstones.add(code)
+                raise
+            if added:
+                if len(added) > len(self.names) // 4:
+                    self.rebuildIndexes()       # cheaper than indexing a big batch item by item
+                else:
+                    self.generation += 1
+                    for code, name, overlay in added:
+                        if overlay:
+                            self.indexOverlayItem(code, name)
+                self.writeOverlay()
+        return len(added), conflicts
+
+    def remove(self, key) -> tuple:
+        """Removes the item with an exact code or name from this store. Returns its (code, name)."""
+        with self.metrics.timing("action", "remove"):
+            found = self.find(key)
+            if found is None:
+                raise KeyError(f"Item '{key}' not found")
+            self.generation += 1
+            self.drop(*found)
+            self.usage.pop(found[1], None)
+            self.writeOverlay()
+            return found
+
+    def edit(self, key, new_name=None, new_code=None) -> tuple:
+        """
+        Renames and/or recodes the item with an exact code or name in this store. Both changes
+        are checked before either is applied. Returns the updated (code, name).
+        """
+        with self.metrics.timing("action", "edit"):
+            found = self.find(key)
+            if found is None:
+                raise KeyError(f"Item '{key}' not found")
+            code, name = found
+            new_name = str(new_name).strip().lower() if new_name else name
+            new_code = str(new_code).strip() if new_code else code
+            if new_name != name and self.codeFor(new_name) is not None:
+                raise ValueError("That name already exists.")
+            if new_code != code and self.nameFor(new_code) is not None:
+                raise ValueError("That code already exists.")
+            self.generation += 1
+            self.drop(code, name)
+            self.put(new_code, new_name)
+            if name in self.usage and new_name != name:
+                self.usage[new_name] = self.usage.pop(name)
+            self.writeOverlay()
+            return new_code, new_name
+
+    def reset(self) -> None:
+        """Drops this store's changes, back to the base catalog."""
+        self.ensureLoaded()
+        self.codes, self.names, self.tombstones = {}, {}, set()
+        self.rebuildIndexes()
+        self.writeOverlay()
+
+
+class SqlitePluDatabase:
+    """
+    A PLU catalog kept in an SQLite file instead of in-memory dictionaries, for catalogs too large
+    to load. Code and name are indexed columns, an FTS5 trigram table serves partial-name search and
+    SqliteWordIndex the fuzzy tier, so startup and memory stay flat as the catalog grows.
+    Same search/find/add/remove/edit API as PluDatabase.
+    """
+    def __init__(self, filename: str=SQLITE_FILE, seed=None, cacheSize: int=1024):
+        self.filename = filename
+        self.seed = seed            # (code, name) pairs for a new file, defaults if None
+        self.enableCustomData = True
+        self.fuzzyEngine = "symspell"
+        self.fuzzyMatcher = None
+        self.phoneticIndex = None
+        self.tokenIndex = None
+        self.cache = QueryCache(cacheSize)
+        self.metrics = Metrics()
+        self.generation = 0             # bumped on our own changes
+        self.usage = {}                 # name -> exact lookups in this process, for autocomplete ranking
+        self.connection = None
+        self.fts = False            # False when this SQLite build has no FTS5 trigram tokenizer
+        self.widths = None          # (generation, column widths) for Show All
+
+    def load(self) -> None:
+        """Opens the file and creates the tables. A new file is filled from seed or the defaults."""
+        with self.metrics.timing("storage", "load"):
+            self.connection = sqlite3.connect(self.filename)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE, name TEXT NOT NULL UNIQUE, key TEXT)")
+                if "key" not in [column[1] for column in self.connection.execute("PRAGMA table_info(items)")]:
+                    # a file from before normalized names
+                    self.connection.execute("ALTER TABLE items ADD COLUMN key TEXT")
+                    self.connection.executemany("UPDATE items SET key = ? WHERE id = ?",
+                                                ((normalizeKey(name), item_id) for item_id, name in
+                                                 self.connection.execute("SELECT id, name FROM items").fetchall()))
+                self.connection.execute("CREATE INDEX IF NOT EXISTS items_key ON items(key)")
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS items_number ON items(CAST(code AS INTEGER)) WHERE {SQL_NUMERIC_CODE}")
+                try:
+                    self.connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(name, content='items', content_rowid='id', tokenize='trigram')")
+                    self.connection.executescript("""
+                        CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+                            INSERT INTO items_fts(rowid, name) VALUES (new.id, new.name);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+                            INSERT INTO items_fts(items_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS items_au AFTER UPDATE OF name ON items BEGIN
+                            INSERT INTO items_fts(items_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                            INSERT INTO items_fts(rowid, name) VALUES (new.id, new.name);
+                        END;
+                    """)
+                    # Whole words with prefix indexes, for rankedSearch()
+                    words_existed = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_words'").fetchone()
+                    self.connection.executescript("""
+                        CREATE VIRTUAL TABLE IF NOT EXISTS items_words USING fts5(name, content='items', content_rowid='id', tokenize='unicode61', prefix='1 2 3');
+                        CREATE TRIGGER IF NOT EXISTS items_words_ai AFTER INSERT ON items BEGIN
+                            INSERT INTO items_words(rowid, name) VALUES (new.id, new.name);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS items_words_ad AFTER DELETE ON items BEGIN
+                            INSERT INTO items_words(items_words, rowid, name) VALUES ('delete', old.id, old.name);
+                        END;
+                        CREATE TRIGGER IF NOT EXISTS items_words_au AFTER UPDATE OF name ON items BEGIN
+                            INSERT INTO items_words(items_words, rowid, name) VALUES ('delete', old.id, old.name);
+                            INSERT INTO items_words(rowid, name) VALUES (new.id, new.name);
+                        END;
+                    """)
+                    if not words_existed:       # a file from before rankedSearch()
+                        self.connection.execute("INSERT INTO items_words(items_words) VALUES ('rebuild')")
+                    self.fts = True
+                except sqlite3.OperationalError:
+                    self.fts = False
+            self.fuzzyMatcher = SqliteWordIndex(self.connection, self.fts)
+            self.phoneticIndex = SqlitePhoneticIndex(self.fuzzyMatcher)
+            self.tokenIndex = SqliteTokenIndex(self.fuzzyMatcher)
+            if self.connection.execute("SELECT 1 FROM items LIMIT 1").fetchone() is None:
+                self.insertMany(defaultCodeToName.items() if self.seed is None else self.seed)
+
+    def ensureLoaded(self) -> None:
+        if self.connection is None:
+            self.load()
+
+    def insertMany(self, pairs) -> None:
+        """Fills an empty catalog in one transaction and builds the word index."""
+        self.generation += 1
+        with self.connection:
+            self.connection.executemany("INSERT INTO items (code, name, key) VALUES (?, ?, ?)",
+                                        ((str(code), str(name), normalizeKey(str(name))) for code, name in pairs))
+            self.fuzzyMatcher.rebuild(name for (name,) in self.connection.execute("SELECT name FROM items").fetchall())
+
+    def save(self) -> None:
+        """Every change is committed as it happens, so there is nothing left to write."""
+        if self.connection is not None:
+            self.connection.commit()
+
+    def setFuzzyEngine(self, engine: str) -> None:
+        if engine != self.fuzzyEngine:
+            raise ValueError(f"The SQLite backend only supports the '{self.fuzzyEngine}' fuzzy engine")
+
+    # ---------- Lookups ----------
+    def search(self, query) -> list:
+        """
+        Searches with exact, partial, phonetic or fuzzy matching, like PluDatabase.search().
+        Returns a list of (code, name) tuples matching the query.
+        """
+        return self.searchTier(query)[1]
+
+    def searchTier(self, query) -> tuple:
+        """(tier, results) for search(), like PluDatabase.searchTier()."""
+        self.ensureLoaded()
+        query = str(query).strip().lower()
+
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        # data_version changes when another connection commits, so their writes invalidate too
+        generation = (self.generation, self.connection.execute("PRAGMA data_version").fetchone()[0])
+        cached = self.cache.get(query, generation)
+        if cached is None:
+            cached = self.lookupTier(query)
+            self.cache.put(query, generation, cached)
+            tier = cached[0]
+        else:
+            tier = "cache"
+        if timed:
+            self.metrics.observe("search", tier, time.perf_counter() - start)
+        found_by, results = cached
+        countUse(self.usage, query, results)
+        return found_by, list(results)
+
+    def cacheStats(self) -> dict:
+        return self.cache.stats()
+
+    def autocomplete(self, prefix, k: int=10, byFrequency: bool=False) -> list:
+        """
+        Type-ahead suggestions like PluDatabase.autocomplete(). Names starting with prefix
+        come from a range scan of the name index, later words from the FTS5 table; those are
+        all fetched and ordered by the matched word, as PrefixIndex files them, before cutting to k.
+        """
+        self.ensureLoaded()
+        prefix = str(prefix).strip().lower()
+        if not prefix:
+            return []
+        limit = -1 if byFrequency else k
+        heads = [name for (name,) in self.connection.execute(
+            "SELECT name FROM items WHERE name >= ? AND name < ? ORDER BY name LIMIT ?", (prefix, prefix + "\U0010ffff", limit))]
+        if not byFrequency and len(heads) >= k:
+            return [(self.codeFor(name), name) for name in heads[:k]]
+        if self.fts and len(prefix) >= 3:
+            rows = self.connection.execute("SELECT name FROM items_fts WHERE items_fts MATCH ?", (self.phrase(prefix),))
+        else:
+            rows = self.connection.execute("SELECT name FROM items WHERE instr(name, ?) > 0", (prefix,))
+        if byFrequency:
+            names = rankCompletions(heads + [name for (name,) in rows if completionRank(name, prefix)], prefix, k, self.usage)
+        else:
+            listed = set(heads)
+            tails = sorted((tail, name) for (name,) in rows for tail in [completionTail(name, prefix)]
+                           if tail is not None and name not in listed)
+            names = heads + [name for _, name in tails[:k - len(heads)]]
+        return [(self.codeFor(name), name) for name in names]
+
+    def rankedSearch(self, query, k: int=10) -> list:
+        """
+        Up to k (code, name) pairs ranked by the words they share with query (BM25), best first,
+        scored by the same TokenIndex code as PluDatabase over the word tables in the file.
+        """
+        self.ensureLoaded()
+        with self.metrics.timing("search", "ranked"):
+            return [(self.codeFor(name), name) for name, _ in self.tokenIndex.search(str(query).strip().lower(), k)]
+
+    def lookup(self, query: str) -> list:
+        """The uncached search. query must already be normalized."""
+        return self.lookupTier(query)[1]
+
+    def lookupTier(self, query: str) -> tuple:
+        """(tier, results) for the uncached search, like PluDatabase.lookupTier()."""
+        execute = self.connection.execute
+
+        # 1. Exact match by code
+        row = execute("SELECT code, name FROM items WHERE code = ?", (query,)).fetchone()
+        if row:
+            return "code", [row]
+
+        # 2. Exact match by name, then by normalized name
+        row = execute("SELECT code, name FROM items WHERE name = ?", (query,)).fetchone()
+        if row:
+            return "name", [row]
+        results = execute("SELECT code, name FROM items WHERE key = ? ORDER BY id", (normalizeKey(query),)).fetchall()
+        if results:
+            return "name", results
+
+        # 3. Partial match in names (FTS5 trigram table, scan for very short queries)
+        if self.fts and len(query) >= 3:
+            results = execute("SELECT items.code, items.name FROM items_fts JOIN items ON items.id = items_fts.rowid "
+                              "WHERE items_fts MATCH ? ORDER BY items.id", (self.phrase(query),)).fetchall()
+        else:
+            results = execute("SELECT code, name FROM items WHERE instr(name, ?) > 0 ORDER BY id", (query,)).fetchall()
+        if results:
+            return "partial", results
+
+        # 4. Phonetic match: every query word sounds like a word of the name
+        results = [(self.codeFor(name), name) for name in self.phoneticIndex.match(query, n=5, cutoff=0.6)]
+        if results:
+            return "phonetic", results
+
+        # 5. Fuzzy match through the word deletion index
+        for name in self.fuzzyMatcher.match(query, n=5, cutoff=0.6):
+            results.append((self.codeFor(name), name))
+        return ("fuzzy" if results else "none"), results
+
+    def phrase(self, text: str) -> str:
+        return '"' + text.replace('"', '""') + '"'
+
+    def find(self, key):
+        """Returns (code, name) for an exact code or name, or None if there is no such item."""
+        self.ensureLoaded()
+        key = str(key).strip().lower()
+        return self.connection.execute("SELECT code, name FROM items WHERE code = ? UNION ALL "
+                                       "SELECT code, name FROM items WHERE name = ? LIMIT 1", (key, key)).fetchone()
+
+    def nameFor(self, code):
+        self.ensureLoaded()
+        row = self.connection.execute("SELECT name FROM items WHERE code = ?", (str(code),)).fetchone()
+        return row[0] if row else None
+
+    def codeFor(self, name):
+        self.ensureLoaded()
+        row = self.connection.execute("SELECT code FROM items WHERE name = ?", (str(name),)).fetchone()
+        return row[0] if row else None
+
+    def items(self) -> list:
+        """Returns every (code, name) pair."""
+        self.ensureLoaded()
+        return self.connection.execute("SELECT code, name FROM items ORDER BY id").fetchall()
+
+    def sortedItems(self, offset: int=0, limit=None):
+        """Yields (code, name) pairs in name order, read from the name index as they are consumed."""
+        self.ensureLoaded()
+        yield from self.connection.execute("SELECT code, name FROM items ORDER BY name LIMIT ? OFFSET ?",
+                                           (-1 if limit is None else limit, offset))
+
+    def columnWidths(self) -> tuple:
+        """(longest code, longest name), remembered until the catalog changes."""
+        self.ensureLoaded()
+        generation = (self.generation, self.connection.execute("PRAGMA data_version").fetchone()[0])
+        if self.widths is None or self.widths[0] != generation:
+            code_width, name_width = self.connection.execute("SELECT max(length(code)), max(length(name)) FROM items").fetchone()
+            self.widths = (generation, (code_width or 0, name_width or 0))
+        return self.widths[1]
+
+    def codeRange(self, low, high) -> list:
+        """Every (code, name) whose numeric code is between low and high inclusive, from the items_number index."""
+        self.ensureLoaded()
+        return self.connection.execute(f"SELECT code, name FROM items WHERE {SQL_NUMERIC_CODE} AND CAST(code AS INTEGER) BETWEEN ? AND ? "
+                                       "ORDER BY CAST(code AS INTEGER)", (int(low), int(high))).fetchall()
+
+    def codePrefix(self, digits, length=None) -> list:
+        """
+        Every (code, name) whose code starts with digits, only length digits long if given. A prefix is
+        a range of the code index; bare lengths ("xxxx") a range of items_number.
+        """
+        self.ensureLoaded()
+        digits = str(digits).strip()
+        if digits:
+            where, args = "code >= ? AND code < ?", [digits, digits[:-1] + chr(ord(digits[-1]) + 1)]
+        elif length is not None:
+            where, args = "CAST(code AS INTEGER) BETWEEN 0 AND ?", [10 ** length - 1]
+        else:
+            where, args = "1", []
+        if length is not None:
+            where += " AND length(code) = ?"
+            args.append(length)
+        return self.connection.execute(f"SELECT code, name FROM items WHERE {SQL_NUMERIC_CODE} AND {where} "
+                                       "ORDER BY length(code), CAST(code AS INTEGER)", args).fetchall()
+
+    def category(self, category) -> list:
+        """Every (code, name) named category or "category - <variety>", in name order, from the name index."""
+        self.ensureLoaded()
+        category = str(category).strip().lower()
+        prefix = category + " - "
+        results = self.connection.execute("SELECT code, name FROM items WHERE name = ?", (category,)).fetchall()
+        results += self.connection.execute("SELECT code, name FROM items WHERE name >= ? AND name < ? ORDER BY name",
+                                           (prefix, prefix[:-1] + "!")).fetchall()
+        return results
+
+    # ---------- Changes ----------
+    def add(self, name: str, code) -> None:
+        """Adds a new item. Raises ValueError if the name or code is already used."""
+        with self.metrics.timing("action", "add"):
+            self.ensureLoaded()
+            name = str(name).strip().lower()
+            code = str(code).strip()
+            if not name or not code:
+                raise ValueError("Name and code cannot be empty")
+            if self.nameFor(code) is not None:
+                raise ValueError(f"PLU code '{code}' already exists for '{self.nameFor(code)}'")
+            if self.codeFor(name) is not None:
+                raise ValueError(f"Produce name '{name}' already exists with PLU code '{self.codeFor(name)}'")
+            self.generation += 1
+            with self.connection:
+                self.connection.execute("INSERT INTO items (code, name, key) VALUES (?, ?, ?)", (code, name, normalizeKey(name)))
+                self.fuzzyMatcher.add(name)
+
+    def addMany(self, pairs) -> tuple:
+        """Adds (code, name) pairs like PluDatabase.addMany(), in one transaction that rolls back if reading fails."""
+        conflicts = []
+        added = []
+        with self.metrics.timing("action", "import"):
+            self.ensureLoaded()
+            self.generation += 1
+            with self.connection:
+                for row, (code, name) in enumerate(pairs, 1):
+                    name = str(name).strip().lower()
+                    code = str(code).strip()
+                    problem = addProblem(self, name, code)
+                    if problem is not None:
+                        conflicts.append((row, code, name, problem))
+                        continue
+                    self.connection.execute("INSERT INTO items (code, name, key) VALUES (?, ?, ?)", (code, name, normalizeKey(name)))
+                    added.append(name)
+                self.fuzzyMatcher.addMany(added)
+        return len(added), conflicts
+
+    def remove(self, key) -> tuple:
+        """Removes the item with an exact code or name. Returns its (code, name)."""
+        with self.metrics.timing("action", "remove"):
+            found = self.find(key)
+            if found is None:
+                raise KeyError(f"Item '{key}' not found")
+            self.generation += 1
+            with self.connection:
+                self.connection.execute("DELETE FROM items WHERE code = ?", (found[0],))
+                self.fuzzyMatcher.remove(found[1])
+            return found
+
+    def edit(self, key, new_name=None, new_code=None) -> tuple:
+        """
+        Renames and/or recodes the item with an exact code or name. Both changes are
+        checked before either is applied. Returns the updated (code, name).
+        """
+        with self.metrics.timing("action", "edit"):
+            found = self.find(key)
+            if found is None:
+                raise KeyError(f"Item '{key}' not found")
+            code, name = found
+            new_name = str(new_name).strip().lower() if new_name else name
+            new_code = str(new_code).strip() if new_code else code
+            if new_name != name and self.codeFor(new_name) is not None:
+                raise ValueError("That name already exists.")
+            if new_code != code and self.nameFor(new_code) is not None:
+                raise ValueError("That code already exists.")
+            self.generation += 1
+            with self.connection:
+                self.connection.execute("UPDATE items SET code = ?, name = ?, key = ? WHERE code = ?",
+                                        (new_code, new_name, normalizeKey(new_name), code))
+                if new_name != name:
+                    self.fuzzyMatcher.remove(name)
+                    self.fuzzyMatcher.add(new_name)
+            return new_code, new_name
+
+    def reset(self) -> None:
+        """Replaces every item with the default values."""
+        self.ensureLoaded()
+        self.generation += 1
+        with self.connection:
+            self.connection.execute("DELETE FROM items")
+        self.insertMany(defaultCodeToName.items())
+
+
+# SNAPSHOT FORMAT
+# A header of uint32 fields, then uint32 arrays and one UTF-8 string blob. Record ids are
+# positions in the original codeToName order, so sorted posting lists give results in that order.
+SNAPSHOT_MAGIC = b"PLUSNAP5"
+SNAPSHOT_SECTIONS = (
+    "records",          # 4 per record: code offset, code length, name offset, name length
+    "codeOrder",        # record ids sorted by code
+    "nameOrder",        # record ids sorted by name
+    "numericOrder",     # record ids of all-digit codes sorted by value, then code
+    "codeLengths",      # lengths of the all-digit codes, ascending
+    "gramKeys",         # sorted 3-byte name trigrams
+    "gramStarts",       # len(gramKeys) + 1 offsets into gramPostings
+    "gramPostings",     # record ids per trigram, ascending
+    "words",            # 2 per word, sorted: blob offset, length
+    "wordStarts",       # len(words) + 1 offsets into wordPostings
+    "wordPostings",     # record ids per word, ascending
+    "wordCounts",       # times the word is in the name, for each of wordPostings
+    "wordLimits",       # 2 per word: most times in one name, fewest words of a name with it
+    "wordLengths",      # words in each record's name
+    "wordTotals",       # names with any words, words in all names
+    "variantHashes",    # sorted crc32 of every deletion variant of every word
+    "variantWords",     # word id for each variant hash
+    "soundHashes",      # sorted crc32 of the phoneticKey() of every word
+    "soundWords",       # word id for each sound hash
+    "keys",             # 2 per normalized name that differs from its name, sorted: blob offset, length
+    "keyRecords",       # record id for each of keys
+    "blob",             # all codes, names and words, UTF-8
+)
+
+
+def writeSnapshot(items, filename: str, max_distance: int=2) -> None:
+    """
+    Compiles (code, name) pairs into a snapshot file that SnapshotPluDatabase can open with mmap.
+    Builds the sorted code/name arrays, the trigram postings, the fuzzy and ranked word index
+    and the normalized name keys.
+    """
+    blob = bytearray()
+    records = array('I')
+    code_bytes, name_bytes = [], []
+    grams, words, counts = {}, {}, {}
+    word_lengths = array('I')
+    for record_id, (code, name) in enumerate(items):
+        code_b, name_b = str(code).encode('utf-8'), str(name).encode('utf-8')
+        records.extend((len(blob), len(code_b), len(blob) + len(code_b), len(name_b)))
+        blob += code_b + name_b
+        code_bytes.append(code_b)
+        name_bytes.append(name_b)
+        for gram in {name_b[i:i + 3] for i in range(len(name_b) - 2)}:
+            grams.setdefault(int.from_bytes(gram, 'big'), []).append(record_id)
+        tokens = tokenize(str(name))
+        word_lengths.append(len(tokens))
+        for word in dict.fromkeys(tokens):
+            words.setdefault(word, []).append(record_id)
+            counts.setdefault(word, []).append(tokens.count(word))
+
+    sections = {"records": records}
+    sections["codeOrder"] = array('I', sorted(range(len(code_bytes)), key=code_bytes.__getitem__))
+    sections["nameOrder"] = array('I', sorted(range(len(name_bytes)), key=name_bytes.__getitem__))
+    numeric = sorted((int(code_b), code_b, record_id) for record_id, code_b in enumerate(code_bytes) if CodeIndex.numeric(code_b.decode('utf-8')))
+    sections["numericOrder"] = array('I', (record_id for _, _, record_id in numeric))
+    sections["codeLengths"] = array('I', sorted({len(code_b) for _, code_b, _ in numeric}))
+
+    def postings(index, keys):
+        starts, flat = array('I', [0]), array('I')
+        for key in keys:
+            flat.extend(index[key])
+            starts.append(len(flat))
+        return starts, flat
+
+    gram_keys = sorted(grams)
+    sections["gramKeys"] = array('I', gram_keys)
+    sections["gramStarts"], sections["gramPostings"] = postings(grams, gram_keys)
+
+    word_list = sorted(words, key=lambda word: word.encode('utf-8'))
+    word_table = array('I')
+    variants = []
+    matcher = SymSpellMatcher(max_distance)
+    for word_id, word in enumerate(word_list):
+        word_b = word.encode('utf-8')
+        word_table.extend((len(blob), len(word_b)))
+        blob += word_b
+        for variant in matcher.variants(word, max_distance):
+            variants.append((zlib.crc32(variant.encode('utf-8')), word_id))
+    variants.sort()
+    sounds = sorted((zlib.crc32(phoneticKey(word).encode('utf-8')), word_id) for word_id, word in enumerate(word_list))
+    sections["soundHashes"] = array('I', (sound_hash for sound_hash, _ in sounds))
+    sections["soundWords"] = array('I', (word_id for _, word_id in sounds))
+    sections["words"] = word_table
+    sections["wordStarts"], sections["wordPostings"] = postings(words, word_list)
+    sections["wordCounts"] = postings(counts, word_list)[1]
+    sections["wordLimits"] = array('I')
+    for word in word_list:
+        sections["wordLimits"].extend((max(counts[word]), min(word_lengths[record_id] for record_id in words[word])))
+    sections["wordLengths"] = word_lengths
+    sections["wordTotals"] = array('I', (sum(1 for length in word_lengths if length), sum(word_lengths)))
+    sections["variantHashes"] = array('I', (variant_hash for variant_hash, _ in variants))
+    sections["variantWords"] = array('I', (word_id for _, word_id in variants))
+
+    keys = []
+    for record_id, name_b in enumerate(name_bytes):
+        key_b = normalizeKey(name_b.decode('utf-8')).encode('utf-8')
+        if key_b != name_b:
+            keys.append((key_b, record_id))
+    keys.sort()
+    key_table = array('I')
+    for key_b, _ in keys:
+        key_table.extend((len(blob), len(key_b)))
+        blob += key_b
+    sections["keys"] = key_table
+    sections["keyRecords"] = array('I', (record_id for _, record_id in keys))
+    sections["blob"] = bytes(blob)
+
+    # Header: magic, byte order check, record count, then (offset, size in bytes) per section
+    header_size = len(SNAPSHOT_MAGIC) + 4 * (2 + 2 * len(SNAPSHOT_SECTIONS))
+    header = array('I', (0x01020304, len(code_bytes)))
+    offset = header_size
+    for name in SNAPSHOT_SECTIONS:
+        size = len(sections[name]) * (1 if name == "blob" else 4)
+        header.extend((offset, size))
+        offset += size
+    with open(filename + ".tmp", 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(header.tobytes())
+        for name in SNAPSHOT_SECTIONS:
+            f.write(sections[name] if name == "blob" else sections[name].tobytes())
+    os.replace(filename + ".tmp", filename)
+
+
+class SnapshotWordIndex(SymSpellMatcher):
+    """The fuzzy word index of a snapshot, read straight from the mapped file."""
+    def __init__(self, snapshot):
+        super().__init__()
+        self.snapshot = snapshot
+
+    def add(self, name: str) -> None:
+        raise ValueError("Snapshot catalogs are read-only")
+
+    remove = add
+
+    def rebuild(self, names) -> None:
+        pass
+
+    def wordsForVariants(self, variants) -> set:
+        snapshot = self.snapshot
+        hashes = snapshot.variantHashes
+        found = set()
+        for variant in variants:
+            variant_hash = zlib.crc32(variant.encode('utf-8'))
+            i = bisect.bisect_left(hashes, variant_hash)
+            while i < len(hashes) and hashes[i] == variant_hash:
+                found.add(snapshot.word(snapshot.variantWords[i]))
+                i += 1
+        return found
+
+    def namesWith(self, word: str):
+        snapshot = self.snapshot
+        word_id = snapshot.findWord(word)
+        if word_id is None:
+            return []
+        start, end = snapshot.wordStarts[word_id], snapshot.wordStarts[word_id + 1]
+        return [snapshot.name(record_id) for record_id in snapshot.wordPostings[start:end]]
+
+    def allNames(self):
+        return (self.snapshot.name(record_id) for record_id in range(self.snapshot.count))
+
+
+class SnapshotCodeIndex(CodeIndex):
+    """The code index of a snapshot: bisects the file's numerically sorted record ids."""
+    def __init__(self, snapshot):
+        super().__init__()
+        self.snapshot = snapshot
+        self.lengths = dict.fromkeys(snapshot.codeLengths)     # prefix() only needs the lengths present
+
+    def add(self, code: str) -> None:
+        raise ValueError("Snapshot catalogs are read-only")
+
+    remove = add
+
+    def rebuild(self, codes) -> None:
+        pass
+
+    def range(self, low: int, high: int):
+        snapshot = self.snapshot
+        order = snapshot.numericOrder
+        value = lambda record_id: int(snapshot.codeBytes(record_id))
+        i = bisect.bisect_left(order, low, key=value)
+        stop = bisect.bisect_right(order, high, lo=i, key=value)
+        for j in range(i, stop):
+            yield snapshot.code(order[j])
+
+
+class SnapshotTokenIndex(TokenIndex):
+    """The ranked word index of a snapshot: postings, counts and name lengths read from the mapped file."""
+    def __init__(self, snapshot):
+        super().__init__()
+        self.snapshot = snapshot
+
+    def add(self, name: str) -> None:
+        raise ValueError("Snapshot catalogs are read-only")
+
+    remove = add
+
+    def rebuild(self, names) -> None:
+        pass
+
+    def documentCount(self) -> int:
+        return self.snapshot.wordTotals[0]
+
+    def averageLength(self) -> float:
+        return self.snapshot.wordTotals[1] / self.snapshot.wordTotals[0]
+
+    def documentsWith(self, word: str) -> int:
+        word_id = self.snapshot.findWord(word)
+        return self.snapshot.wordStarts[word_id + 1] - self.snapshot.wordStarts[word_id]
+
+    def bound(self, word: str) -> tuple:
+        word_id = self.snapshot.findWord(word)
+        return self.snapshot.wordLimits[2 * word_id], self.snapshot.wordLimits[2 * word_id + 1]
+
+    def matches(self, word: str):
+        snapshot = self.snapshot
+        word_id = snapshot.findWord(word)
+        for i in range(snapshot.wordStarts[word_id], snapshot.wordStarts[word_id + 1]):
+            record_id = snapshot.wordPostings[i]
+            yield snapshot.name(record_id), snapshot.wordCounts[i], snapshot.wordLengths[record_id]
+
+    def expand(self, token: str):
+        snapshot = self.snapshot
+        token_b = token.encode('utf-8')
+        word_count = len(snapshot.words) // 2
+        i = bisect.bisect_left(range(word_count), token_b, key=snapshot.wordBytes)
+        while i < word_count and snapshot.wordBytes(i).startswith(token_b):
+            yield snapshot.word(i)
+            i += 1
+
+
+class SnapshotPhoneticIndex(PhoneticIndex):
+    """
+    Phonetic buckets over the words of a snapshot, read from the file's sorted key hashes.
+    Names come from the snapshot's word postings.
+    """
+    def __init__(self, snapshot):
+        super().__init__()
+        self.snapshot = snapshot
+
+    def add(self, name: str) -> None:
+        raise ValueError("Snapshot catalogs are read-only")
+
+    remove = add
+
+    def rebuild(self, names) -> None:
+        pass
+
+    def wordsWithKey(self, key: str):
+        snapshot = self.snapshot
+        hashes = snapshot.soundHashes
+        key_hash = zlib.crc32(key.encode('utf-8'))
+        i = bisect.bisect_left(hashes, key_hash)
+        found = []
+        while i < len(hashes) and hashes[i] == key_hash:
+            word = snapshot.word(snapshot.soundWords[i])
+            if phoneticKey(word) == key:        # skip crc32 collisions
+                found.append(word)
+            i += 1
+        return found
+
+    def namesWith(self, word: str):
+        return self.snapshot.fuzzyMatcher.namesWith(word)
+
+
+class SnapshotPluDatabase:
+    """
+    A read-only PLU catalog opened from a compiled snapshot file with mmap. Opening costs the same
+    for any catalog size, and processes that open the same file share its pages. Searches binary-search
+    the sorted arrays and use the prebuilt trigram and word indexes inside the file.
+    Build the file with writeSnapshot() or 'pluSearch.py snapshot'.
+    """
+    def __init__(self, filename: str=SNAPSHOT_FILE, cacheSize: int=1024):
+        self.filename = filename
+        self.enableCustomData = False     # read-only
+        self.fuzzyEngine = "symspell"
+        self.fuzzyMatcher = SnapshotWordIndex(self)
+        self.phoneticIndex = SnapshotPhoneticIndex(self)
+        self.cache = QueryCache(cacheSize)
+        self.metrics = Metrics()
+        self.usage = {}                 # name -> exact lookups in this process, for autocomplete ranking
+        self.mapping = None
+        self.count = 0
+        self.widths = None              # column widths for Show All
+        self.codeIndex = None           # SnapshotCodeIndex, made on the first range or prefix query
+        self.tokenIndex = SnapshotTokenIndex(self)
+
+    def load(self) -> None:
+        with self.metrics.timing("storage", "load"):
+            with open(self.filename, 'rb') as f:
+                self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.mapping[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                if self.mapping[:len(SNAPSHOT_MAGIC) - 1] == SNAPSHOT_MAGIC[:-1]:
+                    raise ValueError(f"{self.filename} was built by an older version; rebuild it with 'pluSearch.py snapshot'")
+                raise ValueError(f"{self.filename} is not a PLU snapshot")
+            view = memoryview(self.mapping)
+            header = view[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 4 * (2 + 2 * len(SNAPSHOT_SECTIONS))].cast('I')
+            if header[0] != 0x01020304:
+                raise ValueError(f"{self.filename} was built on a machine with a different byte order")
+            self.count = header[1]
+            for i, name in enumerate(SNAPSHOT_SECTIONS):
+                offset, size = header[2 + 2 * i], header[3 + 2 * i]
+                section = view[offset:offset + size]
+                setattr(self, name, section if name == "blob" else section.cast('I'))
+
+    def ensureLoaded(self) -> None:
+        if self.mapping is None:
+            self.load()
+
+    def save(self) -> None:
+        pass    # read-only
+
+    def setFuzzyEngine(self, engine: str) -> None:
+        if engine != self.fuzzyEngine:
+            raise ValueError(f"Snapshots only support the '{self.fuzzyEngine}' fuzzy engine")
+
+    # ---------- Reading records ----------
+    def codeBytes(self, record_id: int) -> bytes:
+        offset, length = self.records[4 * record_id], self.records[4 * record_id + 1]
+        return self.blob[offset:offset + length].tobytes()
+
+    def nameBytes(self, record_id: int) -> bytes:
+        offset, length = self.records[4 * record_id + 2], self.records[4 * record_id + 3]
+        return self.blob[offset:offset + length].tobytes()
+
+    def code(self, record_id: int) -> str:
+        return self.codeBytes(record_id).decode('utf-8')
+
+    def name(self, record_id: int) -> str:
+        return self.nameBytes(record_id).decode('utf-8')
+
+    def wordBytes(self, word_id: int) -> bytes:
+        offset, length = self.words[2 * word_id], self.words[2 * word_id + 1]
+        return self.blob[offset:offset + length].tobytes()
+
+    def word(self, word_id: int) -> str:
+        return self.wordBytes(word_id).decode('utf-8')
+
+    def findSorted(self, order, read, key: bytes):
+        """Binary search of a sorted id array. Returns the matching id or None."""
+        i = bisect.bisect_left(order, key, key=read)
+        if i < len(order) and read(order[i]) == key:
+            return order[i]
+        return None
+
+    def keyBytes(self, key_id: int) -> bytes:
+        offset, length = self.keys[2 * key_id], self.keys[2 * key_id + 1]
+        return self.blob[offset:offset + length].tobytes()
+
+    def keyMatches(self, key: str) -> list:
+        """Record ids of the names whose normalized key is key."""
+        key_b = key.encode('utf-8')
+        record_id = self.findSorted(self.nameOrder, self.nameBytes, key_b)
+        found = [] if record_id is None else [record_id]
+        i = bisect.bisect_left(range(len(self.keyRecords)), key_b, key=self.keyBytes)
+        while i < len(self.keyRecords) and self.keyBytes(i) == key_b:
+            found.append(self.keyRecords[i])
+            i += 1
+        return found
+
+    def findWord(self, word: str):
+        word_ids = range(len(self.words) // 2)
+        word_b = word.encode('utf-8')
+        return self.findSorted(word_ids, self.wordBytes, word_b)
+
+    # ---------- Lookups ----------
+    def search(self, query) -> list:
+        """
+        Searches with exact, partial, phonetic or fuzzy matching, like PluDatabase.search().
+        Returns a list of (code, name) tuples matching the query.
+        """
+        return self.searchTier(query)[1]
+
+    def searchTier(self, query) -> tuple:
+        """(tier, results) for search(), like PluDatabase.searchTier()."""
+        self.ensureLoaded()
+        query = str(query).strip().lower()
+        timed = self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        cached = self.cache.get(query, 0)     # snapshots never change
+        if cached is None:
+            cached = self.lookupTier(query)
+            self.cache.put(query, 0, cached)
+            tier = cached[0]
+        else:
+            tier = "cache"
+        if timed:
+            self.metrics.observe("search", tier, time.perf_counter() - start)
+        found_by, results = cached
+        countUse(self.usage, query, results)
+        return found_by, list(results)
+
+    def cacheStats(self) -> dict:
+        return self.cache.stats()
+
+    def autocomplete(self, prefix, k: int=10, byFrequency: bool=False) -> list:
+        """
+        Type-ahead suggestions like PluDatabase.autocomplete(). Names starting with prefix are a
+        range of the name-sorted array, later words are found through the sorted word table.
+        """
+        self.ensureLoaded()
+        prefix = str(prefix).strip().lower()
+        words = tokenize(prefix)
+        if not prefix or not words:
+            return []
+        prefix_b = prefix.encode('utf-8')
+        heads = []
+        i = bisect.bisect_left(self.nameOrder, prefix_b, key=self.nameBytes)
+        while i < len(self.nameOrder) and (byFrequency or len(heads) < k):
+            name_b = self.nameBytes(self.nameOrder[i])
+            if not name_b.startswith(prefix_b):
+                break
+            heads.append(name_b.decode('utf-8'))
+            i += 1
+
+        # Later words: every indexed word starting with the prefix's first word
+        first_b = words[0].encode('utf-8')
+        word_count = len(self.words) // 2
+        tails = []
+        w = bisect.bisect_left(range(word_count), first_b, key=lambda word_id: self.word(word_id).encode('utf-8'))
+        while w < word_count and (byFrequency or len(heads) + len(tails) < k):
+            if not self.word(w).encode('utf-8').startswith(first_b):
+                break
+            found = []
+            for record_id in self.wordPostings[self.wordStarts[w]:self.wordStarts[w + 1]]:
+                name = self.name(record_id)
+                tail = completionTail(name, prefix)
+                if tail is not None:
+                    found.append((tail, name))
+            tails.extend(name for _, name in sorted(found) if name not in tails and name not in heads)
+            w += 1
+        if byFrequency:
+            names = rankCompletions(heads + tails, prefix, k, self.usage)
+        else:
+            names = (heads + tails)[:k]
+        return [(self.codeFor(name), name) for name in names]
+
+    def rankedSearch(self, query, k: int=10) -> list:
+        """
+        Up to k (code, name) pairs ranked by the words they share with query (BM25), best first.
+        The word postings, counts and name lengths are read from the file, so nothing is built.
+        """
+        self.ensureLoaded()
+        with self.metrics.timing("search", "ranked"):
+            return [(self.codeFor(name), name) for name, _ in self.tokenIndex.search(str(query).strip().lower(), k)]
+
+    def lookup(self, query: str) -> list:
+        """The uncached search. query must already be normalized."""
+        return self.lookupTier(query)[1]
+
+    def lookupTier(self, query: str) -> tuple:
+        """(tier, results) for the uncached search, like PluDatabase.lookupTier()."""
+        query_b = query.encode('utf-8')
+
+        # 1. Exact match by code
+        record_id = self.findSorted(self.codeOrder, self.codeBytes, query_b)
+        if record_id is not None:
+            return "code", [(query, self.name(record_id))]
+
+        # 2. Exact match by name, then by normalized name
+        record_id = self.findSorted(self.nameOrder, self.nameBytes, query_b)
+        if record_id is not None:
+            return "name", [(self.code(record_id), query)]
+        results = [(self.code(record_id), self.name(record_id)) for record_id in self.keyMatches(normalizeKey(query))]
+        if results:
+            return "name", results
+
+        # 3. Partial match in names (prebuilt trigram postings, scan for very short queries)
+        if len(query_b) < 3:
+            candidates = range(self.count)
+        else:
+            posting_lists = []
+            for gram in {query_b[i:i + 3] for i in range(len(query_b) - 2)}:
+                gram_key = int.from_bytes(gram, 'big')
+                i = bisect.bisect_left(self.gramKeys, gram_key)
+                if i == len(self.gramKeys) or self.gramKeys[i] != gram_key:
+                    posting_lists = []
+                    break
+                posting_lists.append(self.gramPostings[self.gramStarts[i]:self.gramStarts[i + 1]])
+            posting_lists.sort(key=len)
+            candidates = set(posting_lists[0]) if posting_lists else set()
+            for posting in posting_lists[1:]:
+                if len(candidates) <= 32:
+                    break   # checking the few left is cheaper than walking long postings
+                candidates.intersection_update(posting)
+            candidates = sorted(candidates)
+        results = [(self.code(record_id), self.name(record_id)) for record_id in candidates
+                   if query_b in self.nameBytes(record_id)]
+        if results:
+            return "partial", results
+
+        # 4. Phonetic match: every query word sounds like a word of the name
+        results = [(self.codeFor(name), name) for name in self.phoneticIndex.match(query, n=5, cutoff=0.6)]
+        if results:
+            return "phonetic", results
+
+        # 5. Fuzzy match through the snapshot's word index
+        results = [(self.codeFor(name), name) for name in self.fuzzyMatcher.match(query, n=5, cutoff=0.6)]
+        return ("fuzzy" if results else "none"), results
+
+    def find(self, key):
+        """Returns (code, name) for an exact code or name, or None if there is no such item."""
+        self.ensureLoaded()
+        key = str(key).strip().lower()
+        name = self.nameFor(key)
+        if name is not None:
+            return key, name
+        code = self.codeFor(key)
+        if code is not None:
+            return code, key
+        return None
+
+    def nameFor(self, code):
+        self.ensureLoaded()
+        record_id = self.findSorted(self.codeOrder, self.codeBytes, str(code).encode('utf-8'))
+        return None if record_id is None else self.name(record_id)
+
+    def codeFor(self, name):
+        self.ensureLoaded()
+        record_id = self.findSorted(self.nameOrder, self.nameBytes, str(name).encode('utf-8'))
+        return None if record_id is None else self.code(record_id)
+
+    def items(self) -> list:
+        """Returns every (code, name) pair."""
+        self.ensureLoaded()
+        return [(self.code(record_id), self.name(record_id)) for record_id in range(self.count)]
+
+    def sortedItems(self, offset: int=0, limit=None):
+        """Yields (code, name) pairs in name order, straight from the name-sorted array."""
+        self.ensureLoaded()
+        end = self.count if limit is None else min(self.count, offset + limit)
+        for i in range(max(0, offset), end):
+            record_id = self.nameOrder[i]
+            yield self.code(record_id), self.name(record_id)
+
+    def columnWidths(self) -> tuple:
+        """(longest code, longest name) in bytes, measured once since snapshots never change."""
+        self.ensureLoaded()
+        if self.widths is None:
+            self.widths = (max(self.records[1::4], default=0), max(self.records[3::4], default=0))
+        return self.widths
+
+    def numericCodes(self) -> CodeIndex:
+        """The code index, read from the file's numerically sorted codes."""
+        self.ensureLoaded()
+        if self.codeIndex is None:
+            self.codeIndex = SnapshotCodeIndex(self)
+        return self.codeIndex
+
+    def codeRange(self, low, high) -> list:
+        """Every (code, name) whose numeric code is between low and high inclusive, in code order."""
+        return [(code, self.nameFor(code)) for code in self.numericCodes().range(int(low), int(high))]
+
+    def codePrefix(self, digits, length=None) -> list:
+        """Every (code, name) whose code starts with digits, only length digits long if given."""
+        return [(code, self.nameFor(code)) for code in self.numericCodes().prefix(str(digits).strip(), length)]
+
+    def category(self, category) -> list:
+        """Every (code, name) named category or "category - <variety>", in name order, by bisecting the name-sorted array."""
+        self.ensureLoaded()
+        category = str(category).strip().lower()
+        results = []
+        record_id = self.findSorted(self.nameOrder, self.nameBytes, category.encode('utf-8'))
+        if record_id is not None:
+            results.append((self.code(record_id), category))
+        prefix_b = (category + " - ").encode('utf-8')
+        i = bisect.bisect_left(self.nameOrder, prefix_b, key=self.nameBytes)
+        while i < self.count and self.nameBytes(self.nameOrder[i]).startswith(prefix_b):
+            record_id = self.nameOrder[i]
+            results.append((self.code(record_id), self.name(record_id)))
+            i += 1
+        return results
+
+    # ---------- Changes ----------
+    def add(self, name: str, code) -> None:
+        raise ValueError("Snapshot catalogs are read-only. Edit the JSON database and rebuild the snapshot.")
+
+    def addMany(self, pairs) -> tuple:
+        raise ValueError("Snapshot catalogs are read-only. Edit the JSON database and rebuild the snapshot.")
+
+    def remove(self, key) -> tuple:
+        raise ValueError("Snapshot catalogs are read-only. Edit the JSON database and rebuild the snapshot.")
+
+    def edit(self, key, new_name=None, new_code=None) -> tuple:
+        raise ValueError("Snapshot catalogs are read-only. Edit the JSON database and rebuild the snapshot.")
+
+    def reset(self) -> None:
+        raise ValueError("Snapshot catalogs are read-only. Edit the JSON database and rebuild the snapshot.")
+
+
+def catalogCopy(database):
+    """
+    What a pool worker needs to search its own copy of database. Forked workers share in-memory and
+    snapshot catalogs with this process; SQLite connections cannot cross a fork, so those are reopened.
+    """
+    forked = poolContext().get_start_method() == "fork"
+    if isinstance(database, SqlitePluDatabase):
+        return ("sqlite", database.filename)
+    if isinstance(database, SnapshotPluDatabase):
+        return ("inherit", database) if forked else ("snapshot", database.filename)
+    if forked:
+        (database.base if isinstance(database, LayeredPluDatabase) else database).buildIndexes()   # once, not in every worker
+        return ("inherit", database)
+    return ("items", database.items(), database.fuzzyEngine, getattr(database, "compactCatalog", False))
+
+def openCatalogCopy(copy):
+    kind = copy[0]
+    if kind == "inherit":
+        return copy[1]
+    if kind == "sqlite":
+        return SqlitePluDatabase(copy[1])
+    if kind == "snapshot":
+        return SnapshotPluDatabase(copy[1])
+    database = PluDatabase(enableCustomData=False, fuzzyEngine=copy[2], compactCatalog=copy[3])
+    database.setCatalog(dict(copy[1]))
+    database.loaded = True
+    database.rebuildIndexes()
+    return database
+
+def searchChunk(key: int, queries: list) -> list:
+    """Runs searchTier() for each query in a pool worker."""
+    database = workerStates[key]
+    if isinstance(database, tuple):
+        database = workerStates[key] = openCatalogCopy(database)
+    return [database.searchTier(query) for query in queries]
+
+
+class ParallelSearch:
+    """
+    Searches one catalog from a pool of worker processes, for large batches of queries.
+    Each worker has its own copy of the catalog (inherited through fork where available, so it is
+    never pickled per task), queries are sent in chunks and results come back in query order,
+    the same as calling search() on each. The pool restarts if the catalog has changed since.
+    """
+    def __init__(self, database, workers=None, chunksize: int=256):
+        self.database = database
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.pool = None
+        self.key = None
+        self.generation = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def start(self) -> None:
+        self.close()
+        self.database.ensureLoaded()
+        self.generation = getattr(self.database, "generation", 0)
+        self.pool, self.key = startPool(catalogCopy(self.database), self.workers)
+
+    def searchMany(self, queries) -> list:
+        """Results of search() for each query, in order."""
+        return [results for _, results in self.searchTierMany(queries)]
+
+    def searchTierMany(self, queries) -> list:
+        """(tier, results) of searchTier() for each query, in order."""
+        queries = list(queries)
+        if self.pool is None or getattr(self.database, "generation", 0) != self.generation:
+            self.start()
+        chunks = [queries[i:i + self.chunksize] for i in range(0, len(queries), self.chunksize)]
+        results = []
+        for chunk_results in self.pool.map(searchChunk, itertools.repeat(self.key), chunks):
+            results.extend(chunk_results)
+        return results
+
+
+# Dev Tools
+def dbprint(message: str) -> str: 
+    print("===[DEVELOPER]===: " + message + "\n")
+
+# The catalog used by the CLI and by the module-level helpers below
+db = PluDatabase()
+sharedBase = None       # default catalog shared by every store overlay, see defaultBase()
+metricsFile = None      # Prometheus text file the CLI keeps up to date (--metrics-file)
+searchLimit = 10        # most results the menu search shows (--search-limit)
+
+def defaultBase():
+    """The read-only default catalog that LayeredPluDatabase stores share, loaded once per process."""
+    global sharedBase
+    if sharedBase is None:
+        sharedBase = PluDatabase(enableCustomData=False)
+        sharedBase.load()
+    return sharedBase
+
+def eagle(query):
+    """
+    Lookup helper that searches the default database with exact, partial, phonetic or fuzzy matching.
+    Returns a list of (code, name) tuples matching the query.
+    """
+    return db.search(query)
+
+def autocomplete(prefix, k: int=10, byFrequency: bool=False):
+    """Type-ahead suggestions from the default database. Returns up to k (code, name) tuples."""
+    return db.autocomplete(prefix, k, byFrequency)
+
+def rankedSearch(query, k=None):
+    """
+    Search as the menu does it: an exact code or name, else up to k names ranked by the words they
+    share with query, else eagle()'s partial and fuzzy matches. k defaults to searchLimit.
+    Returns a list of (code, name) tuples, best first.
+    """
+    return rankedSearchTier(query, k)[1]
+
+def rankedSearchTier(query, k=None):
+    """
+    rankedSearch() that also says how the results were found: (tier, results), where tier is
+    'ranked' for word-ranked results and otherwise the searchTier() step that answered.
+    Goes through the search cache, so a repeated query skips the tiered lookup.
+    """
+    k = searchLimit if k is None else k
+    tier, results = db.searchTier(query)
+    if tier not in ("code", "name"):
+        ranked = db.rankedSearch(query, k)
+        if ranked:
+            return "ranked", ranked
+    return tier, results[:k]
+
+def codeQuery(pattern):
+    """
+    Code range or prefix query on the default database: "3000-3999", "4xxx" or "94*".
+    Returns a list of (code, name) tuples in code order, or None if pattern is not a code query.
+    """
+    parsed = parseCodePattern(pattern)
+    if parsed is None:
+        return None
+    kind, first, second = parsed
+    if kind == "range":
+        return db.codeRange(first, second)
+    return db.codePrefix(first, second)
+
+def categoryItems(category):
+    """Every "category - variety" item of a category in the default database, in name order."""
+    return db.category(category)
+
+#1 - Initialize Database
+def initData(interactive: bool=True):
+    """    
+    Sets up database in RAM. Lookups load it on demand, but the CLI runs this first
+    so first-time users are asked about creating custom databases.
+    If user is on mobile, custom databases are disabled.
+    When interactive is False, missing databases fall back to defaults without prompting.
+    """
+    if isinstance(db, (SqlitePluDatabase, SnapshotPluDatabase, LayeredPluDatabase)):
+        db.load()
+        return
+    if db.customDataAllowed():
+        state = db.fileState()
+        if state == "none" and interactive:
+            print("\nWelcome to Produce Lookup Tool!\n")
+            print("Custom databases allow you to add, remove, and modify item codes and names to \nyour specifications. These files are stored in the same folder as this program.\n")
+            userResponse = input("Create a new database with default values? (y/n): ").strip().lower()
+            if userResponse == "y":
+                db.createFromDefaults()
+                print("Files created successfully.")
+                return
+            print("\nProceeding with default values.")
+        elif state == "legacy":
+            print("Migrating codeToName.json and nameToCode.json to pluDatabase.json (old files are kept as .bak).")
+    db.load()
+
+def saveDatabases():
+    """Writes the current database to its JSON file, if custom data is enabled."""
+    if not db.enableCustomData:
+        return  # Do nothing
+    
+    try:
+        db.save()
+        print("Saving database...")
+    except Exception as e:
+        print(f"Error saving database: {e}")
+
+
+# ===================== USER ACTION FUNCTIONS =====================
+
+#1 - Search
+def searchItem():
+    query = whisper("Enter produce name, PLU code, or code range like 4xxx or 3000-3999 (or 'cancel'): ", True, False)
+    results = codeQuery(query)
+    tier = "code query"
+    if results is None:
+        tier, results = rankedSearchTier(query)
+
+    if not results:
+        print("No matches found.")
+        return
+    
+    print(f"\n=== Search Results ({tier}) ===")
+    for code, name in results:
+        print(f"{code} - {name}")
+    print()
+
+#2 - Add Item
+def databaseAdd():
+    query_name = whisper("ADD: Enter new item name (or 'cancel'): ", True, False)
+    query_code = whisper("Enter new item code (or 'cancel'): ", True, True)
+
+    # query_code from int -> string
+    query_code = str(query_code).strip()
+
+    # Prevent duplicates
+    existing_name = db.nameFor(query_code)
+    if existing_name is not None:
+        print(f"\nPLU code '{query_code}' already exists for '{existing_name}'.")
+        return
+    existing_code = db.codeFor(query_name)
+    if existing_code is not None:
+        print(f"Produce name '{query_name}' already exists with PLU code '{existing_code}'.")
+        return
+
+    if query_name and query_code:
+        db.add(query_name, query_code)
+        print(f"=== Added item: {query_code} - {query_name} ===")
+        if db.enableCustomData:
+            print(f"Database updated successfully!")
+    else:
+        print("Add operation cancelled.")
+
+
+#3 - Remove item
+def databaseRemove():
+    user_input = whisper("REMOVE: Enter item code or exact name to remove (or 'cancel'): ", True, False)
+    found = db.find(user_input)
+    if found is None:
+        print("Item not found.")
+        return
+    code, name = found
+    confirm = input(f"Are you sure you want to remove '{code} - {name}'? (y/n): ").strip().lower()
+    if confirm != 'y':
+        print("Delete cancelled.")
+        return
+    db.remove(code)
+    print(f"Removed item: {code} - {name}")
+    if db.enableCustomData:
+        print(f"Database updated successfully!")
+
+
+#4 - Edit item
+def databaseEditEntry():
+    user_input = whisper("EDIT: Enter item code or exact name to edit (or 'cancel'): ", True, False)
+
+    # Set target item
+    found = db.find(user_input)
+    if found is None:
+        print("Item not found.")
+        return
+    code, name = found
+
+    # Request new data
+    print(f"Editing item: {code} - {name}")
+    new_name = whisper(f"Enter new name (Old name: '{name}'): ", True, False)
+    new_code = whisper(f"Enter new code (Old code: '{code}'): ", True, True)
+
+    # Validate and update
+    try:
+        code, name = db.edit(code, new_name, new_code)
+    except ValueError as e:
+        print(e)
+        return
+
+    print(f"Updated item: {code} - {name}")
+    if db.enableCustomData:
+        print(f"Database updated successfully!")
+
+
+
+#5 - Show all
+SHOW_ALL_PAGE = 50      # rows per page when Show All runs in a terminal
+
+def display_all_items(offset: int=0, limit=None, pageSize=None):
+    """
+    Prints the catalog in name order, streamed from the database's sorted view through a buffered
+    writer, so the first rows appear at once whatever the catalog size. offset/limit select a slice.
+    With pageSize, pauses after each page until Enter is pressed ('q' stops).
+    """
+    out = sys.stdout
+    rows = db.sortedItems(offset, limit)
+    first = next(rows, None)
+    print()
+    print("=== Current PLU Database ===")
+    print()
+    if first is None:
+        print("Database is empty." if offset == 0 else "No items at that position.")
+        return
+    code_width, name_width = db.columnWidths()
+    code_width, name_width = max(code_width, 4), max(name_width, 12)
+    # Header
+    out.write(f"{'PLU':<{code_width}}  {'Produce Name':<{name_width}}\n")
+    out.write("-" * (code_width + 2 + name_width) + "\n")
+    buffer = []
+    shown = 0
+    for code, name in itertools.chain([first], rows):
+        buffer.append(f"{code:<{code_width}}  {name:<{name_width}}\n")
+        shown += 1
+        if pageSize and shown % pageSize == 0:
+            out.write("".join(buffer))
+            buffer = []
+            out.flush()
+            if input(f"-- {offset + shown} shown, Enter for more, q to stop -- ").strip().lower() == "q":
+                return
+        elif len(buffer) >= 1000:
+            out.write("".join(buffer))
+            buffer = []
+    out.write("".join(buffer))
+    print()
+    print()
+
+#6 - Reset to Default
+def resetToDefaults():
+    """Resets the database to default values."""
+    confirm = input("Are you sure you want to reset the database to default values? (y/n): ").strip().lower()
+    if confirm != 'y':
+        print("Reset cancelled.")
+        return
+    db.reset()
+    print("Databases reset to default values.")
+
+#8 - Stats
+def showStats():
+    """Prints call counts and latencies per search tier, change and load/save (enabled with --stats)."""
+    rows = db.metrics.summary()
+    print()
+    print("=== Timings ===")
+    print()
+    if not rows:
+        print("Nothing recorded yet.")
+        return
+    print(f"{'Kind':<8}  {'Step':<8}  {'Count':>7}  {'Errors':>6}  {'Mean ms':>9}  {'p50 ms':>8}  {'p99 ms':>8}  {'Max ms':>9}")
+    print("-" * 78)
+    for row in rows:
+        print(f"{row['family']:<8}  {row['label']:<8}  {row['count']:>7}  {row['errors']:>6}  {row['meanMs']:>9.3f}  "
+              f"{row['p50Ms']:>8.3f}  {row['p99Ms']:>8.3f}  {row['maxMs']:>9.3f}")
+    print("(p50/p99 are estimated from histogram buckets)")
+    print()
+
+def exportMetrics():
+    """Writes the metrics to metricsFile in Prometheus text format, if one was given."""
+    if metricsFile:
+        try:
+            db.metrics.writePrometheus(metricsFile)
+        except OSError as e:
+            print(f"Error writing metrics: {e}", file=sys.stderr)
+
+
+
+
+
+
+
+# Main Menu Loop
+
+
+def mainMenu() -> None:
+    """
+    Displays menu items based on enableCustomData flag and handles user navigation.
+    If sub-functions raise errors, they are caught and the user is returned to this menu.
+    """
+    isRunning = True
+
+    # Define menu options
+    menu_options = {
+        1: ("Search", searchItem),
+        2: ("Add item", databaseAdd),
+        3: ("Remove item", databaseRemove),
+        4: ("Edit item", databaseEditEntry),
+        5: ("Show All", lambda: display_all_items(pageSize=SHOW_ALL_PAGE if sys.stdout.isatty() else None)),
+        6: ("Reset to Defaults", resetToDefaults),
+        7: ("Quit", lambda: print("Goodbye!"))
+    }
+    if db.metrics.enabled:
+        menu_options[8] = ("Show Stats", showStats)
+
+    # Filter options for Limited Mode
+    if not db.enableCustomData:
+        menu_options = {key: value for key, value in menu_options.items() if key in [1, 5, 7, 8]}
+
+    def display_menu():
+        """
+        Displays the menu options based on the available options.
+        """
+        print("\n\t === PLU2 Lookup === \t\n")
+        for key, (description, _) in menu_options.items():
+            print(f"[{key}] {description}")
+        print("\n")
+
+    # Main loop
+    while isRunning:
+        display_menu()
+        userInput = whisper("Enter an option: ", False, True)
+        if userInput in menu_options:
+            action = menu_options[userInput][1]
+            if userInput == 7:  # Quit option
+                isRunning = False
+                if db.enableCustomData:
+                    saveDatabases()
+            problem_child(action)
+            exportMetrics()
+        else:
+            print("Invalid option. Please try again.")
+
+
+# ===================== BATCH MODE =====================
+
+def writeResults(write, query: str, results: list, output_format: str, tier=None) -> None:
+    if output_format == "jsonl":
+        found = {"query": query, "results": [{"code": code, "name": name} for code, name in results]}
+        if tier is not None:
+            found["tier"] = tier
+        write(json.dumps(found) + "\n")
+    elif not results:
+        write(f"{query}\t\t\n")
+    else:
+        for code, name in results:
+            write(f"{query}\t{code}\t{name}\n")
+
+
+def batchLookup(lines, out, output_format: str="jsonl", workers: int=1) -> int:
+    """
+    Streams queries through db.searchTier() and writes results as each one is resolved; jsonl
+    output says which tier found each one ('code', 'name', 'partial', 'phonetic', 'fuzzy' or 'none').
+    With workers > 1, blocks of queries are searched by a ParallelSearch pool and written in order.
+    Blank lines are skipped. Returns the number of queries looked up.
+    """
+    count = 0
+    write = out.write
+    queries = (query for query in (line.strip() for line in lines) if query)
+    if workers <= 1:
+        for query in queries:
+            tier, results = db.searchTier(query)
+            writeResults(write, query, results, output_format, tier)
+            count += 1
+        return count
+    with ParallelSearch(db, workers) as search:
+        while True:
+            block = list(itertools.islice(queries, 16384))
+            if not block:
+                break
+            for query, (tier, results) in zip(block, search.searchTierMany(block)):
+                writeResults(write, query, results, output_format, tier)
+            count += len(block)
+    return count
+
+
+def batchMatch(lines, out, k: int=5, cutoff: float=0.6, output_format: str="jsonl") -> int:
+    """
+    Fuzzy-matches free-text names (supplier invoices, labels) against the catalog in blocks with
+    NgramVectorMatcher, writing up to k scored matches per line. Returns the number of lines matched.
+    """
+    matcher = NgramVectorMatcher()
+    matcher.rebuild([name for _, name in db.items()])
+    count = 0
+    write = out.write
+    queries = (query for query in (line.strip() for line in lines) if query)
+    while True:
+        block = list(itertools.islice(queries, 4096))
+        if not block:
+            break
+        for query, matches in zip(block, matcher.matchMany([query.lower() for query in block], k, cutoff)):
+            if output_format == "jsonl":
+                write(json.dumps({"query": query, "matches": [{"code": db.codeFor(name), "name": name, "score": round(score, 4)}
+                                                              for name, score in matches]}) + "\n")
+            elif not matches:
+                write(f"{query}\t\t\t\n")
+            else:
+                for name, score in matches:
+                    write(f"{query}\t{db.codeFor(name)}\t{name}\t{score:.4f}\n")
+        count += len(block)
+    return count
+
+
+# ===================== IMPORT / EXPORT =====================
+CATALOG_FORMATS = ("csv", "jsonl")
+
+def catalogFormat(path: str, chosen=None) -> str:
+    """The --format given, else csv for .csv files and jsonl for anything else, stdin included."""
+    if chosen:
+        return chosen
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def readCatalog(lines, input_format: str="jsonl"):
+    """
+    Yields (code, name) pairs from a vendor catalog as it is read. JSONL lines are {"code", "name"}
+    objects. CSV takes the code from a 'code' or 'plu' column and the name from a 'name' column,
+    or from 'commodity' and 'variety' as "commodity - variety" (IFPS lists). Without a header the
+    first two columns are code and name. Blank lines are skipped. Raises ValueError for bad input.
+    """
+    if input_format == "jsonl":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON") from None
+            if not isinstance(item, dict):
+                raise ValueError(f"Line {number} is not a JSON object")
+            yield item.get("code", item.get("plu", "")), item.get("name", "")
+        return
+
+    rows = csv.reader(lines)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [column.strip().lower() for column in header]
+
+    def cell(row, i):
+        return row[i].strip() if i is not None and i < len(row) else ""
+
+    code_at = next((columns.index(column) for column in ("code", "plu") if column in columns), None)
+    if code_at is None:             # no header: code, name
+        for row in itertools.chain([header], rows):
+            if any(value.strip() for value in row):
+                yield cell(row, 0), cell(row, 1)
+        return
+    name_at = columns.index("name") if "name" in columns else None
+    commodity_at = columns.index("commodity") if "commodity" in columns else None
+    variety_at = columns.index("variety") if "variety" in columns else None
+    if name_at is None and commodity_at is None:
+        raise ValueError("The CSV header needs a 'name' column, or 'commodity' and 'variety'")
+    for row in rows:
+        if not any(value.strip() for value in row):
+            continue
+        if name_at is not None:
+            name = cell(row, name_at)
+        else:
+            name = cell(row, commodity_at)
+            if cell(row, variety_at):
+                name = f"{name} - {cell(row, variety_at)}"
+        yield cell(row, code_at), name
+
+
+def writeCatalog(out, output_format: str="jsonl") -> int:
+    """
+    Streams every item of the database in name order, as CSV with a code,name header or as JSONL
+    objects that readCatalog() reads back. Returns the number of items written.
+    """
+    count = 0
+    if output_format == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(("code", "name"))
+        for item in db.sortedItems():
+            writer.writerow(item)
+            count += 1
+        return count
+    write = out.write
+    for code, name in db.sortedItems():
+        write(json.dumps({"code": code, "name": name}) + "\n")
+        count += 1
+    return count
+
+
+def importCatalog(path: str, input_format: str) -> tuple:
+    """
+    Adds every item of a catalog file ('-' for stdin) to the database with addMany() and, for a
+    JSON database, folds the import into pluDatabase.json. Returns (items added, conflicts).
+    """
+    if path == "-":
+        count, conflicts = db.addMany(readCatalog(sys.stdin, input_format))
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            count, conflicts = db.addMany(readCatalog(f, input_format))
+    if count and isinstance(db, PluDatabase):
+        db.save()
+    return count, conflicts
+
+
+def readQueries(paths):
+    """Yields query lines from each file in paths, where '-' means stdin."""
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from f
+
+
+def main(argv=None) -> None:
+    global db, metricsFile, searchLimit
+    parser = argparse.ArgumentParser(description="Produce Lookup Tool. Runs the interactive menu when no command is given.")
+    parser.add_argument("--sqlite", nargs="?", const=SQLITE_FILE, default=None, metavar="FILE",
+                        help=f"Use the SQLite backend (default file: {SQLITE_FILE}). A new file starts from the current database.")
+    parser.add_argument("--snapshot", nargs="?", const=SNAPSHOT_FILE, default=None, metavar="FILE",
+                        help=f"Search a read-only compiled snapshot (default file: {SNAPSHOT_FILE})")
+    parser.add_argument("--store", metavar="DIR", default=None,
+                        help=f"Use a store's overlay in DIR ({OVERLAY_FILE}) on top of the shared default list")
+    parser.add_argument("--compact-catalog", action="store_true",
+                        help="Keep the JSON database in packed arrays instead of dictionaries, for catalogs of millions of items")
+    parser.add_argument("--stats", action="store_true",
+                        help="Time every search tier, change and load/save. Adds a Show Stats menu entry; lookup prints them to stderr.")
+    parser.add_argument("--search-limit", type=int, default=searchLimit, metavar="N",
+                        help=f"Most results the menu search shows, best first (default: {searchLimit})")
+    parser.add_argument("--metrics-file", metavar="FILE", default=None,
+                        help="Keep FILE updated with the timings in Prometheus text format (implies --stats)")
+    commands = parser.add_subparsers(dest="command")
+    lookup = commands.add_parser("lookup", help="Look up queries in batch, one per line, without the menu")
+    lookup.add_argument("--input", action="append", default=None, metavar="FILE",
+                        help="File of queries (repeatable, '-' for stdin). Defaults to stdin.")
+    lookup.add_argument("--format", choices=["jsonl", "tsv"], default="jsonl",
+                        help="jsonl: one object per query. tsv: query, code, name per match.")
+    lookup.add_argument("--fuzzy", choices=list(fuzzyEngines), default=None, help="Fuzzy matching engine (default: symspell)")
+    lookup.add_argument("--cache-stats", action="store_true", help="Print search cache hits and misses to stderr when done")
+    lookup.add_argument("--workers", type=int, default=1, metavar="N", help="Search with N worker processes (default: 1)")
+    match = commands.add_parser("match", help="Fuzzy-match free-text names in bulk, with scores (uses NumPy when installed)")
+    match.add_argument("--input", action="append", default=None, metavar="FILE",
+                       help="File of names (repeatable, '-' for stdin). Defaults to stdin.")
+    match.add_argument("--format", choices=["jsonl", "tsv"], default="jsonl",
+                       help="jsonl: one object per name. tsv: name, code, match, score per match.")
+    match.add_argument("--top-k", type=int, default=5, metavar="K", help="Matches per name (default: 5)")
+    match.add_argument("--cutoff", type=float, default=0.6, help="Lowest trigram similarity kept, 0 to 1 (default: 0.6)")
+    show = commands.add_parser("show", help="Print the catalog in name order (Show All) without the menu")
+    show.add_argument("--offset", type=int, default=0, metavar="N", help="Skip the first N items")
+    show.add_argument("--limit", type=int, default=None, metavar="N", help="Print at most N items")
+    show.add_argument("--page", type=int, default=None, metavar="ROWS", help="Pause every ROWS rows")
+    codes = commands.add_parser("codes", help="List items by code range or prefix: 3000-3999, 4xxx (four digits), 94* (any length)")
+    codes.add_argument("queries", nargs="+", metavar="PATTERN")
+    codes.add_argument("--format", choices=["jsonl", "tsv"], default="tsv", help="tsv (default): pattern, code, name per item")
+    category = commands.add_parser("category", help='List every "category - variety" item of each category, e.g. apples')
+    category.add_argument("queries", nargs="+", metavar="CATEGORY")
+    category.add_argument("--format", choices=["jsonl", "tsv"], default="tsv", help="tsv (default): category, code, name per item")
+    importer = commands.add_parser("import", help="Add every item of a CSV or JSONL vendor catalog, with the usual duplicate checks")
+    importer.add_argument("input", nargs="?", default="-", metavar="FILE", help="Catalog file ('-' for stdin, the default)")
+    importer.add_argument("--format", choices=CATALOG_FORMATS, default=None,
+                          help="csv or jsonl (default: csv for .csv files, otherwise jsonl)")
+    exporter = commands.add_parser("export", help="Write the whole catalog as CSV or JSONL, in name order")
+    exporter.add_argument("--output", default="-", metavar="FILE", help="File to write ('-' for stdout, the default)")
+    exporter.add_argument("--format", choices=CATALOG_FORMATS, default=None,
+                          help="csv or jsonl (default: csv for .csv files, otherwise jsonl)")
+    snapshot = commands.add_parser("snapshot", help="Compile the current database into a snapshot for fast read-only startup")
+    snapshot.add_argument("--output", default=SNAPSHOT_FILE, metavar="FILE", help=f"Snapshot file (default: {SNAPSHOT_FILE})")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        seed = None if os.path.exists(args.sqlite) else db.items()
+        db = SqlitePluDatabase(args.sqlite, seed)
+    elif args.snapshot:
+        db = SnapshotPluDatabase(args.snapshot)
+    elif args.store:
+        db = LayeredPluDatabase(args.store)
+    elif args.compact_catalog:
+        db.compactCatalog = True
+    metricsFile = args.metrics_file
+    searchLimit = max(1, args.search_limit)
+    db.metrics.enabled = args.stats or bool(metricsFile)
+
+    if args.command == "snapshot":
+        initData(interactive=False)
+        writeSnapshot(db.items(), args.output)
+        print(f"Wrote {args.output}")
+        return
+
+    if args.command == "import":
+        if isinstance(db, PluDatabase) and db.customDataAllowed() and db.fileState() == "none":
+            db.createFromDefaults()
+        initData(interactive=False)
+        if not db.enableCustomData:
+            parser.error("import needs a database that can be changed: a custom database (Windows/macOS), --sqlite or --store")
+        try:
+            count, conflicts = importCatalog(args.input, catalogFormat(args.input, args.format))
+        except (OSError, ValueError) as e:
+            print(f"Import failed, nothing was added: {e}", file=sys.stderr)
+            sys.exit(1)
+        for row, code, name, reason in conflicts:
+            print(f"row {row}: {reason}", file=sys.stderr)
+        print(f"Imported {count} items, {len(conflicts)} conflicts")
+        exportMetrics()
+        return
+
+    if args.command == "export":
+        initData(interactive=False)
+        output_format = catalogFormat(args.output, args.format)
+        try:
+            if args.output == "-":
+                writeCatalog(sys.stdout, output_format)
+                sys.stdout.flush()
+            else:
+                with open(args.output + ".tmp", 'w', encoding='utf-8', newline='') as f:
+                    count = writeCatalog(f, output_format)
+                os.replace(args.output + ".tmp", args.output)
+                print(f"Wrote {count} items to {args.output}")
+        except BrokenPipeError:
+            sys.stderr.close()
+        return
+
+    if args.command == "show":
+        initData(interactive=False)
+        try:
+            display_all_items(max(0, args.offset), args.limit, args.page)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            sys.stderr.close()
+        return
+
+    if args.command in ("codes", "category"):
+        initData(interactive=False)
+        try:
+            for query in args.queries:
+                results = codeQuery(query) if args.command == "codes" else categoryItems(query)
+                if results is None:
+                    parser.error(f"'{query}' is not a code range (3000-3999) or prefix (4xxx, 94*)")
+                writeResults(sys.stdout.write, query, results, args.format)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            sys.stderr.close()
+        return
+
+    if args.command == "match":
+        initData(interactive=False)
+        try:
+            batchMatch(readQueries(args.input or ["-"]), sys.stdout, args.top_k, args.cutoff, args.format)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            sys.stderr.close()
+        return
+
+    if args.command == "lookup":
+        if args.fuzzy:
+            db.setFuzzyEngine(args.fuzzy)
+        initData(interactive=False)
+        try:
+            batchLookup(readQueries(args.input or ["-"]), sys.stdout, args.format, args.workers)
+            sys.stdout.flush()
+            if args.cache_stats:
+                print(json.dumps(db.cacheStats()), file=sys.stderr)
+            if args.stats:
+                for row in db.metrics.summary():
+                    print(json.dumps(row), file=sys.stderr)
+        except BrokenPipeError:
+            sys.stderr.close()
+        exportMetrics()
+        return
+
+    initData()
+    exportMetrics()
+    mainMenu()
 
 
 # ===================== MAIN =====================
-initData()
-mainMenu()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
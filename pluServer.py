@@ -0,0 +1,371 @@
+"""
+Produce Code Finder - Lookup Service
+-----------------------
+Description:
+    Serves one warm PLU database to every register over HTTP, using only
+    the standard library (asyncio). Connections are kept alive between requests.
+
+    GET    /lookup?q=bananas           Search, same results as eagle()
+    POST   /lookup/batch               Body: {"queries": [...]}
+    GET    /autocomplete?q=ba&k=10     Type-ahead suggestions
+    GET    /items/<code or name>       Exact item
+    POST   /items                      Body: {"name": ..., "code": ...}
+    PATCH  /items/<code or name>       Body: {"name": ..., "code": ...} (either or both)
+    DELETE /items/<code or name>
+    GET    /metrics                    Prometheus timings (serve --stats)
+
+    With --stores ROOT, every subdirectory of ROOT is a store overlay on the shared
+    default list, and the same routes are served under /stores/<store>/, e.g.
+    /stores/0412/lookup?q=fuji.
+
+    Also includes a load generator that reports throughput and p50/p99 latency:
+
+        python pluServer.py serve --port 8080
+        python pluServer.py loadtest --port 8080 --concurrency 32 --duration 10
+"""
+
+# IMPORT STATEMENTS
+import asyncio, json, time, random, argparse, os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote, quote
+
+import pluSearch
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY = 16 * 1024 * 1024
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ===================== SERVER =====================
+
+class LookupService:
+    """
+    Routes HTTP requests to a PluDatabase (or the SQLite/snapshot backends), or to one of several stores.
+    Requests are answered on executor, one thread shared with the stores, so the event loop keeps
+    serving connections while a search or change runs and the database only ever sees one caller.
+    """
+    def __init__(self, database, stores=None, executor=None):
+        self.db = database
+        self.stores = stores or {}      # store name -> LookupService over its LayeredPluDatabase
+        self.executor = executor        # None runs requests on the event loop's default executor
+
+    def itemJson(self, item) -> dict:
+        code, name = item
+        return {"code": code, "name": name}
+
+    def lookupJson(self, query) -> dict:
+        """Search results for one query, with the tier that found them (see PluDatabase.searchTier)."""
+        tier, results = self.db.searchTier(query)
+        return {"query": query, "results": [self.itemJson(item) for item in results], "tier": tier}
+
+    def readJson(self, body: bytes):
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Body must be JSON")
+
+    def handle(self, method: str, target: str, body: bytes):
+        """Returns (status, JSON-serializable payload) for one request."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        params = parse_qs(url.query)
+
+        if path == "/lookup":
+            if method != "GET":
+                raise HttpError(405, "Use GET")
+            query = params.get("q", [""])[0]
+            if not query.strip():
+                raise HttpError(400, "Missing query parameter 'q'")
+            return 200, self.lookupJson(query)
+
+        if path == "/lookup/batch":
+            if method != "POST":
+                raise HttpError(405, "Use POST")
+            payload = self.readJson(body)
+            queries = payload.get("queries") if isinstance(payload, dict) else payload
+            if not isinstance(queries, list):
+                raise HttpError(400, "Body must be {\"queries\": [...]}")
+            return 200, {"results": [self.lookupJson(query) for query in queries]}
+
+        if path == "/autocomplete":
+            if method != "GET":
+                raise HttpError(405, "Use GET")
+            try:
+                k = int(params.get("k", ["10"])[0])
+            except ValueError:
+                raise HttpError(400, "k must be a number")
+            byFrequency = params.get("frequency", ["0"])[0] in ("1", "true")
+            query = params.get("q", [""])[0]
+            return 200, {"query": query, "results": [self.itemJson(item) for item in self.db.autocomplete(query, k, byFrequency)]}
+
+        if path == "/metrics":
+            if not self.db.metrics.enabled:
+                raise HttpError(404, "Start the service with --stats to collect metrics")
+            return 200, self.db.metrics.prometheus()
+
+        if path == "/items" and method == "POST":
+            payload = self.readJson(body)
+            if not isinstance(payload, dict) or not payload.get("name") or not payload.get("code"):
+                raise HttpError(400, "Body must include 'name' and 'code'")
+            if not str(payload["code"]).strip().isdigit():
+                raise HttpError(400, "Codes can only contain digits")
+            self.db.add(payload["name"], payload["code"])
+            return 201, self.itemJson(self.db.find(str(payload["code"]).strip()))
+
+        if path.startswith("/items/"):
+            key = unquote(path[len("/items/"):])
+            if method == "GET":
+                item = self.db.find(key)
+                if item is None:
+                    raise HttpError(404, f"Item '{key}' not found")
+                return 200, self.itemJson(item)
+            if method == "DELETE":
+                return 200, self.itemJson(self.db.remove(key))
+            if method == "PATCH":
+                payload = self.readJson(body)
+                if not isinstance(payload, dict):
+                    raise HttpError(400, "Body must be a JSON object")
+                new_code = payload.get("code")
+                if new_code is not None and not str(new_code).strip().isdigit():
+                    raise HttpError(400, "Codes can only contain digits")
+                return 200, self.itemJson(self.db.edit(key, payload.get("name"), new_code))
+            raise HttpError(405, "Use GET, PATCH or DELETE")
+
+        raise HttpError(404, f"No route for {path or '/'}")
+
+    def respond(self, method: str, target: str, body: bytes):
+        if target.startswith("/stores/"):
+            store, _, rest = target[len("/stores/"):].partition("/")
+            service = self.stores.get(unquote(store))
+            if service is None:
+                return 404, {"error": f"Store '{unquote(store)}' not found"}
+            return service.respond(method, "/" + rest, body)
+        try:
+            return self.handle(method, target, body)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except KeyError as e:
+            return 404, {"error": str(e).strip("'\"")}
+        except ValueError as e:
+            return 409, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves requests on one connection until the client closes it or asks to."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, 413, {"error": "Headers too large"}, False)
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.send(writer, 400, {"error": "Malformed request line"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", "0") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.send(writer, 400, {"error": "Invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.send(writer, 413, {"error": "Body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keepAlive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                status, payload = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.respond, method.upper(), target, body)
+                await self.send(writer, status, payload, keepAlive)
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer: asyncio.StreamWriter, status: int, payload, keepAlive: bool) -> None:
+        """Sends payload as JSON, or as plain text when it is already a string (/metrics)."""
+        if isinstance(payload, str):
+            body, contentType = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, contentType = json.dumps(payload).encode("utf-8"), "application/json"
+        writer.write((f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                      f"Content-Type: {contentType}\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+def openDatabases(database, stores: dict) -> None:
+    """Loads the database and every store, warming the in-memory indexes before the first request."""
+    database.load()
+    if isinstance(database, pluSearch.PluDatabase):
+        database.buildIndexes()
+    for store in stores.values():
+        store.load()
+        store.base.buildIndexes()       # the shared default catalog, built once
+
+
+async def serve(database, host: str, port: int, stores=None) -> None:
+    """
+    Loads the databases and serves them until cancelled, then saves. Every database call, loading
+    included, runs on one worker thread: SQLite connections belong to the thread that opened them.
+    """
+    stores = stores or {}
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plu-database")
+    try:
+        await loop.run_in_executor(executor, openDatabases, database, stores)
+        if stores:
+            print(f"Loaded {len(stores)} stores")
+        service = LookupService(database, {name: LookupService(store, executor=executor) for name, store in stores.items()}, executor)
+        server = await asyncio.start_server(service.connection, host, port)
+        print(f"Serving PLU lookups on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await loop.run_in_executor(executor, database.save)
+    finally:
+        executor.shutdown()
+
+
+# ===================== LOAD GENERATOR =====================
+
+async def loadWorker(host: str, port: int, queries: list, deadline: float, latencies: list, errors: list) -> None:
+    """Sends lookups over one keep-alive connection until the deadline. Only 200 responses count toward latencies."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            query = random.choice(queries)
+            request = (f"GET /lookup?q={quote(query)} HTTP/1.1\r\nHost: {host}\r\n\r\n").encode("latin-1")
+            start = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            if head.startswith(b"HTTP/1.1 200"):
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def loadTest(host: str, port: int, queries: list, concurrency: int, duration: float) -> dict:
+    """Throughput and latency percentiles of the successful lookups; failed ones are only counted."""
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(loadWorker(host, port, queries, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "requestsPerSecond": round(len(latencies) / elapsed, 1),
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "maxMs": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def defaultQueries() -> list:
+    """A mix of codes, exact names, partial names and typos from the default catalog."""
+    queries = []
+    for code, name in pluSearch.defaultCodeToName.items():
+        queries += [code, name, name[:4]]
+        if len(name) > 4:
+            queries.append(name[:2] + name[3:])
+    return queries
+
+
+# ===================== MAIN =====================
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="PLU lookup HTTP service and load generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serveCommand = commands.add_parser("serve", help="Run the lookup service")
+    serveCommand.add_argument("--host", default="127.0.0.1")
+    serveCommand.add_argument("--port", type=int, default=8080)
+    serveCommand.add_argument("--dir", default=None,
+                              help="Directory of the JSON database; changes are saved there (started from the defaults if it has none)")
+    backend = serveCommand.add_mutually_exclusive_group()
+    backend.add_argument("--sqlite", metavar="FILE", help="Serve an SQLite catalog instead")
+    backend.add_argument("--snapshot", metavar="FILE", help="Serve a read-only snapshot instead")
+    serveCommand.add_argument("--stores", metavar="ROOT", help="Also serve each subdirectory of ROOT as a store overlay under /stores/<name>/")
+    serveCommand.add_argument("--stats", action="store_true", help="Time searches and changes, served at /metrics")
+    loadCommand = commands.add_parser("loadtest", help="Measure a running service")
+    loadCommand.add_argument("--host", default="127.0.0.1")
+    loadCommand.add_argument("--port", type=int, default=8080)
+    loadCommand.add_argument("--concurrency", type=int, default=32, help="Keep-alive connections")
+    loadCommand.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    loadCommand.add_argument("--queries", metavar="FILE", help="Queries to send, one per line (default: mix from the default catalog)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        if args.sqlite:
+            database = pluSearch.SqlitePluDatabase(args.sqlite)
+        elif args.snapshot:
+            database = pluSearch.SnapshotPluDatabase(args.snapshot)
+        elif args.dir:
+            if not os.path.isdir(args.dir):
+                parser.error(f"--dir: no such directory: {args.dir}")
+            database = pluSearch.PluDatabase(args.dir, enableCustomData=True)
+            if database.fileState() == "none":
+                database.createFromDefaults()
+        else:
+            database = pluSearch.PluDatabase()       # the current directory, saved where the CLI would save it
+        database.metrics.enabled = args.stats
+        stores = {}
+        if args.stores:
+            for name in sorted(os.listdir(args.stores)):
+                if os.path.isdir(os.path.join(args.stores, name)):
+                    stores[name] = pluSearch.LayeredPluDatabase(os.path.join(args.stores, name))
+                    stores[name].metrics.enabled = args.stats
+        try:
+            asyncio.run(serve(database, args.host, args.port, stores))
+        except KeyboardInterrupt:
+            pass    # serve() saved on the way out
+        return
+
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = defaultQueries()
+    print(json.dumps(asyncio.run(loadTest(args.host, args.port, queries, args.concurrency, args.duration)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
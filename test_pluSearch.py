@@ -0,0 +1,212 @@
+"""
+Produce Code Finder - Tests
+-----------------------
+Description:
+    Parity checks for the search indexes, using only the standard library:
+    the n-gram index against a scan of the names, SymSpell against difflib,
+    indexes kept up to date by add/remove/edit against a fresh rebuild, and
+    the JSON, SQLite and snapshot backends against each other.
+
+        python -m unittest test_pluSearch
+"""
+
+# IMPORT STATEMENTS
+import os
+import random
+import shutil
+import string
+import tempfile
+import unittest
+
+import pluSearch
+import pluBench
+
+
+def openDatabase(directory: str, catalog: dict):
+    """An in-memory PluDatabase over catalog, saved in directory."""
+    pluSearch.PluDatabase(directory, enableCustomData=True).writeDatabase(catalog)
+    database = pluSearch.PluDatabase(directory, enableCustomData=True)
+    database.load()
+    return database
+
+
+def typos(names, seed: int=0) -> list:
+    """(name, misspelling) pairs: one dropped, one replaced and one swapped letter per name."""
+    rng = random.Random(seed)
+    pairs = []
+    for name in names:
+        i = rng.randrange(len(name))
+        pairs.append((name, name[:i] + name[i + 1:]))
+        i = rng.randrange(len(name))
+        pairs.append((name, name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]))
+        if len(name) > 2:
+            i = rng.randrange(len(name) - 1)
+            pairs.append((name, name[:i] + name[i + 1] + name[i] + name[i + 2:]))
+    return [(name, typo) for name, typo in pairs if typo not in names]
+
+
+def prefixes(names) -> list:
+    """Type-ahead prefixes of the first and later words of names."""
+    found = {"a", "gro", "qui", "sha", "x"}
+    for name in names:
+        words = pluSearch.tokenize(name)
+        found.add(name[:3])
+        for word in words[1:]:
+            found.update(word[:length] for length in (2, 3, 4))
+    return sorted(found)
+
+
+# ===================== INDEXES =====================
+
+class NgramIndexTest(unittest.TestCase):
+    def assertMatchesScan(self, index: pluSearch.NgramIndex, names: list, queries) -> None:
+        for query in queries:
+            found = index.search(query)
+            if found is None:
+                self.assertLess(len(query), index.n)
+                continue
+            self.assertEqual(found, [name for name in names if query in name], query)
+
+    def queries(self, names: list) -> list:
+        rng = random.Random(1)
+        queries = ["zz", "apple", "an", "xyzzy", " - ", "(organic)"]
+        for name in rng.sample(names, min(300, len(names))):
+            start = rng.randrange(len(name))
+            queries.append(name[start:start + rng.randint(1, 8)])
+        return queries
+
+    def test_matchesScan(self):
+        names = list(pluBench.syntheticCatalog(5000).values())
+        index = pluSearch.NgramIndex()
+        index.rebuild(names)
+        self.assertMatchesScan(index, names, self.queries(names))
+
+    def test_matchesScanAfterChanges(self):
+        names = list(pluSearch.defaultNameToCode)
+        index = pluSearch.NgramIndex()
+        index.rebuild(names)
+        for name in names[::4]:
+            index.remove(name)
+        added = [f"{name} (organic)" for name in names[1::4]]
+        for name in added:
+            index.add(name)
+        current = [name for i, name in enumerate(names) if i % 4] + added
+        self.assertMatchesScan(index, current, self.queries(current))
+
+
+class FuzzyEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.names = sorted(pluSearch.defaultNameToCode)
+        cls.symspell = pluSearch.SymSpellMatcher()
+        cls.symspell.rebuild(pluSearch.defaultNameToCode)
+        cls.difflib = pluSearch.DifflibMatcher()
+        cls.difflib.rebuild(pluSearch.defaultNameToCode)
+        cls.typos = typos(cls.names)
+
+    def test_symspellFindsTheMisspelledName(self):
+        for name, typo in self.typos:
+            self.assertIn(name, self.symspell.match(typo, n=5, cutoff=0.6), typo)
+
+    def test_difflibBestMatchInSymspellTopFive(self):
+        for _, typo in self.typos + [(None, "drywice"), (None, "yellowvpeppers"), (None, "apples - pinklady")]:
+            expected = self.difflib.match(typo, n=5, cutoff=0.6)
+            if expected:
+                self.assertIn(expected[0], self.symspell.match(typo, n=5, cutoff=0.6), typo)
+
+
+class IncrementalIndexTest(unittest.TestCase):
+    """Indexes updated item by item answer exactly like indexes rebuilt from the final catalog."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.catalog = pluBench.syntheticCatalog(3000)
+        self.database = openDatabase(self.directory, self.catalog)
+
+    def tearDown(self):
+        if self.database.journal is not None:
+            self.database.journal.close()
+        shutil.rmtree(self.directory)
+
+    def answers(self) -> dict:
+        database = self.database
+        names = list(database.nameToCode)
+        queries = [query for tier in pluBench.sampleQueries(dict(database.codeToName), 200).values() for query in tier]
+        return {
+            "lookup": [database.lookupTier(str(query).lower()) for query in queries],
+            "autocomplete": [database.autocomplete(prefix, 10) for prefix in prefixes(names[:200])],
+            "ranked": [database.rankedSearch(query, 10) for query in queries[400:]],
+            "sorted": list(database.sortedItems()),
+            "range": database.codeRange(3000, 4999),
+        }
+
+    def change(self) -> None:
+        database = self.database
+        codes = list(self.catalog)
+        for code in codes[:100]:
+            database.remove(code)
+        for i, code in enumerate(codes[100:200]):
+            database.edit(code, new_name=f"{self.catalog[code]} renamed {i}")
+        for i, code in enumerate(codes[200:250]):
+            database.edit(code, new_code=str(80000 + i))
+        for i in range(100):
+            database.add(f"kiwifruit - test {i}", str(70000 + i))
+
+    def test_changesMatchRebuild(self):
+        self.database.buildIndexes()
+        self.database.rankingIndex()
+        self.change()
+        incremental = self.answers()
+        self.database.rebuildIndexes()
+        self.assertEqual(incremental, self.answers())
+
+    def test_changesBeforeFirstUseMatchRebuild(self):
+        self.change()
+        lazy = self.answers()
+        self.database.rebuildIndexes()
+        self.assertEqual(lazy, self.answers())
+
+
+# ===================== BACKENDS =====================
+
+class BackendParityTest(unittest.TestCase):
+    """The JSON, SQLite and snapshot backends give the same answers over the same catalog."""
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.catalog = pluBench.syntheticCatalog(3000)
+        cls.backends = {"json": openDatabase(cls.directory, cls.catalog)}
+        cls.backends["sqlite"] = pluSearch.SqlitePluDatabase(os.path.join(cls.directory, "catalog.sqlite"), seed=cls.catalog.items())
+        snapshot = os.path.join(cls.directory, "catalog.snapshot")
+        pluSearch.writeSnapshot(cls.catalog.items(), snapshot)
+        cls.backends["snapshot"] = pluSearch.SnapshotPluDatabase(snapshot)
+        for database in cls.backends.values():
+            database.ensureLoaded()
+        cls.queries = [query for tier in pluBench.sampleQueries(cls.catalog, 150).values() for query in tier]
+        cls.queries += ["brocoli", "fuji apple", "appl", "zzzz", "4011"]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.backends["sqlite"].connection.close()
+        cls.backends.clear()
+        shutil.rmtree(cls.directory)
+
+    def assertSameAnswers(self, answer, inputs) -> None:
+        for value in inputs:
+            expected = answer(self.backends["json"], value)
+            for backend in ("sqlite", "snapshot"):
+                self.assertEqual(answer(self.backends[backend], value), expected, f"{backend}: {value!r}")
+
+    def test_searchTier(self):
+        self.assertSameAnswers(lambda database, query: database.searchTier(query), self.queries)
+
+    def test_autocomplete(self):
+        names = list(self.catalog.values())[:150]
+        for k in (5, 10, 40):
+            self.assertSameAnswers(lambda database, prefix: database.autocomplete(prefix, k), prefixes(names))
+
+    def test_rankedSearch(self):
+        self.assertSameAnswers(lambda database, query: database.rankedSearch(query, 10), self.queries)
+
+
+if __name__ == "__main__":
+    unittest.main()